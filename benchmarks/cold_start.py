@@ -0,0 +1,61 @@
+"""
+Cold-start benchmark of the command-line entry points.
+
+Each command is started as a fresh interpreter several times and the median
+wall time is reported, next to the bare interpreter and `import pandas` for
+reference. Commands run from the repository root and only --help / --dry-run
+variants are timed, so nothing is read or written.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --repeat 20 --output cold_start.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+COMMANDS = {
+    "python (no-op)": ["-c", "pass"],
+    "import pandas": ["-c", "import pandas"],
+    "main.py --help": ["main.py", "--help"],
+    "src.cli --help": ["-m", "src.cli", "--help"],
+    "src.cli run --dry-run": ["-m", "src.cli", "run", "--dry-run"],
+    "src.cli send --help": ["-m", "src.cli", "send", "--help"],
+}
+
+
+def time_command(args: list, repeat: int) -> dict:
+    """Median and best wall time of `python <args>` over repeat fresh processes"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return {"median_seconds": round(statistics.median(timings), 4), "min_seconds": round(min(timings), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of the CLI entry points")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per command")
+    parser.add_argument("--output", type=Path, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, command in COMMANDS.items():
+        results[name] = time_command(command, args.repeat)
+        print(f"  {name:<24} {results[name]['median_seconds'] * 1000:>8.0f} ms  "
+              f"(min {results[name]['min_seconds'] * 1000:.0f} ms)")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Parity check of the compute engines: the report computed with DuckDB
+(src/engine.py) must be the one computed with pandas, table by table.
+
+A partition store is built from a synthetic CSV (or an existing store is
+used with --store), then the report is computed once per configuration:
+- pandas on the daily cube (the store's default path)
+- pandas on the loaded report windows (use_daily_cube off, no trend tables)
+- duckdb
+Every table of the pandas reports must be found in the DuckDB report with
+the same columns, dtypes and values (compared exactly). The script exits
+with status 1 on any difference.
+
+    python -m benchmarks.engine_parity
+    python -m benchmarks.engine_parity --rows 2000000 --threads 4
+    python -m benchmarks.engine_parity --store data/store
+
+tests/test_engine_parity.py runs the same check on a small store.
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+from config import CONFIG, get_paths
+from main import compute_report, load_report_data
+from src.ingest import ingest_daily_file
+from src.instrumentation import RunRecorder
+from benchmarks.synthetic_data import generate_sales_csv
+
+CONFIGURATIONS = {
+    "pandas (daily cube)": {"compute_engine": "pandas", "use_daily_cube": True},
+    "pandas (windows)": {"compute_engine": "pandas", "use_daily_cube": False},
+    "duckdb": {"compute_engine": "duckdb"},
+}
+
+
+def compute_tables(store_dir: Path, overrides: dict) -> tuple:
+    """The report tables computed from the store with the given CONFIG overrides, and the seconds taken"""
+    overrides = {"partition_store": store_dir, "use_partition_store": True, "distinct_count_mode": "exact",
+                 **overrides}
+    saved = {key: CONFIG[key] for key in overrides}
+    CONFIG.update(overrides)
+    data = None
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            recorder = RunRecorder(run_name="engine_parity")
+            data = load_report_data(Namespace(ingest=None, backfill=None, batch=False), recorder,
+                                    get_paths(date.today()))
+            report = compute_report(data, recorder)
+        return report["tables"], time.perf_counter() - start
+    finally:
+        if data is not None and data["engine"] is not None:
+            data["engine"].close()
+        CONFIG.update(saved)
+
+
+def compare_tables(expected: list, actual: list) -> list:
+    """Differences between two lists of (table_name, DataFrame), tables of `expected` only"""
+    actual = dict(actual)
+    problems = []
+    for table_name, table in expected:
+        if table_name not in actual:
+            problems.append(f"{table_name}: missing")
+            continue
+        try:
+            pd.testing.assert_frame_equal(table, actual[table_name], check_exact=True)
+        except AssertionError as e:
+            problems.append(f"{table_name}: {e}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the DuckDB engine reproduces the pandas report")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows of the synthetic data")
+    parser.add_argument("--store", type=Path, help="existing partition store to use instead of synthetic data")
+    parser.add_argument("--threads", type=int, help="DuckDB threads (default: one per CPU)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_dir = args.store
+        if store_dir is None:
+            store_dir = Path(tmp_dir) / "store"
+            csv_path = generate_sales_csv(Path(tmp_dir) / "sales.csv", args.rows)
+            with contextlib.redirect_stdout(io.StringIO()):
+                ingest_daily_file(csv_path, store_dir)
+            print(f"Synthetic store: {args.rows:,} rows")
+
+        results = {}
+        for name, overrides in CONFIGURATIONS.items():
+            if overrides["compute_engine"] == "duckdb":
+                overrides = {**overrides, "duckdb_threads": args.threads,
+                             "duckdb_temp_dir": Path(tmp_dir) / "duckdb"}
+            results[name], seconds = compute_tables(store_dir, overrides)
+            print(f"  {name:<22} {seconds:>7.2f} s  {len(results[name])} tables")
+
+    failed = False
+    for name in CONFIGURATIONS:
+        if name == "duckdb":
+            continue
+        problems = compare_tables(results[name], results["duckdb"])
+        print(f"\nduckdb vs {name}: {'IDENTICAL' if not problems else f'{len(problems)} table(s) differ'}")
+        for problem in problems:
+            print(f"  - {problem}")
+        failed = failed or bool(problems)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
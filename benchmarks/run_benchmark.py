@@ -0,0 +1,200 @@
+"""
+Pipeline benchmark: times every stage of main.py on synthetic data.
+
+For each requested size a synthetic CSV is generated (and reused on later
+runs), then the load/validate, periods, KPIs, tables, Excel and ZIP stages
+are run one after another. Wall time and peak traced memory of each stage
+are written to a JSON result file. With --baseline the run is compared with
+a stored result and the script exits with status 1 on regressions.
+
+    python -m benchmarks.run_benchmark --rows 10000 1000000
+    python -m benchmarks.run_benchmark --rows 10000 --save-baseline
+    python -m benchmarks.run_benchmark --rows 10000 --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from config import CONFIG
+from src.data import load_and_validate_sales_data
+from src.date_utils import get_reporting_periods
+from src.excel_report import create_formatted_excel_report
+from src.insights import generate_insights
+from src.instrumentation import max_rss_bytes
+from src.metrics import calculate_kpis, compute_period_aggregates
+from src.tables import create_all_tables
+from src.zip_handler import create_report_zip
+from benchmarks.synthetic_data import generate_sales_csv
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+
+class StageTimer:
+    """Collects wall time and peak traced memory of each named stage"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        seconds = time.perf_counter() - start
+        peak_mb = None
+        if tracing:
+            # Peak memory allocated by the stage on top of what was already live
+            _, peak = tracemalloc.get_traced_memory()
+            peak_mb = round((peak - memory_before) / 2**20, 1)
+        max_rss = max_rss_bytes()
+        self.stages[name] = {
+            "seconds": round(seconds, 4),
+            "peak_mb": peak_mb,
+            "max_rss_mb": round(max_rss / 2**20, 1) if max_rss is not None else None,
+        }
+
+
+def run_pipeline(csv_path: Path, out_dir: Path) -> dict:
+    """Run the main.py stages on csv_path and return the per-stage measurements"""
+    timer = StageTimer()
+
+    with timer.stage("load_validate"):
+        df = load_and_validate_sales_data(csv_path)
+
+    with timer.stage("periods"):
+        periods = get_reporting_periods(df["Date"].max())
+
+    with timer.stage("kpis"):
+        aggregates = compute_period_aggregates(df, periods)
+        metrics = calculate_kpis(aggregates)
+        insights_list = generate_insights(
+            metrics, metrics["top_product"], metrics["top_branch"], metrics["top_payment"],
+            metrics["top_product_sales"], metrics["top_branch_sales"], metrics["total_sales"]
+        )
+
+    with timer.stage("tables"):
+        all_tables_list = create_all_tables(
+            metrics=metrics,
+            insights_list=insights_list,
+            periods=periods,
+            aggregates=aggregates,
+            top_product=metrics["top_product"],
+            top_product_sales=metrics["top_product_sales"],
+            top_branch=metrics["top_branch"],
+            top_branch_sales=metrics["top_branch_sales"],
+            top_payment=metrics["top_payment"],
+            top_payment_share=metrics["top_payment_share"]
+        )
+
+    excel_path = out_dir / CONFIG["excel_data_filename"]
+    with timer.stage("excel"):
+        create_formatted_excel_report(excel_path, all_tables_list)
+
+    with timer.stage("zip"):
+        create_report_zip(
+            output_dir=out_dir,
+            excel_data_path=excel_path,
+            excel_report_path=out_dir / CONFIG["excel_report_filename"],
+            zip_path=out_dir / CONFIG["zip_filename_template"].format(date="benchmark")
+        )
+
+    return timer.stages
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """Stages slower than baseline × (1 + tolerance), as printable lines"""
+    regressions = []
+    baseline_runs = {run["rows"]: run for run in baseline["runs"]}
+    for run in result["runs"]:
+        reference = baseline_runs.get(run["rows"])
+        if reference is None:
+            continue
+        for stage, measures in run["stages"].items():
+            before = reference["stages"].get(stage, {}).get("seconds")
+            # Ignore sub-50ms differences: timer noise on tiny stages
+            if before and measures["seconds"] > before * (1 + tolerance) and measures["seconds"] - before > 0.05:
+                regressions.append(
+                    f"{run['rows']:>12,} rows  {stage:<14} {before:.3f}s → {measures['seconds']:.3f}s "
+                    f"(+{measures['seconds'] / before - 1:.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the weekly report pipeline")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                        help="dataset sizes to benchmark (10k to 50M rows)")
+    parser.add_argument("--days", type=int, default=365, help="days of history in the synthetic data")
+    parser.add_argument("--output", type=Path, help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, help="compare with this result file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip tracemalloc (more accurate timings, no peak memory)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also store the result as {DEFAULT_BASELINE.name}")
+    args = parser.parse_args()
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": [],
+    }
+
+    # Generate missing datasets first: generation must not be traced or timed
+    csv_paths = {}
+    for rows in args.rows:
+        csv_paths[rows] = DATA_DIR / f"synthetic_{rows}_{args.days}d.csv"
+        if not csv_paths[rows].exists():
+            print(f"Generating {rows:,} synthetic rows → {csv_paths[rows].name}")
+            generate_sales_csv(csv_paths[rows], rows, days=args.days)
+
+    if not args.no_memory:
+        tracemalloc.start()
+    for rows, csv_path in csv_paths.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            stages = run_pipeline(csv_path, Path(tmp))
+        total = sum(stage["seconds"] for stage in stages.values())
+        result["runs"].append({"rows": rows, "total_seconds": round(total, 4), "stages": stages})
+
+        print(f"\n{rows:,} rows — total {total:.3f}s")
+        for stage, measures in stages.items():
+            peak = f"  peak {measures['peak_mb']:>9.1f} MB" if measures["peak_mb"] is not None else ""
+            print(f"  {stage:<14} {measures['seconds']:>9.3f}s{peak}")
+    if not args.no_memory:
+        tracemalloc.stop()
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"\nResults written to {output}")
+
+    if args.save_baseline:
+        DEFAULT_BASELINE.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(result, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%} slower than {args.baseline.name}):")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Synthetic sales data generator for the benchmarks.
+
+Produces CSV files with exactly the columns of CONFIG["expected_columns"]
+and only valid categorical values, so every pipeline stage runs as on real
+exports. Rows are generated and written in chunks, so 50M-row files can be
+produced with bounded memory.
+
+    python -m benchmarks.synthetic_data --rows 1000000 --out data/synthetic.csv
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import CONFIG
+
+# Branch → City pairs as found in the real exports
+BRANCH_CITY = [("Alex", "Yangon"), ("Giza", "Naypyitaw"), ("Cairo", "Mandalay")]
+PRODUCT_LINES = [
+    "Health and beauty", "Electronic accessories", "Home and lifestyle",
+    "Sports and travel", "Food and beverages", "Fashion accessories",
+]
+CHUNK_ROWS = 1_000_000
+
+
+def _time_strings() -> np.ndarray:
+    """Every minute between 10:00 AM and 8:59 PM formatted like the source ("1:08:00 PM")"""
+    minutes = pd.timedelta_range("10:00:00", "20:59:00", freq="1min")
+    times = pd.Timestamp("2000-01-01") + minutes
+    hours = times.hour % 12
+    hours = np.where(hours == 0, 12, hours)
+    suffix = np.where(times.hour < 12, "AM", "PM")
+    return np.array([f"{h}:{m:02d}:00 {s}" for h, m, s in zip(hours, times.minute, suffix)])
+
+
+def generate_chunk(rng: np.random.Generator, start_id: int, rows: int, dates: pd.DatetimeIndex) -> pd.DataFrame:
+    """Generate `rows` consistent transactions with Invoice IDs numbered from start_id"""
+    customer_types = np.array(sorted(CONFIG["valid_customer_types"]))
+    genders = np.array(sorted(CONFIG["valid_genders"]))
+    payments = np.array(sorted(CONFIG["valid_payments"]))
+
+    ids = np.arange(start_id, start_id + rows)
+    invoice_ids = (
+        pd.Series(ids // 1_000_000 % 1000).astype(str).str.zfill(3) + "-"
+        + pd.Series(ids // 10_000 % 100).astype(str).str.zfill(2) + "-"
+        + pd.Series(ids % 10_000).astype(str).str.zfill(4)
+    )
+
+    branch_idx = rng.integers(0, len(BRANCH_CITY), rows)
+    unit_price = np.round(rng.uniform(10, 100, rows), 2)
+    quantity = rng.integers(1, 11, rows)
+    cogs = np.round(unit_price * quantity, 2)
+    tax = cogs * 0.05
+
+    date_strings = np.array([f"{d.month}/{d.day}/{d.year}" for d in dates])
+    times = _time_strings()
+
+    return pd.DataFrame({
+        "Invoice ID": invoice_ids.to_numpy(),
+        "Branch": np.array([b for b, _ in BRANCH_CITY])[branch_idx],
+        "City": np.array([c for _, c in BRANCH_CITY])[branch_idx],
+        "Customer type": customer_types[rng.integers(0, len(customer_types), rows)],
+        "Gender": genders[rng.integers(0, len(genders), rows)],
+        "Product line": np.array(PRODUCT_LINES)[rng.integers(0, len(PRODUCT_LINES), rows)],
+        "Unit price": unit_price,
+        "Quantity": quantity,
+        "Tax 5%": np.round(tax, 4),
+        "Sales": np.round(cogs + tax, 4),
+        "Date": date_strings[rng.integers(0, len(dates), rows)],
+        "Time": times[rng.integers(0, len(times), rows)],
+        "Payment": payments[rng.integers(0, len(payments), rows)],
+        "cogs": cogs,
+        "gross margin percentage": 4.761904762,
+        "gross income": np.round(tax, 4),
+        "Rating": np.round(rng.uniform(4, 10, rows), 1),
+    })[CONFIG["expected_columns"]]
+
+
+def generate_sales_csv(path: Path, rows: int, days: int = 365, end_date: str = "2019-03-30", seed: int = 42) -> Path:
+    """Write a synthetic sales CSV with `rows` transactions spread over the `days` days before end_date"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end_date, periods=days, freq="D")
+
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        while written < rows:
+            chunk_rows = min(CHUNK_ROWS, rows - written)
+            chunk = generate_chunk(rng, written, chunk_rows, dates)
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += chunk_rows
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic sales data")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+
+    generate_sales_csv(args.out, args.rows, days=args.days, seed=args.seed)
+    print(f"Written {args.rows:,} rows → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,201 @@
 from pathlib import Path
+from collections.abc import MutableMapping
 import datetime
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # ── Base paths ───────────────────────────────────────────────────────────────
 BASE_DIR = Path.cwd()
 DATA_DIR = BASE_DIR / "data"
 OUTPUT_DIR = BASE_DIR / "output"
 
-# Ensure directories exist
-DATA_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+
+def ensure_directories():
+    """Create the data and output directories (called by the commands that write files)"""
+    DATA_DIR.mkdir(exist_ok=True)
+    OUTPUT_DIR.mkdir(exist_ok=True)
+
 
 # ── Configuration ────────────────────────────────────────────────────────────
-CONFIG = {
-    # Data paths and filenames
-    "input_csv": DATA_DIR / "sales.csv",
-    "output_dir": OUTPUT_DIR,
-    "excel_data_filename": "Weekly_Data.xlsx",
-    "excel_report_filename": "Weekly_Report.xlsx",     
-    "zip_filename_template": "Weekly_Sales_Report_{date}.zip",
-    "excel_sheet": "dashboard_data",
-    # Data validation settings
-    "expected_columns": [
-        "Invoice ID", "Branch", "City", "Customer type", "Gender",
-        "Product line", "Unit price", "Quantity", "Tax 5%", "Sales",
-        "Date", "Time", "Payment", "cogs", "gross margin percentage",
-        "gross income", "Rating"
-    ],
-    "valid_branches": {"Alex", "Giza", "Cairo", "Yangon", "Mandalay", "Naypyitaw"},
-    "valid_cities": {"Yangon", "Mandalay", "Naypyitaw"},
-    "valid_customer_types": {"Member", "Normal"},
-    "valid_genders": {"Male", "Female"},
-    "valid_payments": {"Cash", "Credit card", "Ewallet"},
-    "date_format_hints": ["%m/%d/%Y", "%d/%m/%Y", "%Y-%m-%d"],
-    # Email settings
-    "email_from": os.getenv("EMAIL_FROM"),
-    "email_to": os.getenv("EMAIL_TO"),
-    "email_password": os.getenv("EMAIL_PASSWORD"),
-    "smtp_server": "smtp.gmail.com",
-    "smtp_port": 587,
-}
+def _load_config() -> dict:
+    # .env is read here, on first use of CONFIG, not when config is imported
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    return {
+        # Data paths and filenames
+        "input_csv": DATA_DIR / "sales.csv",
+        "output_dir": OUTPUT_DIR,
+        "excel_data_filename": "Weekly_Data.xlsx",
+        "excel_report_filename": "Weekly_Report.xlsx",     
+        # Presentation template: its tables / defined names named like the report tables
+        # (tbl_kpis, ...) and insight_1, insight_2, ... are filled into each Weekly_Report.xlsx
+        "report_template": BASE_DIR / "templates" / "Weekly_Report.xlsx",
+        "zip_filename_template": "Weekly_Sales_Report_{date}.zip",
+        # ZIP packaging: DEFLATE level (0 = store everything), suffixes stored as-is
+        # (xlsx files are already ZIP archives), compression threads, checksum manifest
+        "zip_compression_level": 6,
+        "zip_store_suffixes": [".xlsx"],
+        "zip_workers": None,  # None → one per CPU
+        "zip_manifest": True,
+        "excel_sheet": "dashboard_data",
+        # Optional sheet(s) with the raw transactions of the current week
+        "include_detail_sheet": False,
+        "detail_sheet_name": "week_detail",
+        "detail_chunk_rows": 50_000,
+        # Loaded frames as compact dtypes: categoricals for the enumerations and
+        # Invoice ID, int32 / float32 where exact (see src/data.py COMPACT_NUMERIC)
+        "compact_frames": True,
+        # Streaming load (for CSV files too large to fit in memory)
+        "stream_input": False,
+        "csv_chunksize": 250_000,
+        # Typed Parquet copy of the input next to the CSV (reused while the CSV is unchanged)
+        "use_ingest_cache": True,
+        # Append-only store of daily files partitioned by date (see --ingest)
+        "partition_store": DATA_DIR / "store",
+        "use_partition_store": False,
+        # With the partition store: compute KPIs from its daily rollup instead of raw transactions
+        "use_daily_cube": True,
+        # With the partition store: engine of the aggregate and trend stages, "pandas" or
+        # "duckdb" (pip install duckdb: SQL over the Parquet parts, multi-threaded, spills
+        # to disk, so the history isn't loaded; see src/engine.py)
+        "compute_engine": "pandas",
+        "duckdb_threads": None,  # None → one per CPU
+        "duckdb_memory_limit": None,  # e.g. "4GB"; None → 80% of RAM
+        "duckdb_temp_dir": OUTPUT_DIR / ".duckdb",
+        # Distinct invoices: "exact" or "approximate" (HyperLogLog sketches, merged
+        # per day and branch from the partition store's sketch file)
+        "distinct_count_mode": "exact",
+        "hll_precision": 12,  # 2**12 registers per sketch, ~1.6% standard error
+        # Backfill mode (--backfill START END): output_dir/<backfill_subdir>/week_<Monday>/
+        "backfill_subdir": "backfill",
+        # Rolling 13/52-week and year-over-year trend tables (full history only)
+        "include_trend_tables": True,
+        "trend_table_weeks": 13,  # weeks listed in tbl_weekly_trends
+        # Hour × weekday sales and transactions per branch (tbl_hourly_sales, tbl_hourly_transactions)
+        "include_heatmap_tables": True,
+        # KPI engine (see src/kpi_plan.py). Extra measures: name → [column, "sum" | "count"],
+        # aggregated once each in the single grouped pass, next to the built-in sales,
+        # quantity, gross_income, rating_sum and rating_count; "transactions" = distinct invoices
+        "kpi_measures": {},
+        # KPIs of tbl_kpis, in order: `of` a measure or earlier KPI, optionally `per`
+        # another one, rounded to `decimals` (0 → integer), Excel number `format`
+        "kpi_definitions": [
+            {"name": "Total Sales", "of": "sales", "decimals": 1, "format": "#,##0.0"},
+            {"name": "Transactions", "of": "transactions", "decimals": 0, "format": "#,##0"},
+            {"name": "Average Ticket", "of": "Total Sales", "per": "Transactions", "decimals": 1,
+             "format": "#,##0.0"},
+            {"name": "Average Rating", "of": "rating_sum", "per": "rating_count", "decimals": 1, "format": "0.0"},
+            {"name": "Total Quantity", "of": "quantity", "decimals": 0, "format": "#,##0"},
+            {"name": "Gross Income", "of": "gross_income", "decimals": 1, "format": "#,##0.0"},
+        ],
+        # Current-week breakdowns: one table per column (tbl_kpis_by_<column> unless
+        # `table` is given), one row per value, one column per listed KPI. The columns are
+        # grouping keys of the same pass (and of the daily cube, rebuilt when they change)
+        "kpi_dimensions": [
+            {"column": "Customer type", "kpis": ["Total Sales", "Transactions", "Average Ticket", "Average Rating"]},
+            {"column": "Gender", "kpis": ["Total Sales", "Transactions", "Average Ticket", "Average Rating"]},
+        ],
+        # Batch mode (--batch): one report per value of each column, built in a process pool
+        "batch_slice_columns": ["Branch", "City"],
+        "batch_workers": None,  # None → one per CPU
+        # Data validation settings
+        "expected_columns": [
+            "Invoice ID", "Branch", "City", "Customer type", "Gender",
+            "Product line", "Unit price", "Quantity", "Tax 5%", "Sales",
+            "Date", "Time", "Payment", "cogs", "gross margin percentage",
+            "gross income", "Rating"
+        ],
+        "valid_branches": {"Alex", "Giza", "Cairo", "Yangon", "Mandalay", "Naypyitaw"},
+        "valid_cities": {"Yangon", "Mandalay", "Naypyitaw"},
+        "valid_customer_types": {"Member", "Normal"},
+        "valid_genders": {"Male", "Female"},
+        "valid_payments": {"Cash", "Credit card", "Ewallet"},
+        # "strict": stop on rows failing critical checks; "quarantine": move them to
+        # quarantine_dir/<input>.quarantine.csv and report on the remaining rows
+        "validation_mode": "strict",
+        "quarantine_dir": DATA_DIR / "quarantine",
+        "date_format_hints": ["%m/%d/%Y", "%d/%m/%Y", "%Y-%m-%d"],
+        # Stage result cache: skip unchanged stages on reruns (same input, config, code and day)
+        "use_result_cache": True,
+        "result_cache_dir": OUTPUT_DIR / ".cache",
+        "result_cache_max_bytes": 500 * 2**20,
+        "result_cache_max_age_days": 30,
+        # Watch-folder service (python -m src.cli watch): folder, polling interval when
+        # watchdog isn't installed, quiet time before a run, delay before the files of a
+        # failed run are run again, status of the service
+        "watch_dir": DATA_DIR,
+        "watch_poll_seconds": 2.0,
+        "watch_debounce_seconds": 2.0,
+        "watch_retry_seconds": 60.0,
+        "watch_status_file": OUTPUT_DIR / "watch_status.json",
+        # Hand-over files between the stage commands of src/cli.py (compute → render → package → send)
+        "stage_dir": OUTPUT_DIR / ".stages",
+        # Run instrumentation: one JSON record per run, optional Prometheus textfile
+        "run_metrics_dir": OUTPUT_DIR / "run_metrics",
+        "prometheus_textfile": os.getenv("PROMETHEUS_TEXTFILE"),
+        # Email settings
+        "email_from": os.getenv("EMAIL_FROM"),
+        "email_to": os.getenv("EMAIL_TO"),  # comma or semicolon separated addresses
+        "email_password": os.getenv("EMAIL_PASSWORD"),  # empty → no login (local test server)
+        # Recipients of the --batch slice reports, e.g. SLICE_EMAIL_TO='{"Branch_A": "a@x.com, b@x.com"}'
+        # (JSON, parsed when the slice emails are sent: see email_handler.parse_slice_recipients)
+        "slice_email_to": os.getenv("SLICE_EMAIL_TO"),
+        "smtp_server": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        "smtp_port": int(os.getenv("SMTP_PORT", "587")),
+        "smtp_starttls": os.getenv("SMTP_STARTTLS", "1") != "0",  # 0 for a local stand-in such as aiosmtpd
+        "smtp_timeout": 60,
+        "smtp_connections": 4,  # messages sent at once, each SMTP session reused for the whole batch
+        # Outbox of undelivered emails, retried on later runs after 5, 10, 20, ... minutes
+        "email_outbox_dir": OUTPUT_DIR / "outbox",
+        "email_retry_base_seconds": 300,
+        "email_max_attempts": 6,
+    }
+
+
+class _LazyConfig(MutableMapping):
+    """
+    The CONFIG mapping, built by _load_config on first access: importing
+    config (or any module importing it) costs nothing, and commands that
+    never read a setting (--help) never load .env.
+    """
+
+    def __init__(self):
+        self._values = None
+
+    def _settings(self) -> dict:
+        if self._values is None:
+            self._values = _load_config()
+        return self._values
+
+    def __getitem__(self, key):
+        return self._settings()[key]
+
+    def __setitem__(self, key, value):
+        self._settings()[key] = value
+
+    def __delitem__(self, key):
+        del self._settings()[key]
+
+    def __iter__(self):
+        return iter(self._settings())
+
+    def __len__(self):
+        return len(self._settings())
+
+    def __repr__(self):
+        return repr(self._settings())
+
+
+CONFIG = _LazyConfig()
 
 # Calculated paths (updated with current date when needed)
-def get_paths(today: datetime.date):
+def get_paths(today: datetime.date, subdir: str = None):
     date_str = today.strftime("%Y-%m-%d")
+    output_dir = CONFIG["output_dir"] / subdir if subdir else CONFIG["output_dir"]
     return {
         "input_csv": CONFIG["input_csv"],
-        "output_dir": CONFIG["output_dir"],
-        "excel_data": CONFIG["output_dir"] / CONFIG["excel_data_filename"],
-        "excel_report": CONFIG["output_dir"] / CONFIG["excel_report_filename"],
-        "zip_file": CONFIG["output_dir"] / CONFIG["zip_filename_template"].format(date=date_str),
+        "output_dir": output_dir,
+        "excel_data": output_dir / CONFIG["excel_data_filename"],
+        "excel_report": output_dir / CONFIG["excel_report_filename"],
+        "zip_file": output_dir / CONFIG["zip_filename_template"].format(date=date_str),
     }
\ No newline at end of file
@@ -1,81 +1,377 @@
-from datetime import datetime
+import argparse
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
-from config import get_paths, CONFIG
-from src.data import load_and_validate_sales_data
-from src.date_utils import get_reporting_periods
-from src.metrics import calculate_kpis
-from src.insights import generate_insights
-from src.tables import create_all_tables
-from src.excel_report import create_formatted_excel_report
-from src.zip_handler import create_report_zip
-from src.email_handler import send_weekly_report_email
+from config import get_paths, ensure_directories, CONFIG
+from src.instrumentation import RunRecorder
 
+# Pipeline modules (pandas, numpy, openpyxl, smtplib) are imported inside the
+# functions that use them: `--help` and the light CLI commands skip them
 
-def main():
-    today = datetime.now().date()
-    paths = get_paths(today)
 
-    print(f"Generating weekly sales report for {today:%Y-%m-%d}")
+def add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options of a full pipeline run (main.py and `python -m src.cli run`)"""
+    parser.add_argument(
+        "--ingest", nargs="+", type=Path, metavar="CSV",
+        help="validate new daily CSV file(s), append them to the partitioned store "
+             "and build the report from the store"
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="also generate one report per branch and per city (CONFIG['batch_slice_columns'])"
+    )
+    parser.add_argument(
+        "--backfill", nargs=2, type=date.fromisoformat, metavar=("START", "END"),
+        help="regenerate the reports of every week between START and END (YYYY-MM-DD) "
+             "in parallel instead of the current report"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate the weekly sales report")
+    add_run_arguments(parser)
+    return parser.parse_args()
+
+
+def load_report_data(args, recorder: RunRecorder, paths: dict) -> dict:
+    """Step 1: load the validated transactions, or the daily cube of the partition store"""
+    from src.cube import (
+        CUBE_FILENAME, cube_matches_plan, load_daily_cube, load_invoice_sketches, rebuild_daily_cube, sketch_path_for,
+    )
+    from src.data import load_and_validate_sales_data, load_sales_data_cached, stream_and_validate_sales_data
+    from src.date_utils import get_reporting_periods
+    from src.engine import DuckDBEngine, use_duckdb_engine
+    from src.ingest import iter_partitions, latest_partition_date, load_partitions
+
+    df = cube = sketches = engine = latest_date = None
+    with recorder.stage("load") as stage:
+        if args.ingest or CONFIG["use_partition_store"]:
+            store_dir = CONFIG["partition_store"]
+            latest_date = latest_partition_date(store_dir)
+            use_engine = use_duckdb_engine()
+            if use_engine and (args.batch or args.backfill):
+                print("Batch and backfill slices need loaded data: compute_engine 'duckdb' ignored for this run")
+                use_engine = False
+            if use_engine:
+                # Nothing loaded: the aggregate and trend stages query the part files
+                engine = DuckDBEngine(store_dir, CONFIG["duckdb_threads"], CONFIG["duckdb_memory_limit"],
+                                      CONFIG["duckdb_temp_dir"])
+            elif CONFIG["use_daily_cube"]:
+                # Report windows are answered from the daily rollup, not from transactions
+                cube_path = store_dir / CUBE_FILENAME
+                approximate = CONFIG["distinct_count_mode"] == "approximate"
+                if cube_path.exists() and (sketch_path_for(cube_path).exists() or not approximate):
+                    cube = load_daily_cube(cube_path)
+                if cube is None or not cube_matches_plan(cube):  # missing, or built for other KPIs
+                    cube = rebuild_daily_cube(cube_path, iter_partitions(store_dir))
+                if approximate:
+                    # Transactions are merged from the day × branch invoice sketches
+                    sketches = load_invoice_sketches(sketch_path_for(cube_path))
+            else:
+                # Only the partitions covering the reporting windows are read
+                store_periods = get_reporting_periods(latest_date)
+                first_day = store_periods["four_weeks"][0]
+                if args.backfill:
+                    first_day = args.backfill[0] - timedelta(days=args.backfill[0].weekday() + 28)
+                df = load_partitions(store_dir, first_day, store_periods["current"][1])
+        elif CONFIG["stream_input"] and not args.backfill:
+            df = stream_and_validate_sales_data(paths["input_csv"], CONFIG["csv_chunksize"])
+        elif CONFIG["use_ingest_cache"]:
+            df = load_sales_data_cached(paths["input_csv"])
+        else:
+            df = load_and_validate_sales_data(paths["input_csv"])
+        frame = df if cube is None else cube
+        if frame is not None:
+            stage["rows_out"] = len(frame)
+            stage["warnings"] = frame.attrs.get("validation_warnings", {})
+            stage["memory_bytes"] = frame.attrs.get("memory_bytes")
+
+    # Trends need the whole history: the cube, the DuckDB engine or the complete CSV, not only the report windows
+    windowed = args.ingest or CONFIG["use_partition_store"] or (CONFIG["stream_input"] and not args.backfill)
+    return {
+        "df": df,
+        "cube": cube,
+        "sketches": sketches,
+        "engine": engine,
+        "frame": frame,
+        "latest_date": latest_date if df is None else df["Date"].max(),
+        "with_trends": CONFIG["include_trend_tables"] and (cube is not None or engine is not None or not windowed),
+    }
 
-    # 1. Load data
-    df = load_and_validate_sales_data(paths["input_csv"])
+
+def compute_report(data: dict, recorder: RunRecorder) -> dict:
+    """Steps 2-6: periods, aggregates, trends, heatmap, KPIs, insights and the ordered report tables"""
+    from src.cube import aggregates_from_cube
+    from src.date_utils import get_reporting_periods
+    from src.heatmap import hourly_heatmap
+    from src.insights import generate_insights
+    from src.metrics import calculate_kpis, compute_period_aggregates
+    from src.tables import create_all_tables
+    from src.trends import compute_trends, weekly_totals
+
+    frame, cube, engine = data["frame"], data["cube"], data["engine"]
+    rows_in = None if frame is None else len(frame)
 
     # 2. Determine periods
-    periods = get_reporting_periods(df["Date"].max())
+    with recorder.stage("periods"):
+        periods = get_reporting_periods(data["latest_date"])
 
-    # 3. Filter dataframes
-    week_start, week_end = periods["current"]
-    last_start, last_end = periods["last_week"]
-    four_start, four_end = periods["four_weeks"]
+    # 3. Aggregate every period and breakdown in one grouped pass
+    with recorder.stage("aggregate", rows_in=rows_in) as stage:
+        if engine is not None:
+            aggregates = engine.period_aggregates(periods)
+        elif cube is None:
+            aggregates = compute_period_aggregates(frame, periods)
+        else:
+            aggregates = aggregates_from_cube(cube, periods, data["sketches"])
+        stage["rows_out"] = aggregates["current"]["transactions"]
 
-    df_week = df[(df["Date"] >= week_start) & (df["Date"] <= week_end)]
-    df_last = df[(df["Date"] >= last_start) & (df["Date"] <= last_end)]
-    df_four = df[(df["Date"] >= four_start) & (df["Date"] <= four_end)]
+    # 3b. Rolling 13/52-week and YoY trends
+    trends = None
+    if data["with_trends"]:
+        with recorder.stage("trends", rows_in=rows_in) as stage:
+            if engine is not None:
+                weekly = engine.weekly_totals(periods["current"][0])
+            else:
+                weekly = weekly_totals(frame, periods["current"][0], from_cube=cube is not None)
+            trends = compute_trends(weekly)
+            stage["rows_out"] = len(trends)
+
+    # 3c. Hour × weekday × branch sales of the current week (from transactions: the cube has no Time)
+    heatmap = None
+    if CONFIG["include_heatmap_tables"]:
+        week = current_week_detail(data, periods)
+        with recorder.stage("heatmap", rows_in=len(week)) as stage:
+            heatmap = hourly_heatmap(week)
+            stage["rows_out"] = int(heatmap["transactions"].sum())
 
     # 4. Calculate KPIs
-    metrics = calculate_kpis(df_week, df_last, df_four)
+    with recorder.stage("kpis"):
+        metrics = calculate_kpis(aggregates)
 
     # 5. Generate insights
-    insights_list = generate_insights(
-        metrics, metrics["top_product"], metrics["top_branch"], metrics["top_payment"],
-        metrics["top_product_sales"], metrics["top_branch_sales"], metrics["total_sales"]
-    )
+    with recorder.stage("insights") as stage:
+        insights_list = generate_insights(
+            metrics, metrics["top_product"], metrics["top_branch"], metrics["top_payment"],
+            metrics["top_product_sales"], metrics["top_branch_sales"], metrics["total_sales"]
+        )
+        stage["rows_out"] = len(insights_list)
 
     # 6. Prepare tables → We pass all the required arguments to ordered table creation
-    all_tables_list = create_all_tables(
-        metrics=metrics,
-        insights_list=insights_list,
-        periods=periods,
-        df_week=df_week,
-        top_product=metrics["top_product"],
-        top_product_sales=metrics["top_product_sales"],
-        top_branch=metrics["top_branch"],
-        top_branch_sales=metrics["top_branch_sales"],
-        top_payment=metrics["top_payment"],
-        top_payment_share=metrics["top_payment_share"]
+    with recorder.stage("tables") as stage:
+        all_tables_list = create_all_tables(
+            metrics=metrics,
+            insights_list=insights_list,
+            periods=periods,
+            aggregates=aggregates,
+            top_product=metrics["top_product"],
+            top_product_sales=metrics["top_product_sales"],
+            top_branch=metrics["top_branch"],
+            top_branch_sales=metrics["top_branch_sales"],
+            top_payment=metrics["top_payment"],
+            top_payment_share=metrics["top_payment_share"],
+            trends=trends,
+            heatmap=heatmap
+        )
+        stage["rows_out"] = sum(len(df_table) for _, df_table in all_tables_list)
+
+    return {"periods": periods, "metrics": metrics, "tables": all_tables_list}
+
+
+def current_week_detail(data: dict, periods: dict):
+    """Transactions of the current week for the detail sheet (read from the store when only the cube is loaded)"""
+    week_start, week_end = periods["current"]
+    if data["df"] is None:
+        from src.ingest import load_partitions
+        return load_partitions(CONFIG["partition_store"], week_start, week_end)
+    df = data["df"]
+    return df[(df["Date"] >= week_start) & (df["Date"] <= week_end)]
+
+
+def _input_fingerprint(args, paths: dict) -> str:
+    """Content hash of the report input: the CSV, or the set of files ingested into the store"""
+    from src.data import source_sha256
+    from src.ingest import store_fingerprint
+
+    if args.ingest or CONFIG["use_partition_store"]:
+        return store_fingerprint(CONFIG["partition_store"])
+    return source_sha256(paths["input_csv"])
+
+
+def _cache_keys(args, paths: dict, today) -> dict:
+    """
+    Content addresses of the compute, Excel, template and ZIP stages. Each
+    key chains the previous one, so a changed input invalidates every later
+    stage.
+    """
+    from src.report_template import configured_template
+    from src.result_cache import RESULT_CACHE_CONFIG_KEYS, cache_key, code_fingerprint, sha256_file
+
+    compute_key = cache_key(
+        "compute", _input_fingerprint(args, paths), code_fingerprint(), f"{today:%Y-%m-%d}",
+        {key: CONFIG[key] for key in RESULT_CACHE_CONFIG_KEYS},
     )
+    excel_key = cache_key(
+        "excel", compute_key,
+        {key: CONFIG[key] for key in ("include_detail_sheet", "detail_sheet_name", "detail_chunk_rows")},
+    )
+    template = configured_template()
+    report_key = cache_key("report", compute_key, sha256_file(template)) if template else None
+    # Without a template, a Weekly_Report.xlsx left in the output folder is zipped as it is
+    report_file = paths["excel_report"]
+    zip_key = cache_key(
+        "zip", excel_key, report_key or (sha256_file(report_file) if report_file.exists() else None),
+        {key: CONFIG[key] for key in ("zip_compression_level", "zip_store_suffixes", "zip_manifest")},
+    )
+    return {"compute": compute_key, "excel": excel_key, "report": report_key, "zip": zip_key}
+
+
+def main(args, recorder: RunRecorder, data: dict = None) -> dict:
+    """
+    The whole pipeline. `data` is what load_report_data returned on a
+    previous run, still valid for this one (see src/watch.py): it is used
+    instead of loading the input again. Returns the data used, if loaded
+    (its DuckDB engine, if any, is closed once the run ends).
+    """
+    from src.batch import run_backfill_reports, run_batch_reports
+    from src.email_handler import parse_slice_recipients, report_email, send_report_emails
+    from src.excel_report import create_formatted_excel_report
+    from src.ingest import ingest_daily_file
+    from src.report_template import configured_template, render_report_template
+    from src.result_cache import ResultCache
+    from src.zip_handler import create_report_zip, remove_old_zips
+
+    today = datetime.now().date()
+    paths = get_paths(today)
+    ensure_directories()
+
+    # 0. Incremental ingestion: only the new files are validated
+    if args.ingest:
+        with recorder.stage("ingest") as stage:
+            stage["rows_out"] = sum(
+                ingest_daily_file(new_file, CONFIG["partition_store"]) for new_file in args.ingest
+            )
+
+    print(f"Generating weekly sales report for {today:%Y-%m-%d}")
 
-    # 7. Create Excel (receives the ordered list of tables)
-    create_formatted_excel_report(paths["excel_data"], all_tables_list)
+    # Stage cache: unchanged input, config, code and date → reuse the results
+    cache = keys = None
+    if CONFIG["use_result_cache"] and not args.backfill:
+        cache = ResultCache(CONFIG["result_cache_dir"], CONFIG["result_cache_max_bytes"],
+                            CONFIG["result_cache_max_age_days"])
+        keys = _cache_keys(args, paths, today)
 
-    # 8. Create ZIP (including both Excel files)
-    zip_path = create_report_zip(
-        output_dir=paths["output_dir"],
-        excel_data_path=paths["excel_data"],
-        excel_report_path=paths["excel_report"],
-        zip_path=paths["zip_file"]
+    # The loaded data is still needed for batch slices, or for the detail
+    # sheet of a workbook that isn't cached
+    report = cache.get(keys["compute"]) if cache else None
+    needs_data = args.backfill or args.batch or (
+        CONFIG["include_detail_sheet"] and not (cache and cache.has_artefact(keys["excel"], paths["excel_data"].name))
     )
 
-    # 9. Send email
-    send_weekly_report_email(zip_path, periods)
+    try:
+        if data is None and (report is None or needs_data):
+            # 1. Load data (streamed in chunks for very large files)
+            data = load_report_data(args, recorder, paths)
+
+        # Backfill: every week of the range from the data loaded above
+        if args.backfill:
+            with recorder.stage("backfill", rows_in=len(data["frame"])) as stage:
+                results = run_backfill_reports(
+                    data["frame"], *args.backfill, from_cube=data["cube"] is not None,
+                    sketches=data["sketches"], with_trends=data["with_trends"]
+                )
+                stage["rows_out"] = sum(path is not None for path in results.values())
+            return data
+
+        # 2-6. Periods, aggregates, KPIs, insights and tables
+        if report is None:
+            report = compute_report(data, recorder)
+            if cache:
+                cache.put(keys["compute"], report)
+        else:
+            print("Input, configuration and code unchanged: reusing cached KPIs and tables")
+        periods = report["periods"]
+
+        # 7. Create Excel (receives the ordered list of tables)
+        with recorder.stage("excel") as stage:
+            if cache and cache.restore(keys["excel"], paths["excel_data"]):
+                print(f"Excel report reused from cache: {paths['excel_data']}")
+            else:
+                df_detail = None
+                if CONFIG["include_detail_sheet"]:
+                    df_detail = current_week_detail(data, periods)
+                    stage["rows_in"] = len(df_detail)
+                create_formatted_excel_report(
+                    paths["excel_data"], report["tables"], df_detail=df_detail,
+                    detail_sheet=CONFIG["detail_sheet_name"], detail_chunk_rows=CONFIG["detail_chunk_rows"]
+                )
+                stage["bytes_written"] = paths["excel_data"].stat().st_size
+                if cache:
+                    cache.put(keys["excel"], artefacts=[paths["excel_data"]])
+
+        # 7b. Fill the report template with the same tables → Weekly_Report.xlsx
+        template = configured_template()
+        if template:
+            with recorder.stage("template") as stage:
+                if cache and cache.restore(keys["report"], paths["excel_report"]):
+                    print(f"Report reused from cache: {paths['excel_report']}")
+                else:
+                    render_report_template(template, paths["excel_report"], report["tables"])
+                    stage["bytes_written"] = paths["excel_report"].stat().st_size
+                    if cache:
+                        cache.put(keys["report"], artefacts=[paths["excel_report"]])
 
-    print("Weekly report process completed.")
+        # 8. Create ZIP (including both Excel files)
+        with recorder.stage("zip") as stage:
+            if cache and cache.restore(keys["zip"], paths["zip_file"]):
+                zip_path = paths["zip_file"]
+                remove_old_zips(paths["output_dir"], keep=zip_path)  # as create_report_zip does
+                print(f"ZIP reused from cache: {zip_path.name}")
+            else:
+                zip_path = create_report_zip(
+                    output_dir=paths["output_dir"],
+                    excel_data_path=paths["excel_data"],
+                    excel_report_path=paths["excel_report"],
+                    zip_path=paths["zip_file"]
+                )
+                stage["bytes_written"] = zip_path.stat().st_size
+                if cache:
+                    cache.put(keys["zip"], artefacts=[zip_path])
+
+        if cache:
+            cache.evict()
+
+        # 9. Per-slice reports from the same loaded data
+        batch_results = {}
+        if args.batch:
+            with recorder.stage("batch", rows_in=len(data["frame"])) as stage:
+                batch_results = run_batch_reports(
+                    data["frame"], periods, today, from_cube=data["cube"] is not None,
+                    sketches=data["sketches"], with_trends=data["with_trends"]
+                )
+                stage["rows_out"] = sum(path is not None for path in batch_results.values())
+
+        # 10. Send email: the report, plus the slice reports that have recipients, in one SMTP batch
+        with recorder.stage("email") as stage:
+            deliveries = [report_email(zip_path, periods, CONFIG["email_to"])]
+            slice_recipients = parse_slice_recipients(CONFIG["slice_email_to"]) if batch_results else {}
+            for name, slice_zip in sorted(batch_results.items()):
+                recipients = slice_recipients.get(name)
+                if slice_zip is not None and recipients:
+                    deliveries.append(report_email(slice_zip, periods, recipients, title=f"Weekly Sales Report - {name}"))
+            outcome = send_report_emails(deliveries)
+            stage["rows_out"] = outcome["sent"]
+            stage["emails"] = outcome
+
+        print("Weekly report process completed.")
+        return data
+    finally:
+        # The DuckDB connection isn't kept between runs: a later run (watch) loads the data again
+        if data is not None and data["engine"] is not None:
+            data["engine"].close()
 
 
 if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        print(f"ERROR: {e}")
-        exit(1)
\ No newline at end of file
+    from src.cli import run_recorded
+
+    exit(run_recorded(main, parse_args()))
@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from config import CONFIG, get_paths
+from src.cube import aggregates_from_cube
+from src.date_utils import get_reporting_periods
+from src.excel_report import create_formatted_excel_report
+from src.heatmap import hourly_heatmap
+from src.insights import generate_insights
+from src.metrics import compute_period_aggregates, calculate_kpis
+from src.report_template import configured_template, load_template, render_report_template
+from src.tables import create_all_tables
+from src.trends import compute_trends, weekly_totals
+from src.zip_handler import create_report_zip
+
+# Data shared read-only with the workers. With the "fork" start method it is
+# set before the pool starts and inherited copy-on-write; otherwise each
+# worker receives it once through the pool initializer.
+_SHARED = {}
+
+
+def _init_worker(frame: pd.DataFrame, from_cube: bool, sketches: pd.DataFrame = None, with_trends: bool = False):
+    _SHARED["frame"] = frame
+    _SHARED["from_cube"] = from_cube
+    _SHARED["sketches"] = sketches
+    _SHARED["with_trends"] = with_trends
+    # Parsed once here (before the fork, or once per spawned worker), reused by every report
+    _SHARED["template"] = configured_template()
+    if _SHARED["template"]:
+        load_template(_SHARED["template"])
+
+
+def slice_name(column: str, value) -> str:
+    """Folder-safe name of a report slice, e.g. ("City", "Naypyitaw") → City_Naypyitaw"""
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", f"{column}_{value}")
+
+
+def _build_report(frame: pd.DataFrame, sketches: pd.DataFrame, periods: dict, today, subdir: str):
+    """
+    Run the metrics → tables → Excel → ZIP chain on `frame` inside a worker.
+    Returns the ZIP path, or None when the current week has no sales.
+    """
+    if _SHARED["from_cube"]:
+        aggregates = aggregates_from_cube(frame, periods, sketches)
+    else:
+        aggregates = compute_period_aggregates(frame, periods)
+
+    if not aggregates["current"]["transactions"]:
+        return None
+
+    trends = None
+    if _SHARED["with_trends"]:
+        trends = compute_trends(weekly_totals(frame, periods["current"][0], from_cube=_SHARED["from_cube"]))
+
+    # The cube has no Time: the heatmap tables come with transaction-level slices only
+    heatmap = None
+    if CONFIG["include_heatmap_tables"] and not _SHARED["from_cube"]:
+        week_start, week_end = periods["current"]
+        heatmap = hourly_heatmap(frame[(frame["Date"] >= week_start) & (frame["Date"] <= week_end)])
+
+    metrics = calculate_kpis(aggregates)
+    insights_list = generate_insights(
+        metrics, metrics["top_product"], metrics["top_branch"], metrics["top_payment"],
+        metrics["top_product_sales"], metrics["top_branch_sales"], metrics["total_sales"]
+    )
+    all_tables_list = create_all_tables(
+        metrics=metrics,
+        insights_list=insights_list,
+        periods=periods,
+        aggregates=aggregates,
+        top_product=metrics["top_product"],
+        top_product_sales=metrics["top_product_sales"],
+        top_branch=metrics["top_branch"],
+        top_branch_sales=metrics["top_branch_sales"],
+        top_payment=metrics["top_payment"],
+        top_payment_share=metrics["top_payment_share"],
+        trends=trends,
+        heatmap=heatmap
+    )
+
+    paths = get_paths(today, subdir=subdir)
+    paths["output_dir"].mkdir(parents=True, exist_ok=True)
+    create_formatted_excel_report(paths["excel_data"], all_tables_list)
+    if _SHARED["template"]:
+        render_report_template(_SHARED["template"], paths["excel_report"], all_tables_list)
+    return create_report_zip(
+        output_dir=paths["output_dir"],
+        excel_data_path=paths["excel_data"],
+        excel_report_path=paths["excel_report"],
+        zip_path=paths["zip_file"]
+    )
+
+
+def _build_slice_report(column: str, value, periods: dict, today) -> tuple:
+    """One branch / city report: the shared data filtered to the slice"""
+    frame = _SHARED["frame"]
+    sketches = _SHARED["sketches"]
+    if sketches is not None:
+        sketches = sketches[sketches[column] == value]
+
+    name = slice_name(column, value)
+    return name, _build_report(frame[frame[column] == value], sketches, periods, today, name)
+
+
+def _build_week_report(periods: dict, subdir: str) -> tuple:
+    """One past week's report, dated with the last day of that week"""
+    week_end = periods["current"][1]
+    report_date = week_end.date() if hasattr(week_end, "date") else week_end
+    return subdir, _build_report(_SHARED["frame"], _SHARED["sketches"], periods, report_date, subdir)
+
+
+def _run_in_pool(jobs: list, init_args: tuple, max_workers: int) -> dict:
+    """
+    Run jobs given as (label, function, *args) in a process pool sharing
+    the loaded data. Returns {report name: ZIP path or None}; failed jobs
+    are reported and left out.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _init_worker(*init_args)
+        pool_args = {}
+    else:
+        context = multiprocessing.get_context("spawn")
+        pool_args = {"initializer": _init_worker, "initargs": init_args}
+
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, **pool_args) as pool:
+            futures = {pool.submit(*job): label for label, *job in jobs}
+            for future in as_completed(futures):
+                try:
+                    name, zip_path = future.result()
+                except Exception as e:
+                    print(f"ERROR: Report for {futures[future]} failed: {e}")
+                    continue
+                if zip_path is None:
+                    print(f"Skipped {name}: no sales in the current week")
+                results[name] = zip_path
+    finally:
+        _SHARED.clear()
+    return results
+
+
+def run_batch_reports(frame: pd.DataFrame, periods: dict, today, from_cube: bool = False,
+                      slice_columns: list = None, max_workers: int = None,
+                      sketches: pd.DataFrame = None, with_trends: bool = False) -> dict:
+    """
+    Generate one report per value of each slice column (by default one per
+    Branch and one per City) in a process pool.
+
+    `frame` is the already loaded and validated transactions (or the daily
+    cube when from_cube=True); it is loaded once and shared read-only with
+    the workers. All slices use the same reporting periods. `sketches` are
+    the cube's invoice sketches in approximate distinct-count mode (slice
+    columns must then be sketch keys: Branch or City). With with_trends
+    each slice report also gets the trend tables of its own history.
+
+    Returns {slice name: ZIP path}, with None for slices without sales in
+    the current week.
+    """
+    slice_columns = slice_columns or CONFIG["batch_slice_columns"]
+    max_workers = max_workers or CONFIG["batch_workers"] or os.cpu_count()
+
+    jobs = [
+        (f"{column} = {value}", _build_slice_report, column, value, periods, today)
+        for column in slice_columns
+        for value in sorted(frame[column].dropna().unique())
+    ]
+    print(f"Generating {len(jobs)} slice reports with {max_workers} workers")
+
+    results = _run_in_pool(jobs, (frame, from_cube, sketches, with_trends), max_workers)
+
+    print(f"Batch completed: {sum(p is not None for p in results.values())}/{len(jobs)} slice reports")
+    return results
+
+
+def backfill_weeks(start, end) -> list:
+    """Reporting periods of every Monday-to-Sunday week overlapping start..end"""
+    first_monday = pd.Timestamp(start) - pd.Timedelta(days=pd.Timestamp(start).weekday())
+    return [
+        get_reporting_periods(week_start + pd.Timedelta(days=6))
+        for week_start in pd.date_range(first_monday, pd.Timestamp(end), freq="7D")
+    ]
+
+
+def run_backfill_reports(frame: pd.DataFrame, start, end, from_cube: bool = False,
+                         max_workers: int = None, sketches: pd.DataFrame = None,
+                         with_trends: bool = False) -> dict:
+    """
+    Regenerate the reports of every week between start and end in a process
+    pool, from data loaded once (transactions or the daily cube).
+
+    Each week is reported as if it were the latest one: its periods come
+    from get_reporting_periods(Sunday of the week) and its files go to
+    get_paths(Sunday, subdir="backfill/week_<Monday>"), so the ZIP carries
+    the week's date instead of today's.
+
+    Returns {week folder: ZIP path}, with None for weeks without sales.
+    """
+    max_workers = max_workers or CONFIG["batch_workers"] or os.cpu_count()
+
+    jobs = [
+        (f"week of {periods['current'][0]:%Y-%m-%d}", _build_week_report, periods,
+         f"{CONFIG['backfill_subdir']}/week_{periods['current'][0]:%Y-%m-%d}")
+        for periods in backfill_weeks(start, end)
+    ]
+    print(f"Backfilling {len(jobs)} weekly reports with {max_workers} workers")
+
+    results = _run_in_pool(jobs, (frame, from_cube, sketches, with_trends), max_workers)
+
+    print(f"Backfill completed: {sum(p is not None for p in results.values())}/{len(jobs)} weekly reports")
+    return results
@@ -0,0 +1,260 @@
+"""
+Command-line entry point, one subcommand per pipeline stage:
+
+    python -m src.cli validate [CSV ...]   check input files (exit status 1 if any is rejected)
+    python -m src.cli compute              KPIs and tables of the current week
+    python -m src.cli render               Excel workbook(s) from the computed tables
+    python -m src.cli package              ZIP of the rendered workbook
+    python -m src.cli send                 email the packaged ZIP
+    python -m src.cli run [--batch ...]    the whole pipeline, as main.py
+    python -m src.cli watch [--batch]      re-run it whenever a CSV lands in the data folder
+
+The stages hand over through CONFIG["stage_dir"] (report.pkl and
+state.json), so they can run as separate scheduler jobs. Each command
+imports only the modules its stage needs: package and send never load
+pandas, and --help loads neither the pipeline nor .env.
+"""
+import argparse
+import json
+import pickle
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from config import CONFIG, ensure_directories, get_paths
+from src.instrumentation import RunRecorder
+
+REPORT_FILE = "report.pkl"
+STATE_FILE = "state.json"
+
+
+def run_recorded(command, args, recorder: RunRecorder = None) -> int:
+    """Run command(args, recorder) and always save its run record; returns the exit code"""
+    recorder = recorder or RunRecorder()
+    exit_code = 0
+    try:
+        command(args, recorder)
+    except SystemExit as e:
+        # Unreadable input files exit through sys.exit: still record them
+        exit_code = e.code if isinstance(e.code, int) else 1
+        if exit_code:
+            recorder.fail(e)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        recorder.fail(e)
+        exit_code = 1
+    finally:
+        try:
+            record_path = recorder.save(CONFIG["run_metrics_dir"], CONFIG["prometheus_textfile"])
+            print(f"Run metrics written to {record_path}")
+        except Exception as e:
+            print(f"Warning: Could not write run metrics ({e})")
+    return exit_code
+
+
+# ── Stage hand-over ──────────────────────────────────────────────────────────
+
+def _read_state(required: str, description: str, previous_command: str) -> dict:
+    """Hand-over state of the previous stages; exits if the `required` output isn't there yet"""
+    state_file = Path(CONFIG["stage_dir"]) / STATE_FILE
+    state = json.loads(state_file.read_text(encoding="utf-8")) if state_file.exists() else {}
+    if required not in state:
+        print(f"Error: No {description} in {state_file.parent}: run `python -m src.cli {previous_command}` first")
+        sys.exit(1)
+    return state
+
+
+def _write_state(state: dict) -> None:
+    stage_dir = Path(CONFIG["stage_dir"])
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    (stage_dir / STATE_FILE).write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+
+# ── Commands ─────────────────────────────────────────────────────────────────
+
+def validate(args, recorder: RunRecorder):
+    from src.data import load_and_validate_sales_data
+    from src.validation import ValidationError
+
+    rejected = 0
+    for csv_path in args.csv or [CONFIG["input_csv"]]:
+        with recorder.stage("validate") as stage:
+            try:
+                df = load_and_validate_sales_data(csv_path)
+            except (ValidationError, SystemExit) as e:
+                # Unreadable files exit through sys.exit (the reason is printed): check the others anyway
+                reason = "unreadable file" if isinstance(e, SystemExit) else e
+                print(f"REJECTED {csv_path}: {reason}")
+                stage["rows_out"] = 0
+                rejected += 1
+                continue
+            stage["rows_out"] = len(df)
+            stage["warnings"] = df.attrs.get("validation_warnings", {})
+            print(f"OK {csv_path}: {len(df):,} valid rows")
+    if rejected:
+        sys.exit(1)
+
+
+def compute(args, recorder: RunRecorder):
+    from main import compute_report, current_week_detail, load_report_data
+
+    ensure_directories()
+    today = datetime.now().date()
+    data = load_report_data(args, recorder, get_paths(today))
+    report = compute_report(data, recorder)
+    if CONFIG["include_detail_sheet"]:
+        report["detail"] = current_week_detail(data, report["periods"])
+
+    stage_dir = Path(CONFIG["stage_dir"])
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    with open(stage_dir / REPORT_FILE, "wb") as f:
+        pickle.dump(report, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    week_start, week_end = report["periods"]["current"]
+    _write_state({
+        "report_date": f"{today:%Y-%m-%d}",
+        "week_start": f"{week_start:%Y-%m-%d}",
+        "week_end": f"{week_end:%Y-%m-%d}",
+        "report": str(stage_dir / REPORT_FILE),
+    })
+    print(f"Report computed for {week_start:%d/%m/%Y} – {week_end:%d/%m/%Y}: {stage_dir / REPORT_FILE}")
+
+
+def render(args, recorder: RunRecorder):
+    from src.excel_report import create_formatted_excel_report
+    from src.report_template import configured_template, render_report_template
+
+    state = _read_state("report", "computed report", "compute")
+    with open(state["report"], "rb") as f:
+        report = pickle.load(f)
+    paths = get_paths(date.fromisoformat(state["report_date"]))
+    ensure_directories()
+
+    with recorder.stage("excel") as stage:
+        create_formatted_excel_report(
+            paths["excel_data"], report["tables"], df_detail=report.get("detail"),
+            detail_sheet=CONFIG["detail_sheet_name"], detail_chunk_rows=CONFIG["detail_chunk_rows"]
+        )
+        stage["bytes_written"] = paths["excel_data"].stat().st_size
+
+    template = configured_template()
+    if template:
+        with recorder.stage("template") as stage:
+            render_report_template(template, paths["excel_report"], report["tables"])
+            stage["bytes_written"] = paths["excel_report"].stat().st_size
+    _write_state({**state, "excel_data": str(paths["excel_data"])})
+
+
+def package(args, recorder: RunRecorder):
+    from src.zip_handler import create_report_zip
+
+    state = _read_state("excel_data", "rendered workbook", "render")
+    paths = get_paths(date.fromisoformat(state["report_date"]))
+
+    with recorder.stage("zip") as stage:
+        zip_path = create_report_zip(
+            output_dir=paths["output_dir"],
+            excel_data_path=paths["excel_data"],
+            excel_report_path=paths["excel_report"],
+            zip_path=paths["zip_file"]
+        )
+        stage["bytes_written"] = zip_path.stat().st_size
+    _write_state({**state, "zip_file": str(zip_path)})
+
+
+def send(args, recorder: RunRecorder):
+    from src.email_handler import report_email, send_report_emails
+
+    state = _read_state("zip_file", "packaged ZIP", "package")
+    periods = {"current": (date.fromisoformat(state["week_start"]), date.fromisoformat(state["week_end"]))}
+
+    with recorder.stage("email") as stage:
+        outcome = send_report_emails([report_email(Path(state["zip_file"]), periods, CONFIG["email_to"])])
+        stage["rows_out"] = outcome["sent"]
+        stage["emails"] = outcome
+
+
+def run(args, recorder: RunRecorder):
+    from main import main as run_pipeline
+
+    run_pipeline(args, recorder)
+
+
+def watch(args):
+    from src.watch import watch as watch_folder
+
+    watch_folder(args)
+
+
+def _print_plan(args):
+    """What `run` would do with these options and settings, without loading any data"""
+    paths = get_paths(datetime.now().date())
+    if args.ingest or CONFIG["use_partition_store"]:
+        source = f"partition store {CONFIG['partition_store']}"
+        if CONFIG["use_daily_cube"]:
+            source += " (daily cube)"
+    else:
+        source = str(paths["input_csv"])
+    print(f"Input:      {source}")
+    if args.ingest:
+        print(f"Ingest:     {', '.join(str(p) for p in args.ingest)}")
+    if args.backfill:
+        start, end = args.backfill
+        print(f"Backfill:   {start} → {end} into {paths['output_dir'] / CONFIG['backfill_subdir']}")
+        return
+    print(f"Workbook:   {paths['excel_data']}")
+    print(f"ZIP:        {paths['zip_file']}")
+    if args.batch:
+        print(f"Batch:      one report per {', '.join(CONFIG['batch_slice_columns'])}")
+    print(f"Email to:   {CONFIG['email_to'] or '(not configured)'}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from main import add_run_arguments
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli", description="Weekly sales report pipeline, one stage per command"
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    command = commands.add_parser("validate", help="validate input CSV file(s) without building a report")
+    command.add_argument("csv", nargs="*", type=Path, help="files to check (default: CONFIG['input_csv'])")
+    command.set_defaults(handler=validate)
+
+    command = commands.add_parser("compute", help="compute the KPIs and tables of the current week")
+    command.set_defaults(handler=compute, ingest=None, backfill=None, batch=False)
+
+    command = commands.add_parser("render", help="write the Excel workbook from the computed tables")
+    command.set_defaults(handler=render)
+
+    command = commands.add_parser("package", help="ZIP the rendered workbook(s)")
+    command.set_defaults(handler=package)
+
+    command = commands.add_parser("send", help="email the packaged ZIP")
+    command.set_defaults(handler=send)
+
+    command = commands.add_parser("run", help="run the whole pipeline (same as main.py)")
+    add_run_arguments(command)
+    command.add_argument("--dry-run", action="store_true", help="print what would run and exit")
+    command.set_defaults(handler=run)
+
+    command = commands.add_parser("watch", help="watch the data folder and re-run on new CSV files")
+    command.add_argument("--batch", action="store_true", help="also generate the per-branch / per-city reports")
+    command.add_argument("--once", action="store_true", help="exit after the first run")
+    command.set_defaults(handler=watch)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "dry_run", False):
+        _print_plan(args)  # nothing runs: no run record either
+        return 0
+    if args.command == "watch":
+        args.handler(args)  # each run of the service saves its own record
+        return 0
+    return run_recorded(args.handler, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
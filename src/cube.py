@@ -0,0 +1,207 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import CONFIG
+from src.kpi_plan import compile_plan, dimension_columns
+from src.metrics import (
+    CELL_KEYS, CURRENT_BUCKET, FOUR_WEEK_BUCKETS, LAST_WEEK_BUCKET, aggregates_from_cells,
+    build_sketches, hash_values, sketch_transactions,
+)
+
+CUBE_FILENAME = "daily_cube.parquet"
+CUBE_KEYS = ["Date", "Branch", "City", "Product line", "Payment"]
+
+# Distinct-invoice sketches stored next to the cube, one per day × branch × city
+SKETCH_FILENAME = "invoice_sketches.parquet"
+SKETCH_KEYS = ["Date", "Branch", "City"]
+
+
+def cube_keys(plan: dict = None) -> list:
+    """Cube grouping keys: CUBE_KEYS plus the dimension columns of the KPI plan"""
+    return CUBE_KEYS + dimension_columns(plan or compile_plan())
+
+
+def cube_measures(plan: dict = None) -> list:
+    return list((plan or compile_plan())["aggregations"]) + ["invoices"]
+
+
+def cube_matches_plan(cube: pd.DataFrame) -> bool:
+    """False when the cube was built for other KPI measures or dimensions (it must then be rebuilt)"""
+    plan = compile_plan()
+    return set(cube_keys(plan) + cube_measures(plan)) <= set(cube.columns)
+
+
+def build_daily_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Roll transactions up to one row per Date × Branch × City × Product line
+    × Payment (× the KPI plan's dimension columns), with every measure of
+    the plan.
+
+    Every measure is additive, so any window can be answered by summing the
+    rows of its days. "invoices" is the distinct invoice count of the cell;
+    summing it gives the window's transactions as long as an invoice does
+    not span several cells (one product line, payment, customer type and
+    gender per invoice, as in the source data). Rows with a missing key
+    keep their own cell, so they still count in the totals.
+    """
+    plan = compile_plan()
+    cube = df.groupby(cube_keys(plan), observed=True, dropna=False).agg(
+        **plan["aggregations"],
+        invoices=("Invoice ID", "nunique"),
+    )
+    return cube.reset_index()
+
+
+def _merge_cubes(cubes: list) -> pd.DataFrame:
+    merged = pd.concat(cubes, ignore_index=True)
+    keys = cube_keys()
+    merged = merged.astype({key: "category" for key in keys if key != "Date"})
+    return merged.groupby(keys, observed=True, dropna=False)[cube_measures()].sum().reset_index()
+
+
+def load_daily_cube(cube_path: Path) -> pd.DataFrame:
+    return pd.read_parquet(cube_path, engine="pyarrow", memory_map=True)
+
+
+def _save_daily_cube(cube: pd.DataFrame, cube_path: Path) -> None:
+    tmp_path = cube_path.with_name(cube_path.name + ".tmp")
+    cube.to_parquet(tmp_path, engine="pyarrow", index=False)
+    tmp_path.replace(cube_path)
+
+
+def sketch_path_for(cube_path: Path) -> Path:
+    return Path(cube_path).with_name(SKETCH_FILENAME)
+
+
+def build_invoice_sketches(df: pd.DataFrame, precision: int = None) -> pd.DataFrame:
+    """
+    One HyperLogLog sketch of the invoice IDs per Date × Branch × City,
+    registers stored as bytes. Rows without an invoice ID or with a missing
+    key belong to no sketch.
+    """
+    precision = precision or CONFIG["hll_precision"]
+    df = df[df["Invoice ID"].notna() & df[SKETCH_KEYS].notna().all(axis=1)]
+    groups = df.groupby(SKETCH_KEYS, observed=True, sort=True)
+    keys = groups.size().reset_index()[SKETCH_KEYS]
+    registers = build_sketches(groups.ngroup().to_numpy(), hash_values(df["Invoice ID"]), len(keys), precision)
+    return keys.assign(registers=list(map(bytes, registers)))
+
+
+def _sketch_registers(sketches: pd.DataFrame) -> np.ndarray:
+    if sketches.empty:
+        return np.zeros((0, 1 << CONFIG["hll_precision"]), dtype=np.uint8)
+    return np.frombuffer(b"".join(sketches["registers"]), dtype=np.uint8).reshape(len(sketches), -1)
+
+
+def _merge_sketches(frames: list) -> pd.DataFrame:
+    """Union of sketch frames: register-wise max of the sketches sharing a key"""
+    merged = pd.concat(frames, ignore_index=True)
+    group_ids = merged.groupby(SKETCH_KEYS, observed=True, sort=True).ngroup().to_numpy()
+    keys = merged[SKETCH_KEYS].drop_duplicates().sort_values(SKETCH_KEYS).reset_index(drop=True)
+    registers = np.zeros((len(keys), _sketch_registers(merged.iloc[:1]).shape[1]), dtype=np.uint8)
+    np.maximum.at(registers, group_ids, _sketch_registers(merged))
+    return keys.assign(registers=list(map(bytes, registers)))
+
+
+def load_invoice_sketches(sketch_path: Path) -> pd.DataFrame:
+    return pd.read_parquet(sketch_path, engine="pyarrow")
+
+
+def update_daily_cube(cube_path: Path, df_new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add newly ingested transactions to the persisted cube.
+
+    Only the new rows are aggregated; their cells are summed into the
+    existing ones, so the cost depends on the new data, not on the history.
+    The invoice sketches next to the cube are merged the same way.
+    """
+    cube_path = Path(cube_path)
+    cube = load_daily_cube(cube_path) if cube_path.exists() else None
+    if cube is not None and not cube_matches_plan(cube):
+        # Built for other KPI measures or dimensions: rebuilt from the whole store
+        # (whose partitions already hold the new rows)
+        from src.ingest import iter_partitions
+        print("Daily cube built for other KPI measures/dimensions: rebuilding it")
+        return rebuild_daily_cube(cube_path, iter_partitions(cube_path.parent))
+
+    new_cells = build_daily_cube(df_new)
+    cube = new_cells if cube is None else _merge_cubes([cube, new_cells])
+
+    # Sketches only cover the whole history if they existed with the cube;
+    # otherwise they are left out and built by the next rebuild
+    sketch_path = sketch_path_for(cube_path)
+    sketches = None
+    if sketch_path.exists():
+        sketches = _merge_sketches([load_invoice_sketches(sketch_path), build_invoice_sketches(df_new)])
+    elif not cube_path.exists():
+        sketches = build_invoice_sketches(df_new)
+
+    _save_daily_cube(cube, cube_path)
+    if sketches is not None:
+        _save_daily_cube(sketches, sketch_path)
+    print(f"Daily cube updated: {len(new_cells):,} new cells, {len(cube):,} total")
+    return cube
+
+
+def extend_daily_cube(cube: pd.DataFrame, df_new: pd.DataFrame, sketches: pd.DataFrame = None) -> tuple:
+    """The cube (and invoice sketches, when given) with new transactions added in memory, as update_daily_cube does on disk"""
+    cube = _merge_cubes([cube, build_daily_cube(df_new)])
+    if sketches is not None:
+        sketches = _merge_sketches([sketches, build_invoice_sketches(df_new)])
+    return cube, sketches
+
+
+def rebuild_daily_cube(cube_path: Path, parts) -> pd.DataFrame:
+    """Build the cube and its invoice sketches from scratch out of an iterable of transaction frames"""
+    cells, sketches = [], []
+    for part in parts:
+        cells.append(build_daily_cube(part))
+        sketches.append(build_invoice_sketches(part))
+    cube = _merge_cubes(cells)
+    _save_daily_cube(cube, Path(cube_path))
+    _save_daily_cube(_merge_sketches(sketches), sketch_path_for(cube_path))
+    print(f"Daily cube rebuilt: {len(cube):,} cells")
+    return cube
+
+
+def aggregates_from_cube(cube: pd.DataFrame, periods: dict, sketches: pd.DataFrame = None) -> dict:
+    """
+    Same aggregates as metrics.compute_period_aggregates, answered from the
+    daily cube: only the cube rows of the 5 report weeks are touched.
+
+    With `sketches` (approximate distinct-count mode) the transactions are
+    estimated by merging the day × branch invoice sketches of each period
+    instead of summing the per-cell invoice counts.
+    """
+    week_start = periods["current"][0]
+
+    days = (cube["Date"] - week_start).dt.days.to_numpy()
+    bucket = -(days // 7)
+    in_windows = (bucket >= CURRENT_BUCKET) & (bucket <= FOUR_WEEK_BUCKETS[-1])
+
+    plan = compile_plan()
+    window = cube.loc[in_windows].assign(bucket=bucket[in_windows], weekday=days[in_windows] % 7)
+    cells = window.groupby(CELL_KEYS + dimension_columns(plan), observed=True, sort=False,
+                           dropna=False)[cube_measures(plan)].sum()
+
+    if sketches is not None:
+        sketch_bucket = -((sketches["Date"] - week_start).dt.days.to_numpy() // 7)
+        in_sketch_windows = (sketch_bucket >= CURRENT_BUCKET) & (sketch_bucket <= FOUR_WEEK_BUCKETS[-1])
+        return aggregates_from_cells(
+            cells,
+            transactions=sketch_transactions(
+                _sketch_registers(sketches.loc[in_sketch_windows]), sketch_bucket[in_sketch_windows]
+            ),
+        )
+
+    invoices_per_bucket = window.groupby("bucket")["invoices"].sum()
+    return aggregates_from_cells(
+        cells,
+        transactions={
+            "current": invoices_per_bucket.get(CURRENT_BUCKET, 0),
+            "last_week": invoices_per_bucket.get(LAST_WEEK_BUCKET, 0),
+            "four_weeks": invoices_per_bucket.reindex(FOUR_WEEK_BUCKETS, fill_value=0).sum(),
+        },
+    )
@@ -1,15 +1,77 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import json
 import sys
 from typing import Union
 from config import CONFIG
+from src.date_utils import get_reporting_periods, parse_dates
+from src.result_cache import cache_key, sha256_file
+from src.validation import (
+    CRITICAL, DROPPED, RULES, CATEGORICAL_RULES, ValidationError, ValidationResult,
+    check_required_columns, validate_sales_frame, write_quarantine, quarantine_path,
+)
+
+
+def _apply_validation(df: pd.DataFrame, result: ValidationResult, source: Path,
+                      quarantine_file: Path = None, append: bool = False) -> pd.DataFrame:
+    """
+    Act on a ValidationResult: without a quarantine file, critical failures
+    raise ValidationError; with one, the failed rows (and rows with invalid
+    dates) are written to it and the good rows are kept.
+    """
+    critical = result.failed(CRITICAL)
+    if critical and quarantine_file is None:
+        for rule in critical:
+            print(f"CRITICAL VALIDATION ERROR: {RULES[rule][1]} ({len(result.rows[rule]):,} rows)")
+            print("Problematic rows (first 5):")
+            print(df.iloc[result.rows[rule][:5]])
+        failures = ", ".join(f"{RULES[rule][1]} ({len(result.rows[rule]):,} rows)" for rule in critical)
+        raise ValidationError(f"Critical validation failed in {source.name}: {failures}", result)
+
+    rejected = result.mask(CRITICAL, DROPPED)
+    if not rejected.any():
+        return df
+    if quarantine_file is not None:
+        positions = np.flatnonzero(rejected)
+        write_quarantine(df.iloc[positions], result.row_errors(positions), quarantine_file, append)
+    return df[~rejected]
+
+
+def _report_ambiguous_dates(date_info: dict) -> int:
+    """Warn when day-first / month-first was chosen by hint order only; returns the rows concerned"""
+    if date_info["decided"] or not date_info["ambiguous_rows"]:
+        return 0
+    print(
+        f"WARNING: {date_info['ambiguous_rows']:,} rows have dates that read differently day-first "
+        f"and month-first and the file doesn't settle which is meant → parsed as {date_info['format']} "
+        f"(first matching entry of date_format_hints)"
+    )
+    return date_info["ambiguous_rows"]
+
+
+def _report_fallback_dates(date_info: dict) -> int:
+    """Warn about rows whose date only another hint could read (the file mixes formats); returns their count"""
+    if date_info["fallback_rows"]:
+        print(
+            f"WARNING: {date_info['fallback_rows']:,} rows have dates that {date_info['format']} can't read; "
+            f"they were read with another entry of date_format_hints → check the file for mixed date formats"
+        )
+    return date_info["fallback_rows"]
+
+
+def _quarantine_file(filepath: Path):
+    """Side file for rejected rows in quarantine mode, None in strict mode"""
+    return quarantine_path(filepath) if CONFIG["validation_mode"] == "quarantine" else None
+
 
 def load_and_validate_sales_data(filepath: Union[str, Path]) -> pd.DataFrame:
     """
     Load supermarket sales CSV file and perform comprehensive validation.
-    
-    Raises SystemExit if critical validation fails.
+
+    Raises ValidationError if columns are missing or critical validation
+    fails. With CONFIG["validation_mode"] = "quarantine", rows failing
+    critical checks are written to a side file instead and the rest is kept.
     Returns cleaned and validated DataFrame.
     """
     filepath = Path(filepath)
@@ -28,96 +90,376 @@ def load_and_validate_sales_data(filepath: Union[str, Path]) -> pd.DataFrame:
         sys.exit(1)
 
     # 2. Check required columns
-    missing_cols = [col for col in CONFIG["expected_columns"] if col not in df.columns]
-    if missing_cols:
-        print(f"Error: Missing required columns: {', '.join(missing_cols)}")
-        print("Expected columns:", ", ".join(CONFIG["expected_columns"]))
-        sys.exit(1)
+    check_required_columns(df.columns)
 
-    # 3. Convert date with flexible format handling
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce", dayfirst=False)
-    
-    invalid_dates = df["Date"].isna()
-    if invalid_dates.any():
-        print(f"Warning: {invalid_dates.sum()} rows with invalid/missing dates were removed")
-        df = df.dropna(subset=["Date"])
-
-    # 4. Basic data type and value validations
-    critical_checks = [
-        (df["Unit price"] <= 0, "Unit price ≤ 0"),
-        (df["Quantity"] <= 0, "Quantity ≤ 0"),
-        (df["Quantity"] != df["Quantity"].astype(int), "Quantity is not integer"),
-        (df["Tax 5%"] < 0, "Tax 5% is negative"),
-        (df["Sales"] <= 0, "Sales ≤ 0"),
-        (df["Rating"].isna() | (df["Rating"] < 0) | (df["Rating"] > 10), "Invalid Rating values"),
-    ]
-
-    for condition, message in critical_checks:
-        if condition.any():
-            print(f"CRITICAL VALIDATION ERROR: {message}")
-            print("Problematic rows (first 5):")
-            print(df[condition].head())
-            sys.exit(1)
+    # 3. Convert date with the format detected from CONFIG["date_format_hints"]
+    df["Date"], date_info = parse_dates(df["Date"], CONFIG["date_format_hints"])
+    fallback_dates = _report_fallback_dates(date_info)
+    ambiguous_dates = _report_ambiguous_dates(date_info)
+
+    # 4. All critical, consistency and categorical rules in one vectorised pass
+    result = validate_sales_frame(df)
+    counts = result.counts
 
-    # 5. Business logic / calculation consistency checks
-    tolerance = 1e-5
+    if counts.get("invalid_dates"):
+        print(f"Warning: {counts['invalid_dates']} rows with invalid/missing dates were removed")
 
-    # Tax should be ≈ Unit price × Quantity × 0.05
-    tax_calc = df["Unit price"] * df["Quantity"] * 0.05
-    tax_error = ~np.isclose(df["Tax 5%"], tax_calc, rtol=tolerance, atol=0.01)
-    
-    if tax_error.any():
+    # 5. Critical failures: stop (strict) or quarantine the failed rows
+    quarantine_file = _quarantine_file(filepath)
+    df_checked = df
+    df = _apply_validation(df, result, filepath, quarantine_file)
+    quarantined = len(df_checked) - len(df) - counts.get("invalid_dates", 0)
+    if quarantined:
+        print(f"WARNING: {quarantined:,} rows failed critical checks and were quarantined → {quarantine_file}")
+
+    # 6. Business logic / calculation consistency and categorical warnings
+    if "tax" in result.rows:
         print("WARNING: Inconsistent Tax 5% calculation in some rows")
-        print(df[tax_error][["Invoice ID", "Unit price", "Quantity", "Tax 5%"]].head(6))
+        print(df_checked.iloc[result.rows["tax"][:6]][["Invoice ID", "Unit price", "Quantity", "Tax 5%"]])
         print("→ Consider reviewing these rows manually\n")
 
-    # Sales = Unit price × Quantity + Tax
-    sales_calc = df["Unit price"] * df["Quantity"] + df["Tax 5%"]
-    sales_error = ~np.isclose(df["Sales"], sales_calc, rtol=tolerance, atol=0.01)
-    
-    if sales_error.any():
+    if "sales" in result.rows:
         print("WARNING: Inconsistent Sales total in some rows")
-        print(df[sales_error][["Invoice ID", "Unit price", "Quantity", "Tax 5%", "Sales"]].head(6))
+        print(df_checked.iloc[result.rows["sales"][:6]][["Invoice ID", "Unit price", "Quantity", "Tax 5%", "Sales"]])
 
-    # COGS should be Unit price × Quantity
-    cogs_error = ~np.isclose(df["cogs"], df["Unit price"] * df["Quantity"], rtol=tolerance)
-    if cogs_error.any():
+    if "cogs" in result.rows:
         print("WARNING: Inconsistent COGS values in some rows")
 
-    # gross income typically = Tax in this dataset
-    gross_income_error = ~np.isclose(df["gross income"], df["Tax 5%"], rtol=tolerance)
-    if gross_income_error.any():
+    if "gross_income" in result.rows:
         print("WARNING: gross income doesn't match Tax 5% in some rows")
 
+    for column, values in result.invalid_values.items():
+        print(f"Warning: Invalid {column} values found: {values}")
 
-    # 6. Categorical value validation
-
-    invalid_branches = ~df["Branch"].isin(CONFIG["valid_branches"])
-    if invalid_branches.any():
-        print(f"Warning: Invalid Branch values found: {df[invalid_branches]['Branch'].unique()}")
-
-    invalid_cities = ~df["City"].isin(CONFIG["valid_cities"])
-    if invalid_cities.any():
-        print(f"Warning: Invalid City values found: {df[invalid_cities]['City'].unique()}")
-
-    invalid_customer = ~df["Customer type"].isin(CONFIG["valid_customer_types"])
-    if invalid_customer.any():
-        print(f"Warning: Invalid Customer type values found: {df[invalid_customer]['Customer type'].unique()}")
-
-    invalid_gender = ~df["Gender"].isin(CONFIG["valid_genders"])
-    if invalid_gender.any():
-        print(f"Warning: Invalid Gender values found: {df[invalid_gender]['Gender'].unique()}")
-
-    invalid_payment = ~df["Payment"].isin(CONFIG["valid_payments"])
-    if invalid_payment.any():
-        print(f"Warning: Invalid Payment values found: {df[invalid_payment]['Payment'].unique()}")
+    # Warning counts for the run metrics
+    df.attrs["validation_warnings"] = result.warning_counts()
+    if ambiguous_dates:
+        df.attrs["validation_warnings"]["ambiguous_dates"] = ambiguous_dates
+    if fallback_dates:
+        df.attrs["validation_warnings"]["fallback_dates"] = fallback_dates
+    if quarantined:
+        df.attrs["validation_warnings"]["quarantined"] = quarantined
 
     # 7. Final report
     print(f"\nDataset loaded successfully")
     print(f"→ Total rows: {len(df):,}")
     print(f"→ Date range: {df['Date'].min():%Y-%m-%d} → {df['Date'].max():%Y-%m-%d}")
     print(f"→ Unique invoices: {df['Invoice ID'].nunique():,}")
+    df = to_compact_frame(df)
+    print("All critical validations passed ✓\n")
+
+    return df
+
+
+def stream_and_validate_sales_data(filepath: Union[str, Path], chunksize: int = None) -> pd.DataFrame:
+    """
+    Streaming variant of load_and_validate_sales_data for very large CSV files.
+
+    Reads the file in chunks of `chunksize` rows, validates each chunk on its
+    own and only keeps the rows that fall inside the reporting windows
+    (current week + previous 4 weeks) of the latest date seen so far, so peak
+    memory depends on the chunk size and the window, not on the file size.
+    Warning counts are totalled across the whole file.
+
+    Raises ValidationError like load_and_validate_sales_data (quarantined
+    rows of all chunks go to the same side file).
+    Returns the validated rows of the reporting windows.
+    """
+    filepath = Path(filepath)
+    chunksize = chunksize or CONFIG["csv_chunksize"]
+
+    total_rows = 0
+    quarantined = 0
+    ambiguous_dates = fallback_dates = 0
+    date_format = ambiguous_format = fallback_format = None
+    warning_counts = {}
+    invalid_categories = {column: set() for column in CATEGORICAL_RULES}
+    quarantine_file = _quarantine_file(filepath)
+    if quarantine_file is not None:
+        quarantine_file.unlink(missing_ok=True)
+    min_date = max_date = None
+    window_start = None
+    kept = []
+
+    try:
+        reader = pd.read_csv(filepath, chunksize=chunksize)
+        for chunk in reader:
+            if total_rows == 0:
+                check_required_columns(chunk.columns)
+            total_rows += len(chunk)
+
+            # Keep the format once a chunk has settled it, so every chunk is read the same way
+            chunk["Date"], date_info = parse_dates(chunk["Date"], CONFIG["date_format_hints"], date_format)
+            if date_info["decided"] and date_info["format"]:
+                date_format = date_format or date_info["format"]
+            elif date_info["ambiguous_rows"]:
+                ambiguous_dates += date_info["ambiguous_rows"]
+                ambiguous_format = ambiguous_format or date_info["format"]
+            if date_info["fallback_rows"]:
+                fallback_dates += date_info["fallback_rows"]
+                fallback_format = fallback_format or date_info["format"]
+            result = validate_sales_frame(chunk)
+            rows_before = len(chunk)
+            chunk = _apply_validation(chunk, result, filepath, quarantine_file, append=True)
+
+            chunk_warnings = result.warning_counts()
+            quarantined += rows_before - len(chunk) - chunk_warnings["invalid_dates"]
+            for name, count in chunk_warnings.items():
+                warning_counts[name] = warning_counts.get(name, 0) + count
+            for column, values in result.invalid_values.items():
+                invalid_categories[column].update(values)
+            if chunk.empty:
+                continue
+
+            chunk_min, chunk_max = chunk["Date"].min(), chunk["Date"].max()
+            min_date = chunk_min if min_date is None else min(min_date, chunk_min)
+
+            # Move the window forward when a later date shows up and drop
+            # previously kept rows that fell out of it
+            if max_date is None or chunk_max > max_date:
+                max_date = chunk_max
+                window_start = get_reporting_periods(max_date)["four_weeks"][0]
+                kept = [part[part["Date"] >= window_start] for part in kept]
+                kept = [part for part in kept if not part.empty]
+
+            in_window = chunk[chunk["Date"] >= window_start]
+            if not in_window.empty:
+                kept.append(compact_sales_frame(in_window) if CONFIG["compact_frames"] else in_window)
+    except FileNotFoundError:
+        print(f"Error: File not found → {filepath}")
+        sys.exit(1)
+    except pd.errors.ParserError:
+        print("Error: CSV file appears to be corrupted or malformed")
+        sys.exit(1)
+
+    if max_date is None:
+        raise ValidationError(f"{filepath.name} contains no valid rows")
+
+    df = pd.concat(kept, ignore_index=True)
+
+    # Warnings totalled across the whole file
+    if warning_counts["invalid_dates"]:
+        print(f"Warning: {warning_counts['invalid_dates']} rows with invalid/missing dates were removed")
+    if fallback_dates:
+        warning_counts["fallback_dates"] = _report_fallback_dates(
+            {"fallback_rows": fallback_dates, "format": fallback_format}
+        )
+    if ambiguous_dates:
+        ambiguous_dates = _report_ambiguous_dates(
+            {"decided": False, "ambiguous_rows": ambiguous_dates, "format": ambiguous_format}
+        )
+        warning_counts["ambiguous_dates"] = ambiguous_dates
+    if quarantined:
+        print(f"WARNING: {quarantined:,} rows failed critical checks and were quarantined → {quarantine_file}")
+        warning_counts["quarantined"] = quarantined
+    if warning_counts["tax"]:
+        print(f"WARNING: Inconsistent Tax 5% calculation in {warning_counts['tax']:,} rows")
+    if warning_counts["sales"]:
+        print(f"WARNING: Inconsistent Sales total in {warning_counts['sales']:,} rows")
+    if warning_counts["cogs"]:
+        print(f"WARNING: Inconsistent COGS values in {warning_counts['cogs']:,} rows")
+    if warning_counts["gross_income"]:
+        print(f"WARNING: gross income doesn't match Tax 5% in {warning_counts['gross_income']:,} rows")
+    for column, values in invalid_categories.items():
+        if values:
+            print(f"Warning: Invalid {column} values found: {sorted(map(str, values))}")
+
+    df.attrs["validation_warnings"] = warning_counts
+
+    print(f"\nDataset streamed successfully")
+    print(f"→ Total rows: {total_rows:,}")
+    print(f"→ Date range: {min_date:%Y-%m-%d} → {max_date:%Y-%m-%d}")
+    print(f"→ Rows kept for reporting windows: {len(df):,} (since {window_start:%Y-%m-%d})")
+    df = to_compact_frame(df)
     print("All critical validations passed ✓\n")
 
     return df
 
+
+# Typed columnar cache ────────────────────────────────────────────────────────
+
+CACHE_DTYPES = {
+    "Branch": "category",
+    "City": "category",
+    "Product line": "category",
+    "Payment": "category",
+    "Quantity": "int32",
+    "cogs": "float32",
+    # 10 significant digits: kept float64 as in COMPACT_NUMERIC (also re-types float32 part files of older stores)
+    "gross margin percentage": "float64",
+}
+
+
+# Compact in-memory representation ────────────────────────────────────────────
+
+# Enumerations held as categoricals; the categories are the CONFIG["valid_*"]
+# values plus any other value present, sorted, so grouped output keeps its order
+COMPACT_CATEGORIES = {**CATEGORICAL_RULES, "Product line": None, "Time": None}
+
+# Narrower numeric types where every value fits exactly: Quantity is a
+# validated integer, prices and COGS have 2 decimals and at most 6
+# significant digits. Columns summed into the KPIs (Sales, Tax 5%, gross
+# income, Rating) and gross margin percentage (10 significant digits) stay float64.
+COMPACT_NUMERIC = {"Quantity": "int32", "Unit price": "float32", "cogs": "float32"}
+
+
+def _as_category(values: pd.Series, known=()) -> pd.Series:
+    # Inferred categories first (fast), then remapped to the full sorted set
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    present = values.cat.remove_unused_categories().cat.categories
+    categories = sorted(set(known).union(present), key=str)
+    if values.cat.categories.tolist() == categories:
+        return values
+    return values.cat.set_categories(categories)
+
+
+def frame_memory_bytes(df: pd.DataFrame) -> int:
+    """In-memory size of df, string contents included"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def compact_sales_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compact typed copy of a validated sales frame: enumerations as
+    categoricals, Invoice ID factorised into a categorical (integer codes
+    for the distinct counts), int32 / float32 numeric columns. Frames that
+    are already compact are returned re-typed the same way.
+    """
+    columns = {}
+    for column, config_key in COMPACT_CATEGORIES.items():
+        if column in df:
+            columns[column] = _as_category(df[column], CONFIG[config_key] if config_key else ())
+
+    if "Invoice ID" in df:
+        invoices = df["Invoice ID"]
+        if isinstance(invoices.dtype, pd.CategoricalDtype):
+            columns["Invoice ID"] = invoices.cat.remove_unused_categories()
+        else:
+            codes, uniques = pd.factorize(invoices)
+            columns["Invoice ID"] = pd.Categorical.from_codes(codes, uniques)
+
+    for column, dtype in COMPACT_NUMERIC.items():
+        if column not in df:
+            continue
+        if dtype.startswith("int"):
+            values = df[column]
+            if values.isna().any() or values.max() > np.iinfo(dtype).max:
+                continue
+        columns[column] = df[column].astype(dtype)
+
+    compact = df.assign(**columns)
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def to_compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """compact_sales_frame when CONFIG["compact_frames"] is on, reporting the memory footprint"""
+    if not CONFIG["compact_frames"]:
+        return df
+    before = frame_memory_bytes(df)
+    df = compact_sales_frame(df)
+    after = frame_memory_bytes(df)
+    df.attrs["memory_bytes"] = after
+    print(f"→ Memory: {after / 2**20:,.1f} MB compact (was {before / 2**20:,.1f} MB)")
+    return df
+
+
+def _cache_paths(filepath: Path) -> tuple:
+    """Cache files live next to the source: sales.csv → sales.cache.parquet / sales.cache.json"""
+    return (
+        filepath.with_name(f"{filepath.stem}.cache.parquet"),
+        filepath.with_name(f"{filepath.stem}.cache.json"),
+    )
+
+
+# CONFIG entries that shape the validated, date-parsed frame kept in the cache
+CACHE_CONFIG_KEYS = ["expected_columns", "date_format_hints", "validation_mode", *CATEGORICAL_RULES.values()]
+
+
+def _config_fingerprint() -> str:
+    # The column types are part of it: a cache written with other types is rewritten
+    return cache_key({key: CONFIG[key] for key in CACHE_CONFIG_KEYS}, CACHE_DTYPES)
+
+
+def _file_fingerprint(filepath: Path, with_hash: bool = True) -> dict:
+    stat = filepath.stat()
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        fingerprint["sha256"] = sha256_file(filepath)
+    return fingerprint
+
+
+def _cache_is_valid(filepath: Path, cache_file: Path, meta_file: Path) -> bool:
+    if not (cache_file.exists() and meta_file.exists()):
+        return False
+    try:
+        cached = json.loads(meta_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    if cached.get("config") != _config_fingerprint():
+        return False  # loaded with other validation or date settings
+
+    # Size and mtime are cheap: only hash the file when both still match
+    current = _file_fingerprint(filepath, with_hash=False)
+    if any(cached.get(key) != value for key, value in current.items()):
+        return False
+    return cached.get("sha256") == _file_fingerprint(filepath)["sha256"]
+
+
+def source_sha256(filepath: Union[str, Path]) -> str:
+    """SHA-256 of the source file, taken from the cache metadata while size and mtime still match"""
+    filepath = Path(filepath)
+    _, meta_file = _cache_paths(filepath)
+    current = _file_fingerprint(filepath, with_hash=False)
+    try:
+        cached = json.loads(meta_file.read_text(encoding="utf-8"))
+        if all(cached.get(key) == value for key, value in current.items()) and cached.get("sha256"):
+            return cached["sha256"]
+    except (OSError, ValueError):
+        pass
+    return _file_fingerprint(filepath)["sha256"]
+
+
+def load_sales_data_cached(filepath: Union[str, Path]) -> pd.DataFrame:
+    """
+    Load the sales data through a typed Parquet copy stored next to the CSV.
+
+    The cache is used (memory-mapped) while the source file's size, mtime
+    and SHA-256 and the validation settings (CACHE_CONFIG_KEYS) are
+    unchanged. Otherwise the CSV is loaded and validated with
+    load_and_validate_sales_data and the cache is rewritten.
+    """
+    filepath = Path(filepath)
+    if not filepath.exists():
+        print(f"Error: File not found → {filepath}")
+        sys.exit(1)
+
+    cache_file, meta_file = _cache_paths(filepath)
+
+    if _cache_is_valid(filepath, cache_file, meta_file):
+        df = pd.read_parquet(cache_file, engine="pyarrow", memory_map=True)
+        print(f"\nDataset loaded from cache: {cache_file.name}")
+        print(f"→ Total rows: {len(df):,}")
+        print(f"→ Date range: {df['Date'].min():%Y-%m-%d} → {df['Date'].max():%Y-%m-%d}")
+        df = to_compact_frame(df)
+        print()
+        return df
+
+    df = load_and_validate_sales_data(filepath)
+    df = df.astype(CACHE_DTYPES).reset_index(drop=True)
+
+    # Write to a temporary file first so an interrupted run never leaves a
+    # half-written cache behind
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    try:
+        df.to_parquet(tmp_file, engine="pyarrow", index=False)
+        tmp_file.replace(cache_file)
+        meta = {**_file_fingerprint(filepath), "config": _config_fingerprint()}
+        meta_file.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        print(f"Typed cache written: {cache_file.name}")
+    except Exception as e:
+        print(f"Warning: Could not write data cache ({e})")
+        tmp_file.unlink(missing_ok=True)
+
+    return df
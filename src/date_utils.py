@@ -1,4 +1,10 @@
 from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# Day-first / month-first pairs that read the same string differently
+AMBIGUOUS_FORMATS = [("%m/%d/%Y", "%d/%m/%Y"), ("%m-%d-%Y", "%d-%m-%Y")]
+DETECTION_SAMPLE = 5_000
 
 
 def get_reporting_periods(latest_date: datetime) -> dict:
@@ -23,4 +29,91 @@ def get_reporting_periods(latest_date: datetime) -> dict:
         "last_week": (last_week_start, last_week_end),
         "four_weeks": (four_weeks_start, four_weeks_end),
         "latest_date": latest_date,
-    }
\ No newline at end of file
+    }
+
+def _parse_with(values, date_format: str):
+    return pd.to_datetime(values, format=date_format, errors="coerce")
+
+
+def detect_date_format(values, hints: list):
+    """
+    Pick the hint that parses the most of `values` (distinct date strings).
+
+    Returns (format, decided): decided is False when a day-first and a
+    month-first hint parse the values equally well, i.e. the choice came
+    from the hint order rather than from the data. Returns (None, False)
+    when no hint matches.
+    """
+    values = pd.Index(values[:DETECTION_SAMPLE])
+    scores = {fmt: int(_parse_with(values, fmt).notna().sum()) for fmt in hints}
+    best = max(hints, key=lambda fmt: scores[fmt])  # first hint wins ties
+    if scores[best] == 0:
+        return None, False
+
+    for pair in AMBIGUOUS_FORMATS:
+        if best in pair:
+            other = pair[1] if best == pair[0] else pair[0]
+            if other in scores and scores[other] == scores[best]:
+                return best, False
+    return best, True
+
+
+def _ambiguous_mask(values: pd.Index, parsed: pd.DatetimeIndex, date_format: str) -> np.ndarray:
+    """Strings that the day-first / month-first counterpart of date_format reads as another valid date"""
+    for pair in AMBIGUOUS_FORMATS:
+        if date_format in pair:
+            other = pair[1] if date_format == pair[0] else pair[0]
+            alternative = _parse_with(values, other)
+            return np.asarray(alternative.notna() & (alternative != parsed))
+    return np.zeros(len(values), dtype=bool)
+
+
+def parse_dates(values: pd.Series, hints: list, date_format: str = None) -> tuple:
+    """
+    Vectorised date parsing with a fixed format chosen from `hints`.
+
+    The column is factorised first, so each distinct date string is parsed
+    once (a sales file has a few hundred distinct dates for millions of
+    rows). The format is detected on the distinct strings unless
+    `date_format` is given. Strings the chosen format can't read are tried
+    with the other hints; what is left becomes NaT like with
+    errors="coerce". Without any matching hint, pandas' own inference is
+    used as before.
+
+    Returns (parsed Series, info) with info = {"format", "decided",
+    "ambiguous_rows", "fallback_rows"}: ambiguous_rows counts rows whose
+    date reads differently day-first and month-first (e.g. 3/4/2019),
+    fallback_rows the rows only another hint could read. A file with
+    fallback rows mixes formats, so its format is not decided either.
+    """
+    codes, uniques = pd.factorize(values)
+
+    decided = True
+    if date_format is None:
+        date_format, decided = detect_date_format(uniques, hints)
+    if date_format is None:
+        parsed = pd.to_datetime(values, errors="coerce", dayfirst=False)
+        return parsed, {"format": None, "decided": False, "ambiguous_rows": 0, "fallback_rows": 0}
+
+    parsed_uniques = _parse_with(uniques, date_format)
+    unread = np.asarray(parsed_uniques.isna())
+    for fallback in hints:
+        missing = parsed_uniques.isna()
+        if not missing.any():
+            break
+        if fallback != date_format:
+            parsed_uniques = parsed_uniques.where(~missing, _parse_with(uniques, fallback))
+
+    # Index 0..n-1 by codes; missing values (code -1) hit the trailing NaT
+    parsed_values = np.append(parsed_uniques.to_numpy(), np.datetime64("NaT", "us"))[codes]
+    parsed = pd.Series(parsed_values, index=values.index, name=values.name)
+
+    rows_per_value = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    ambiguous = _ambiguous_mask(pd.Index(uniques), parsed_uniques, date_format)
+    fallback_rows = int(rows_per_value[unread & np.asarray(parsed_uniques.notna())].sum())
+    return parsed, {
+        "format": date_format,
+        "decided": decided and not fallback_rows,
+        "ambiguous_rows": int(rows_per_value[ambiguous].sum()),
+        "fallback_rows": fallback_rows,
+    }
@@ -1,48 +1,335 @@
+import base64
+import json
+import shutil
 import smtplib
-from email.message import EmailMessage
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email import policy
+from email.message import EmailMessage, MIMEPart
+from email.utils import formatdate, make_msgid
 from pathlib import Path
-from datetime import datetime
+from queue import Empty, Queue
+from tempfile import SpooledTemporaryFile
+
 from config import CONFIG
 
+# Messages are built in memory up to this size, then in a temporary file
+SPOOL_MAX_BYTES = 1 << 20
+# Attachment read size: a multiple of 57 bytes, so every block encodes to whole 76-char base64 lines
+ATTACHMENT_BLOCK = 57 * 4096
+# DATA is sent to the server in writes of about this size
+SEND_BUFFER_BYTES = 1 << 16
 
-def send_weekly_report_email(zip_path: Path, periods: dict):
-    week_start, week_end = periods["current"]
+ENTRY_FILE = "message.json"
 
-    if not all([CONFIG["email_from"], CONFIG["email_to"], CONFIG["email_password"]]):
-        print("Error: Missing email configuration (check .env)")
-        return
 
-    msg = EmailMessage()
-    msg['Subject'] = f"Weekly Sales Report - {week_start:%d/%m/%Y} to {week_end:%d/%m/%Y}"
-    msg['From'] = CONFIG["email_from"]
-    msg['To'] = CONFIG["email_to"]
+def parse_recipients(value) -> list:
+    """'a@x.com, b@x.com; c@x.com' (or a list of addresses) → ['a@x.com', 'b@x.com', 'c@x.com']"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(";", ",").split(",")
+    return [address.strip() for address in value if address.strip()]
+
+
+def parse_slice_recipients(value) -> dict:
+    """
+    Slice name → recipient list from CONFIG["slice_email_to"]: a JSON
+    object such as '{"Branch_A": "a@x.com, b@x.com"}' (or a dict).
+    Raises ValueError when it is not one.
+    """
+    if not value:
+        return {}
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError as e:
+            raise ValueError(f"SLICE_EMAIL_TO is not valid JSON ({e}): {value!r}") from None
+    if not isinstance(value, dict):
+        raise ValueError(f"SLICE_EMAIL_TO must be a JSON object of slice name → recipients, got {value!r}")
+    return {name: parse_recipients(recipients) for name, recipients in value.items()}
+
 
+def report_email(zip_path: Path, periods: dict, recipients: list, title: str = "Weekly Sales Report") -> dict:
+    """Delivery of one report ZIP: recipients, subject, HTML body and attachment path"""
+    week_start, week_end = periods["current"]
     body_html = f"""
     <html>
     <body>
-    <h2>Weekly Sales Report</h2>
+    <h2>{title}</h2>
     <p>Period: {week_start:%d/%m/%Y} – {week_end:%d/%m/%Y}</p>
     <p>Attached is the ZIP file containing the detailed Excel report.</p>
     <p>Best regards,<br>Your automated reporting system</p>
     </body>
     </html>
     """
-    msg.add_alternative(body_html, subtype='html')
+    return {
+        "recipients": parse_recipients(recipients),
+        "subject": f"{title} - {week_start:%d/%m/%Y} to {week_end:%d/%m/%Y}",
+        "html": body_html,
+        "attachment": str(zip_path),
+        "filename": Path(zip_path).name,
+    }
+
+
+def _write_message(delivery: dict, out) -> None:
+    """
+    Write the MIME message of delivery to the binary file out. The attachment
+    is base64-encoded block by block from disk: the ZIP is never held in
+    memory whole.
+    """
+    boundary = f"=={uuid.uuid4().hex}=="
+
+    headers = EmailMessage(policy=policy.SMTP)
+    headers["Subject"] = delivery["subject"]
+    headers["From"] = CONFIG["email_from"]
+    headers["To"] = ", ".join(delivery["recipients"])
+    headers["Date"] = formatdate(localtime=True)
+    headers["Message-ID"] = make_msgid()
+    headers["MIME-Version"] = "1.0"
+    out.write(bytes(headers).rstrip(b"\r\n") + b"\r\n")
+    out.write(f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'.encode())
+
+    body = MIMEPart(policy=policy.SMTP)
+    body.set_content(delivery["html"], subtype="html", cte="quoted-printable")
+    out.write(f"--{boundary}\r\n".encode() + bytes(body))
+
+    attachment = MIMEPart(policy=policy.SMTP)
+    attachment["Content-Type"] = "application/zip"
+    attachment["Content-Transfer-Encoding"] = "base64"
+    attachment.add_header("Content-Disposition", "attachment", filename=delivery["filename"])
+    out.write(f"\r\n--{boundary}\r\n".encode() + bytes(attachment))
+    with open(delivery["attachment"], "rb") as f:
+        for block in iter(lambda: f.read(ATTACHMENT_BLOCK), b""):
+            out.write(base64.encodebytes(block).replace(b"\n", b"\r\n"))
+    out.write(f"--{boundary}--\r\n".encode())
+
+
+def _send_spooled(server: smtplib.SMTP, sender: str, recipients: list, message) -> dict:
+    """
+    One SMTP transaction (like SMTP.sendmail) whose DATA is streamed from the
+    spooled message file, dot-stuffed line by line. Returns the refused
+    recipients, as sendmail does.
+    """
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(sender)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, response, sender)
+
+    refused = {}
+    for recipient in recipients:
+        code, response = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(recipients):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    server.putcmd("data")
+    code, response = server.getreply()
+    if code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+
+    message.seek(0)
+    buffer = bytearray()
+    for line in message:
+        if line.startswith(b"."):
+            buffer += b"."
+        buffer += line
+        if len(buffer) >= SEND_BUFFER_BYTES:
+            server.send(bytes(buffer))
+            buffer.clear()
+    server.send(bytes(buffer) + b".\r\n")  # the message ends with CRLF
+
+    code, response = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+
+class SMTPSessionPool:
+    """
+    Authenticated SMTP sessions shared by the sender threads: a session is
+    opened (STARTTLS + login) once and reused for every message of the
+    batch, so there are at most as many connections as threads.
+    """
+
+    def __init__(self):
+        self._idle = Queue()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(CONFIG["smtp_server"], CONFIG["smtp_port"], timeout=CONFIG["smtp_timeout"])
+        try:
+            if CONFIG["smtp_starttls"]:
+                server.starttls()
+            if CONFIG["email_password"]:
+                server.login(CONFIG["email_from"], CONFIG["email_password"])
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    @contextmanager
+    def session(self):
+        try:
+            server = self._idle.get_nowait()
+        except Empty:
+            server = self._connect()
+        try:
+            yield server
+        except Exception as e:
+            if isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                self._idle.put(server)  # the server replied: the session is still usable
+            else:
+                server.close()
+            raise
+        self._idle.put(server)
+
+    def close(self) -> None:
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except Empty:
+                return
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+
+def _deliver(pool: SMTPSessionPool, delivery: dict) -> dict:
+    """Spool and send one delivery; returns its refused recipients"""
+    with SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as message:
+        _write_message(delivery, message)
+        try:
+            with pool.session() as server:
+                return _send_spooled(server, CONFIG["email_from"], delivery["recipients"], message)
+        except smtplib.SMTPServerDisconnected:
+            # An idle session may have been closed by the server: one retry on a new one
+            with pool.session() as server:
+                return _send_spooled(server, CONFIG["email_from"], delivery["recipients"], message)
 
-    # Attach ZIP
-    with open(zip_path, "rb") as f:
-        msg.add_attachment(
-            f.read(),
-            maintype='application',
-            subtype='zip',
-            filename=zip_path.name
-        )
 
+def _is_transient(error: Exception) -> bool:
+    """Connection problems and 4xx replies are retried; 5xx replies (bad address, auth) are not"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)  # refused connection, timeout, DNS
+
+
+# ── Outbox: undelivered messages retried on later runs ───────────────────────
+
+def _write_entry(entry_dir: Path, delivery: dict) -> None:
+    tmp_file = entry_dir / f"{ENTRY_FILE}.tmp"
+    tmp_file.write_text(json.dumps(delivery, indent=2), encoding="utf-8")
+    tmp_file.replace(entry_dir / ENTRY_FILE)
+
+
+def _queue_for_retry(delivery: dict, error: Exception, outbox_dir: Path) -> bool:
+    """
+    Keep a failed delivery in the outbox (with a copy of its attachment) and
+    schedule the next attempt with exponential backoff. Permanent errors and
+    deliveries out of attempts go to outbox/failed instead. Returns True if
+    the delivery will be retried.
+    """
+    entry_id = delivery.get("id") or f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    entry_dir = outbox_dir / entry_id
+    if "id" not in delivery:
+        entry_dir.mkdir(parents=True)
+        shutil.copy2(delivery["attachment"], entry_dir / delivery["filename"])
+
+    attempts = delivery.get("attempts", 0) + 1
+    delay = CONFIG["email_retry_base_seconds"] * 2 ** (attempts - 1)
+    delivery = {
+        **delivery,
+        "id": entry_id,
+        "attachment": str(entry_dir / delivery["filename"]),
+        "attempts": attempts,
+        "next_attempt": time.time() + delay,
+        "last_error": f"{type(error).__name__}: {error}",
+    }
+    _write_entry(entry_dir, delivery)
+
+    if _is_transient(error) and attempts < CONFIG["email_max_attempts"]:
+        return True
+    failed_dir = outbox_dir / "failed"
+    failed_dir.mkdir(exist_ok=True)
+    shutil.move(str(entry_dir), str(failed_dir / entry_id))
+    return False
+
+
+def due_outbox_entries(outbox_dir: Path) -> list:
+    """Queued deliveries whose next attempt is due"""
+    entries = []
+    now = time.time()
+    for entry_file in sorted(Path(outbox_dir).glob(f"*/{ENTRY_FILE}")):
+        if entry_file.parent.name == "failed":
+            continue
+        delivery = json.loads(entry_file.read_text(encoding="utf-8"))
+        if delivery["next_attempt"] <= now:
+            entries.append(delivery)
+    return entries
+
+
+def send_report_emails(deliveries: list) -> dict:
+    """
+    Send the deliveries, together with the outbox entries due for a retry,
+    over a pool of reused SMTP sessions (CONFIG["smtp_connections"]
+    messages in flight at once).
+
+    Transient failures are kept in CONFIG["email_outbox_dir"] and retried on
+    later runs with exponential backoff; permanent ones are moved to its
+    failed/ folder. Every failure is reported. Returns the sent, queued and
+    failed counts.
+    """
+    outcome = {"sent": 0, "queued": 0, "failed": 0}
+    if not CONFIG["email_from"]:
+        print("Error: Missing email configuration (check .env)")
+        return outcome
+
+    outbox_dir = Path(CONFIG["email_outbox_dir"])
+    retries = due_outbox_entries(outbox_dir) if outbox_dir.exists() else []
+    if retries:
+        print(f"Retrying {len(retries)} queued email(s) from the outbox")
+    deliveries = [delivery for delivery in deliveries if delivery["recipients"]] + retries
+    if not deliveries:
+        print("Error: Missing email recipients (check EMAIL_TO in .env)")
+        return outcome
+
+    pool = SMTPSessionPool()
     try:
-        with smtplib.SMTP(CONFIG["smtp_server"], CONFIG["smtp_port"]) as server:
-            server.starttls()
-            server.login(CONFIG["email_from"], CONFIG["email_password"])
-            server.send_message(msg)
-        print("Email sent successfully!")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
\ No newline at end of file
+        workers = max(1, min(CONFIG["smtp_connections"], len(deliveries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(delivery, executor.submit(_deliver, pool, delivery)) for delivery in deliveries]
+            for delivery, future in futures:
+                recipients = ", ".join(delivery["recipients"])
+                try:
+                    refused = future.result()
+                except Exception as e:
+                    if _queue_for_retry(delivery, e, outbox_dir):
+                        outcome["queued"] += 1
+                        print(f"Warning: Email to {recipients} failed ({e}); queued for retry")
+                    else:
+                        outcome["failed"] += 1
+                        print(f"ERROR: Email to {recipients} failed permanently: {e}")
+                    continue
+
+                outcome["sent"] += 1
+                if refused:
+                    print(f"Warning: Recipients refused: {', '.join(refused)}")
+                if "id" in delivery:
+                    shutil.rmtree(outbox_dir / delivery["id"], ignore_errors=True)
+                print(f"Email sent successfully to {recipients}: {delivery['filename']}")
+    finally:
+        pool.close()
+    return outcome
@@ -0,0 +1,185 @@
+"""
+Out-of-core compute engine for the aggregate and trend stages.
+
+With CONFIG["compute_engine"] = "duckdb" and the partition store, these
+stages are answered by SQL that DuckDB (optional: pip install duckdb)
+runs in-process directly on the store's Parquet part files, instead of
+pandas on a loaded frame. The queries run on every core
+(CONFIG["duckdb_threads"]) and spill to CONFIG["duckdb_temp_dir"] above
+CONFIG["duckdb_memory_limit"], so the history no longer has to fit in
+memory; only the current week is still read into pandas (heatmap and
+detail sheet).
+
+The engine returns what the pandas path computes before building the
+report: the bucket × weekday × Product line × City × Payment (×
+dimension) cells of the compiled KPI plan and the weekly series of
+trends.weekly_totals. KPIs, insights and tables are then built by the
+same code. Sums use Kahan summation (fsum) like pandas' grouped sums;
+distinct invoices are always counted exactly. benchmarks/engine_parity.py
+checks that both engines produce identical tables.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import CONFIG
+from src.ingest import partition_files
+from src.kpi_plan import compile_plan, dimension_columns
+from src.metrics import CELL_KEYS, CURRENT_BUCKET, FOUR_WEEK_BUCKETS, LAST_WEEK_BUCKET, aggregates_from_cells
+
+try:
+    import duckdb
+except ImportError:  # optional: only needed with compute_engine = "duckdb"
+    duckdb = None
+
+ENGINES = ("pandas", "duckdb")
+_INTEGER_TYPES = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+                  "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT"}
+
+
+def use_duckdb_engine() -> bool:
+    """Whether CONFIG["compute_engine"] selects DuckDB; raises ValueError for unknown engines"""
+    engine = CONFIG["compute_engine"]
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown compute_engine {engine!r} (use {' or '.join(ENGINES)})")
+    return engine == "duckdb"
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+class DuckDBEngine:
+    """Aggregates of a partition store computed by one in-process DuckDB connection"""
+
+    def __init__(self, store_dir: Path, threads: int = None, memory_limit: str = None, temp_dir: Path = None):
+        if duckdb is None:
+            raise ImportError("compute_engine = 'duckdb' needs the duckdb package (pip install duckdb)")
+        self.store_dir = Path(store_dir)
+        settings = {}  # unset → DuckDB defaults: every core, 80% of RAM
+        if threads:
+            settings["threads"] = threads
+        if memory_limit:
+            settings["memory_limit"] = memory_limit
+        if temp_dir:
+            settings["temp_directory"] = str(temp_dir)
+        self.conn = duckdb.connect(config=settings)
+        threads = self.conn.execute("SELECT current_setting('threads')").fetchone()[0]
+        print(f"\nDuckDB engine: querying {len(partition_files(self.store_dir)):,} part file(s) of "
+              f"{self.store_dir} ({threads} thread(s))\n")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _files(self, start=None, end=None) -> list:
+        files = [str(part) for part in partition_files(self.store_dir, start, end)]
+        if not files:
+            raise FileNotFoundError(f"No partitions up to {pd.Timestamp(end):%Y-%m-%d} in {self.store_dir}")
+        return files
+
+    @staticmethod
+    def _source() -> str:
+        # Partition directories are named date=…: hive detection would shadow the Date column
+        return "read_parquet($files, union_by_name = true, hive_partitioning = false)"
+
+    def _column_types(self, files: list) -> dict:
+        rows = self.conn.execute(f"DESCRIBE SELECT * FROM {self._source()}", {"files": files}).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    @staticmethod
+    def _aggregation(name: str, column: str, function: str, types: dict) -> str:
+        """SQL of one plan measure, typed like the pandas result (integer sums stay integers, empty sums are 0)"""
+        if function == "count":
+            return f"count({_quote(column)}) AS {_quote(name)}"
+        if types.get(column) in _INTEGER_TYPES:
+            return f"CAST(coalesce(sum({_quote(column)}), 0) AS BIGINT) AS {_quote(name)}"
+        return f"coalesce(fsum({_quote(column)}), 0) AS {_quote(name)}"
+
+    def period_aggregates(self, periods: dict) -> dict:
+        """
+        The aggregates of metrics.compute_period_aggregates from two scans
+        of the window's part files: the plan's measures per cell, and the
+        distinct invoices per period and per dimension value (grouping
+        sets, one pass).
+        """
+        week_start = pd.Timestamp(periods["current"][0])
+        first_day = week_start - pd.Timedelta(weeks=FOUR_WEEK_BUCKETS[-1])
+        next_week = week_start + pd.Timedelta(weeks=1)
+        files = self._files(first_day, next_week - pd.Timedelta(days=1))
+        params = {"files": files, "week_start": week_start, "first_day": first_day, "next_week": next_week}
+
+        plan = compile_plan()
+        dimensions = dimension_columns(plan)
+        labels = ["Product line", "City", "Payment", *dimensions]
+        keys = [_quote(column) for column in labels]
+        window = f"""
+            SELECT *, CAST(-floor(date_diff('day', $week_start, "Date") / 7) AS INTEGER) AS bucket
+            FROM {self._source()}
+            WHERE "Date" >= $first_day AND "Date" < $next_week
+        """
+
+        types = self._column_types(files)
+        measures = [self._aggregation(name, column, function, types)
+                    for name, (column, function) in plan["aggregations"].items()]
+        # NULL keys form cells of their own: those rows still count in the totals
+        cells = self.conn.execute(f"""
+            SELECT bucket, CAST(isodow("Date") - 1 AS BIGINT) AS weekday, {", ".join(keys)}, {", ".join(measures)}
+            FROM ({window})
+            GROUP BY ALL
+        """, params).fetchdf()
+        # Categorical keys, as in the loaded frames: the breakdown tables keep the same dtypes
+        cells = cells.astype({"bucket": np.int64, **{column: "category" for column in labels}})
+        cells = cells.set_index(CELL_KEYS + dimensions).sort_index()
+
+        distinct = 'count(DISTINCT "Invoice ID") FILTER (WHERE {})'
+        columns = [_quote(column) for column in dimensions] + [
+            f"GROUPING({_quote(column)}) AS grouped_{i}" for i, column in enumerate(dimensions)
+        ] + [
+            distinct.format(f"bucket = {CURRENT_BUCKET}") + " AS current",
+            distinct.format(f"bucket = {LAST_WEEK_BUCKET}") + " AS last_week",
+            distinct.format(f"bucket BETWEEN {FOUR_WEEK_BUCKETS[0]} AND {FOUR_WEEK_BUCKETS[-1]}") + " AS four_weeks",
+        ]
+        sets = ", ".join(["()"] + [f"({_quote(column)})" for column in dimensions])
+        counts = self.conn.execute(f"""
+            SELECT {", ".join(columns)}
+            FROM ({window})
+            GROUP BY GROUPING SETS ({sets})
+        """, params).fetchdf()
+
+        per_dimension = pd.Series(False, index=counts.index)
+        dimension_transactions = {}
+        for i, column in enumerate(dimensions):
+            rows = counts[(counts[f"grouped_{i}"] == 0) & counts[column].notna()]
+            per_dimension |= counts[f"grouped_{i}"] == 0
+            dimension_transactions[column] = pd.Series(
+                rows["current"].to_numpy(np.int64), index=pd.Index(rows[column].to_numpy(), name=column)
+            )
+        totals = counts[~per_dimension].iloc[0]
+        transactions = {period: int(totals[period]) for period in ("current", "last_week", "four_weeks")}
+
+        return aggregates_from_cells(cells, transactions=transactions, dimension_transactions=dimension_transactions)
+
+    def weekly_totals(self, week_start) -> pd.DataFrame:
+        """trends.weekly_totals of the whole store: sales and distinct invoices per week, zeros included"""
+        week_start = pd.Timestamp(week_start)
+        next_week = week_start + pd.Timedelta(weeks=1)
+        files = self._files(end=next_week - pd.Timedelta(days=1))
+        rows = self.conn.execute(f"""
+            SELECT CAST(floor(date_diff('day', $week_start, "Date") / 7) AS BIGINT) AS week,
+                coalesce(fsum("Sales"), 0) AS sales, count(DISTINCT "Invoice ID") AS transactions
+            FROM {self._source()}
+            WHERE "Date" < $next_week
+            GROUP BY week
+        """, {"files": files, "week_start": week_start, "next_week": next_week}).fetchdf()
+
+        first_week = min(int(rows["week"].min()), 0) if len(rows) else 0
+        weeks = np.arange(first_week, 1)
+        sales = np.zeros(len(weeks))
+        transactions = np.zeros(len(weeks), dtype=np.int64)
+        positions = rows["week"].to_numpy() - first_week
+        sales[positions] = rows["sales"].to_numpy()
+        transactions[positions] = rows["transactions"].to_numpy()
+
+        index = pd.DatetimeIndex(week_start + pd.to_timedelta(weeks * 7, unit="D"), name="Week")
+        return pd.DataFrame({"sales": sales, "transactions": transactions}, index=index)
@@ -1,96 +1,217 @@
+from datetime import datetime
 from pathlib import Path
+import warnings
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
 
+from src.kpi_plan import kpi_number_formats
 
-def create_formatted_excel_report(filepath: Path, tables_list: list):
+SHEET = "dashboard_data"
+FIXED_START_ROWS = [1, 31, 61, 91, 121, 151, 181, 211]
+TABLE_SPACING = 30  # rows between table starts, as in the fixed layout
+COLUMN_WIDTHS = {"A": 80, "B": 30, "C": 20}
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+DATE_FORMAT = "YYYY-MM-DD"
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _excel_value(value):
+    """Convert a DataFrame value to what pandas would write to the cell"""
+    if hasattr(value, "item"):  # numpy scalars
+        value = value.item()
+    if isinstance(value, float) and value != value:  # NaN → empty cell
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def _reads_back_as_int(value) -> bool:
+    """
+    openpyxl stores numbers as "%.16g", so integral floats are read back as
+    int. Formats depend on the type read back, exactly like the original
+    write → reload → format process.
+    """
+    if isinstance(value, int):
+        return True
+    text = "%.16g" % value
+    return not any(char in text for char in ".eEn")
+
+
+def _number_format(table_name: str, header: str, row_offset: int, metric, value, kpi_formats: dict = None):
+    """
+    Number format of a numeric body cell – EXACT COPY of the original rules,
+    with the KPI formats declared in CONFIG["kpi_definitions"] (kpi_formats)
+    for tbl_kpis and the KPI columns of the dimension tables
+    """
+    kpi_formats = kpi_formats or {}
+    # Trend tables (added after the original ones): year-over-year changes
+    if (table_name == "tbl_weekly_trends" and header.endswith("YoY")) or \
+       (table_name == "tbl_yoy_comparison" and header == "Change"):
+        return "0.0%"
+    if table_name == "tbl_top_performers" and header == "Value":
+        return "#,##0.0" if row_offset <= 2 else "0.0%"
+    if table_name in {"tbl_kpis_percentage_changes"} or \
+       (table_name == "tbl_payment_distribution" and header == "Percentage"):
+        return "0.0%"
+    if table_name == "tbl_kpis" and header == "Value":
+        return kpi_formats.get(metric)
+    if table_name.startswith("tbl_kpis_by_") and header in kpi_formats:
+        return kpi_formats[header]
+    return "#,##0.0" if not _reads_back_as_int(value) else "#,##0"
+
+
+def _table_start_rows(tables_list: list) -> list:
+    """
+    The original tables keep their fixed rows; any further table starts
+    TABLE_SPACING rows after the previous one, or right after it (plus a
+    blank row) when the previous table is longer.
+    """
+    start_rows = FIXED_START_ROWS[:len(tables_list)]
+    for _, previous_table in tables_list[len(start_rows) - 1:-1]:
+        start_rows.append(start_rows[-1] + max(TABLE_SPACING, len(previous_table) + 2))
+    return start_rows
+
+
+def _write_detail_sheets(wb: Workbook, df_detail: pd.DataFrame, sheet_name: str,
+                         chunk_rows: int, rows_per_sheet: int = EXCEL_MAX_ROWS - 1) -> int:
+    """
+    Stream the transactions of df_detail into one or more write-only sheets.
+
+    Rows are converted `chunk_rows` at a time and written straight to disk by
+    openpyxl, so memory stays constant whatever the number of rows. A new
+    sheet (sheet_name_2, sheet_name_3, ...) is started whenever the current
+    one reaches Excel's row limit.
+
+    Returns the number of sheets written.
+    """
+    headers = list(df_detail.columns)
+    date_columns = {
+        i for i, column in enumerate(headers)
+        if pd.api.types.is_datetime64_any_dtype(df_detail[column])
+    }
+    # float32 columns of compact frames are written in their shortest decimal
+    # form (9.1, not 9.100000381469727)
+    float32_columns = [column for column in headers if df_detail[column].dtype == "float32"]
+
+    sheets = 0
+    ws = None
+    rows_in_sheet = rows_per_sheet
+    for chunk_start in range(0, len(df_detail), chunk_rows):
+        chunk = df_detail.iloc[chunk_start:chunk_start + chunk_rows]
+        if float32_columns:
+            chunk = chunk.assign(**{
+                column: chunk[column].astype(str).astype("float64") for column in float32_columns
+            })
+        for row in chunk.itertuples(index=False, name=None):
+            if rows_in_sheet == rows_per_sheet:
+                sheets += 1
+                ws = wb.create_sheet(sheet_name if sheets == 1 else f"{sheet_name}_{sheets}")
+                ws.append(headers)
+                rows_in_sheet = 0
+
+            cells = []
+            for i, value in enumerate(row):
+                value = _excel_value(value)
+                if i in date_columns and value is not None:
+                    value = WriteOnlyCell(ws, value)
+                    value.number_format = DATE_FORMAT
+                cells.append(value)
+            ws.append(cells)
+            rows_in_sheet += 1
+
+    return sheets
+
+
+def create_formatted_excel_report(filepath: Path, tables_list: list, df_detail: pd.DataFrame = None,
+                                  detail_sheet: str = "week_detail", detail_chunk_rows: int = 50_000):
     """
     Adapted version that receives an ordered list of (table_name, dataframe)
     and generates exactly the same layout as the original script.
-    """
-    SHEET = "dashboard_data"
-    fixed_start_rows = [1, 31, 61, 91, 121, 151, 181, 211]
 
-    # ── 1. Write data to fixed positions ─────────────────────────────────────────
-    with pd.ExcelWriter(filepath, engine="openpyxl", mode="w") as writer:
-        for (table_name, df_table), start_row in zip(tables_list, fixed_start_rows):
-            df_table.to_excel(writer, sheet_name=SHEET, startrow=start_row - 1, index=False)
+    The workbook is written in a single streaming pass (openpyxl write-only
+    mode): table definitions, column widths and number formats are set while
+    the rows are written, without reloading the file.
 
-    # ── 2. Load workbook and apply formatting ────────────────────────────────────
-    wb = load_workbook(filepath)
-    ws = wb[SHEET]
+    If df_detail is given, its rows (e.g. the week's transactions) are also
+    streamed into extra detail sheet(s) after the dashboard sheet.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET)
 
     # Column widths (exact match to original)
-    ws.column_dimensions['A'].width = 80
-    ws.column_dimensions['B'].width = 30
-    ws.column_dimensions['C'].width = 20
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    kpi_formats = kpi_number_formats()
+    next_row = 1
+    start_rows = _table_start_rows(tables_list)
+    for index, ((table_name, df_table), start_row) in enumerate(zip(tables_list, start_rows)):
+        # ── 1. Move to the fixed position of the table ───────────────────────
+        while next_row < start_row:
+            ws.append([])
+            next_row += 1
+
+        headers = list(df_table.columns)
+        ws.append(headers)
 
-    # ── 3. Create Excel tables with the same names ───────────────────────────────
-    for (table_name, df_table), start_row in zip(tables_list, fixed_start_rows):
+        # ── 2. Body rows with number formats set on the fly ──────────────────
+        # The tables of the original layout (FIXED_START_ROWS) end one row
+        # before their last data row, as in the original workbook; later
+        # tables cover all their rows. Only cells inside a table are formatted
+        num_rows = len(df_table)
+        table_rows = num_rows - 1 if index < len(FIXED_START_ROWS) else num_rows
+        for row_offset, row in enumerate(df_table.itertuples(index=False, name=None), start=1):
+            inside_table = row_offset <= table_rows
+            cells = []
+            for header, value in zip(headers, row):
+                value = _excel_value(value)
+                if isinstance(value, datetime):
+                    cell = WriteOnlyCell(ws, value)
+                    cell.number_format = DATETIME_FORMAT
+                    value = cell
+                elif inside_table and isinstance(value, (int, float)):
+                    number_format = _number_format(
+                        table_name, header, row_offset, _excel_value(row[0]), value, kpi_formats
+                    )
+                    if number_format:
+                        cell = WriteOnlyCell(ws, value)
+                        cell.number_format = number_format
+                        value = cell
+                cells.append(value)
+            ws.append(cells)
+        next_row += num_rows + 1
+
+        # ── 3. Create Excel tables with the same names ───────────────────────
         if df_table.empty:
             continue
 
-        num_rows = len(df_table)
         num_cols = df_table.shape[1]
         start_cell = f"A{start_row}"
-        end_cell = f"{chr(64 + num_cols)}{start_row + num_rows - 1}"
+        end_cell = f"{chr(64 + num_cols)}{start_row + table_rows}"
         ref = f"{start_cell}:{end_cell}"
 
-        table = Table(displayName=table_name, ref=ref)
+        table = Table(displayName=table_name, ref=ref, autoFilter=AutoFilter(ref=ref))
+        # Write-only sheets can't read the header cells back: name the columns here
+        table.tableColumns = [
+            TableColumn(id=i, name=str(header)) for i, header in enumerate(headers, start=1)
+        ]
         table.tableStyleInfo = TableStyleInfo(
             name="TableStyleMedium9",
             showRowStripes=True
         )
-        ws.add_table(table)
-
-    # ── 4. Number formatting – EXACT COPY of original script ─────────────────────
-    for table in ws.tables.values():
-        start_cell, end_cell = table.ref.split(":")
-        min_row = ws[start_cell].row + 1  # skip header
-        max_row = ws[end_cell].row
-        min_col = ws[start_cell].column
-        max_col = ws[end_cell].column
-
-        # Get headers
-        header_cells = next(ws.iter_rows(
-            min_row=min_row-1,
-            max_row=min_row-1,
-            min_col=min_col,
-            max_col=max_col
-        ))
-        headers = [cell.value for cell in header_cells]
-
-        value_col = headers.index("Value") + min_col if "Value" in headers else None
-        percentage_col = headers.index("Percentage") + min_col if "Percentage" in headers else None
-
-        for row in ws.iter_rows(
-            min_row=min_row,
-            max_row=max_row,
-            min_col=min_col,
-            max_col=max_col
-        ):
-            for cell in row:
-                if isinstance(cell.value, (int, float)) and cell.value is not None:
-                    if table.displayName == "tbl_top_performers" and cell.column == value_col:
-                        row_offset = cell.row - min_row + 1
-                        if row_offset <= 2:
-                            cell.number_format = "#,##0.0"
-                        else:
-                            cell.number_format = "0.0%"
-                    elif table.displayName in {"tbl_kpis_percentage_changes"} or \
-                         (table.displayName == "tbl_payment_distribution" and cell.column == percentage_col):
-                        cell.number_format = "0.0%"
-                    elif table.displayName == "tbl_kpis" and cell.column == value_col:
-                        metric = ws.cell(row=cell.row, column=min_col).value
-                        if metric in {"Total Sales", "Average Ticket", "Gross Income"}:
-                            cell.number_format = "#,##0.0"
-                        elif metric in {"Transactions", "Total Quantity"}:
-                            cell.number_format = "#,##0"
-                        elif metric == "Average Rating":
-                            cell.number_format = "0.0"
-                    else:
-                        cell.number_format = "#,##0.0" if not isinstance(cell.value, int) else "#,##0"
+        with warnings.catch_warnings():
+            # openpyxl always warns in write-only mode; the columns are set above
+            warnings.filterwarnings("ignore", message="In write-only mode you must add table columns manually")
+            ws.add_table(table)
+
+    # ── 4. Optional full-detail sheets ───────────────────────────────────────
+    if df_detail is not None:
+        sheets = _write_detail_sheets(wb, df_detail, detail_sheet, detail_chunk_rows)
+        print(f"Detail sheet(s) added: {len(df_detail):,} rows in {sheets} sheet(s)")
 
     wb.save(filepath)
-    print(f"Excel report generated with identical layout to the original: {filepath}")
\ No newline at end of file
+    print(f"Excel report generated with identical layout to the original: {filepath}")
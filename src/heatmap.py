@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from src.metrics import invoice_codes
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+HOURS = 24
+_SECONDS_PER_DAY = 86400
+# 1970-01-01 (day 0 of the epoch) was a Thursday
+_EPOCH_WEEKDAY = 3
+# Time formats tried in order: the exports' "1:08:00 PM", then 24-hour "13:08:00"
+TIME_FORMATS = ["%I:%M:%S %p", "%H:%M:%S"]
+
+
+def _codes_and_values(values: pd.Series) -> tuple:
+    """Integer code per row (-1 for missing) and the distinct values they index"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values)
+
+
+def transaction_timestamps(dates: pd.Series, times: pd.Series) -> np.ndarray:
+    """
+    Date + Time ("1:08:00 PM") as one datetime64[s] array, NaT where the
+    time is missing or unreadable. There is at most one distinct Time per
+    second of the day, so each distinct value is parsed once and mapped
+    back to the rows through its integer code.
+    """
+    codes, values = _codes_and_values(times)
+    values = pd.Series(values, dtype=object)
+    parsed = pd.to_datetime(values, format=TIME_FORMATS[0], errors="coerce")
+    for time_format in TIME_FORMATS[1:]:
+        parsed = parsed.fillna(pd.to_datetime(values, format=time_format, errors="coerce"))
+    offsets = (parsed - parsed.dt.normalize()).to_numpy().astype("timedelta64[s]")
+    offsets = np.append(offsets, np.timedelta64("NaT", "s"))  # code -1 → NaT
+    return dates.to_numpy().astype("datetime64[s]") + offsets[codes]
+
+
+def hourly_heatmap(week: pd.DataFrame) -> dict:
+    """
+    Sales and transactions of the week's transactions by branch × weekday
+    × hour, in one binned pass: every row gets a flat cell number and
+    np.bincount sums the cells, so the cost is linear in rows with no
+    per-group work. Transactions are distinct invoices per cell.
+
+    Returns the branches and two (branch, weekday, hour) arrays.
+    """
+    timestamps = transaction_timestamps(week["Date"], week["Time"])
+    branch_codes, branches = _codes_and_values(week["Branch"])
+    valid = ~np.isnat(timestamps) & (branch_codes >= 0)
+
+    seconds = timestamps[valid].astype(np.int64)
+    weekday = (seconds // _SECONDS_PER_DAY + _EPOCH_WEEKDAY) % 7
+    hour = seconds % _SECONDS_PER_DAY // 3600
+    cells = (branch_codes[valid].astype(np.int64) * 7 + weekday) * HOURS + hour
+    shape = (len(branches), 7, HOURS)
+
+    sales = np.bincount(cells, weights=week["Sales"].to_numpy(dtype=np.float64)[valid], minlength=np.prod(shape))
+    # Distinct (cell, invoice code) pairs, as weekly_totals does per week
+    codes = invoice_codes(week["Invoice ID"])[valid]
+    n_codes = int(codes.max()) + 1 if len(codes) else 1
+    known = codes >= 0
+    pairs = pd.unique(cells[known] * n_codes + codes[known])
+    transactions = np.bincount(pairs // n_codes, minlength=np.prod(shape))
+
+    return {
+        "branches": [str(branch) for branch in branches],
+        "sales": sales.reshape(shape),
+        "transactions": transactions.reshape(shape),
+    }
+
+
+def create_heatmap_tables(heatmap: dict) -> list:
+    """
+    Heatmap tables for the report, one row per branch and hour (branches
+    with sales, hours in which any branch sold during the week), one column
+    per weekday:
+    - tbl_hourly_sales
+    - tbl_hourly_transactions
+    """
+    open_hours = np.flatnonzero(heatmap["transactions"].sum(axis=(0, 1)))
+    if not len(open_hours):
+        return []
+    hours = np.arange(open_hours[0], open_hours[-1] + 1)
+    active = heatmap["transactions"].sum(axis=(1, 2)) > 0
+    branches = [branch for branch, selling in zip(heatmap["branches"], active) if selling]
+
+    tables = []
+    for table_name, key, decimals in (("tbl_hourly_sales", "sales", 1),
+                                      ("tbl_hourly_transactions", "transactions", None)):
+        # (branch, weekday, hour) → rows of (branch, hour), columns by weekday
+        matrix = heatmap[key][active][:, :, hours].transpose(0, 2, 1).reshape(-1, 7)
+        table = pd.DataFrame(matrix, columns=WEEKDAYS)
+        if decimals is not None:
+            table = table.round(decimals)
+        table.insert(0, "Hour", [f"{hour:02d}:00" for hour in hours] * len(branches))
+        table.insert(0, "Branch", np.repeat(branches, len(hours)))
+        tables.append((table_name, table))
+    return tables
@@ -0,0 +1,198 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Union
+
+import pandas as pd
+
+from src.cube import CUBE_FILENAME, sketch_path_for, update_daily_cube
+from src.data import CACHE_DTYPES, load_and_validate_sales_data, to_compact_frame
+from src.result_cache import sha256_file
+
+INDEX_FILENAME = "invoice_index.sqlite"
+PARTITION_PREFIX = "date="
+
+
+def _open_index(store_dir: Path) -> sqlite3.Connection:
+    """Persistent index of every Invoice ID and source file already in the store"""
+    conn = sqlite3.connect(store_dir / INDEX_FILENAME)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS invoices ("
+        "invoice_id TEXT PRIMARY KEY, date TEXT NOT NULL, source TEXT NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS files ("
+        "sha256 TEXT PRIMARY KEY, name TEXT NOT NULL, rows INTEGER NOT NULL, "
+        "ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    return conn
+
+
+def _known_invoice_ids(conn: sqlite3.Connection, invoice_ids: pd.Series) -> set:
+    """Invoice IDs of the new file that are already in the index"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS new_ids (invoice_id TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM new_ids")
+    conn.executemany(
+        "INSERT OR IGNORE INTO new_ids VALUES (?)",
+        ((invoice_id,) for invoice_id in invoice_ids.astype(str).unique()),
+    )
+    rows = conn.execute(
+        "SELECT n.invoice_id FROM new_ids n JOIN invoices i ON i.invoice_id = n.invoice_id"
+    )
+    return {row[0] for row in rows}
+
+
+def ingest_daily_file(filepath: Union[str, Path], store_dir: Path) -> int:
+    """
+    Validate a new daily CSV and append it to the date-partitioned store.
+
+    Only the new file is validated. Rows whose Invoice ID is already in the
+    store (or repeated inside the file) are dropped with a warning. Each day
+    is written as a new part file under store_dir/date=YYYY-MM-DD/, existing
+    partitions are never rewritten. The daily aggregate cube of the store is
+    updated with the new rows only.
+
+    Returns the number of rows appended.
+    """
+    filepath = Path(filepath)
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    conn = _open_index(store_dir)
+    try:
+        file_hash = sha256_file(filepath)
+        already = conn.execute("SELECT name FROM files WHERE sha256 = ?", (file_hash,)).fetchone()
+        if already:
+            print(f"Skipped {filepath.name}: identical file already ingested as {already[0]}")
+            return 0
+
+        df = load_and_validate_sales_data(filepath)
+
+        # Duplicates inside the file itself
+        repeated = df["Invoice ID"].duplicated()
+        if repeated.any():
+            print(f"Warning: {repeated.sum()} repeated Invoice IDs inside {filepath.name} were removed")
+            df = df[~repeated]
+
+        # Duplicates against everything already ingested
+        known = _known_invoice_ids(conn, df["Invoice ID"])
+        if known:
+            print(f"Warning: {len(known)} Invoice IDs already in the store were removed "
+                  f"(e.g. {', '.join(sorted(known)[:5])})")
+            df = df[~df["Invoice ID"].astype(str).isin(known)]
+
+        if df.empty:
+            print(f"Nothing new to ingest from {filepath.name}")
+            return 0
+
+        # Per-invoice and per-minute values stay plain strings on disk: as
+        # categoricals every daily part would carry the whole file's categories
+        df = df.astype({**CACHE_DTYPES, "Invoice ID": "str", "Time": "str"})
+        day_str = df["Date"].dt.strftime("%Y-%m-%d")
+        part_name = f"part-{filepath.stem}-{file_hash[:8]}.parquet"
+
+        # Index rows and partition files are committed together: if writing a
+        # partition fails, the index is rolled back and the written parts removed
+        written = []
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO invoices (invoice_id, date, source) VALUES (?, ?, ?)",
+                    zip(df["Invoice ID"].astype(str), day_str, [filepath.name] * len(df)),
+                )
+                conn.execute(
+                    "INSERT INTO files (sha256, name, rows) VALUES (?, ?, ?)",
+                    (file_hash, filepath.name, len(df)),
+                )
+                for day, df_day in df.groupby(day_str, sort=True):
+                    partition_dir = store_dir / f"{PARTITION_PREFIX}{day}"
+                    partition_dir.mkdir(exist_ok=True)
+                    part_file = partition_dir / part_name
+                    df_day.to_parquet(part_file, engine="pyarrow", index=False)
+                    written.append(part_file)
+        except Exception:
+            for part_file in written:
+                part_file.unlink(missing_ok=True)
+            raise
+
+        print(f"Ingested {len(df):,} rows from {filepath.name} into {len(written)} daily partition(s)")
+
+        cube_path = store_dir / CUBE_FILENAME
+        try:
+            update_daily_cube(cube_path, df)
+        except Exception as e:
+            # A stale cube would silently miss these rows: drop it so it is rebuilt
+            print(f"Warning: Could not update daily cube ({e}); it will be rebuilt on the next run")
+            cube_path.unlink(missing_ok=True)
+            sketch_path_for(cube_path).unlink(missing_ok=True)
+
+        return len(df)
+    finally:
+        conn.close()
+
+
+def store_fingerprint(store_dir: Path) -> str:
+    """Hash of the set of source files ingested into the store (changes with every ingest)"""
+    conn = _open_index(Path(store_dir))
+    try:
+        hashes = [row[0] for row in conn.execute("SELECT sha256 FROM files ORDER BY sha256")]
+    finally:
+        conn.close()
+    return hashlib.sha256("\n".join(hashes).encode()).hexdigest()
+
+
+def _partition_dates(store_dir: Path) -> list:
+    dates = []
+    for partition_dir in Path(store_dir).glob(f"{PARTITION_PREFIX}*"):
+        if partition_dir.is_dir():
+            dates.append(pd.Timestamp(partition_dir.name[len(PARTITION_PREFIX):]))
+    return sorted(dates)
+
+
+def latest_partition_date(store_dir: Path) -> pd.Timestamp:
+    """Most recent day present in the store"""
+    dates = _partition_dates(store_dir)
+    if not dates:
+        raise FileNotFoundError(f"No partitions found in store {store_dir}")
+    return dates[-1]
+
+
+def partition_files(store_dir: Path, start=None, end=None) -> list:
+    """Part files of the daily partitions between start and end (inclusive, default: all), oldest day first"""
+    start = pd.Timestamp(start).normalize() if start is not None else None
+    end = pd.Timestamp(end).normalize() if end is not None else None
+    parts = []
+    for day in _partition_dates(store_dir):
+        if (start is None or day >= start) and (end is None or day <= end):
+            partition_dir = Path(store_dir) / f"{PARTITION_PREFIX}{day:%Y-%m-%d}"
+            parts.extend(sorted(partition_dir.glob("*.parquet")))
+    return parts
+
+
+def iter_partitions(store_dir: Path):
+    """Yield every part file of the store as a DataFrame, oldest day first"""
+    for part in partition_files(store_dir):
+        yield pd.read_parquet(part, engine="pyarrow")
+
+
+def load_partitions(store_dir: Path, start, end) -> pd.DataFrame:
+    """
+    Read only the daily partitions between start and end (inclusive).
+
+    Returns the already validated rows with the same typed columns as the
+    ingest cache.
+    """
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    parts = [pd.read_parquet(part, engine="pyarrow") for part in partition_files(store_dir, start, end)]
+
+    if not parts:
+        raise FileNotFoundError(f"No partitions between {start:%Y-%m-%d} and {end:%Y-%m-%d} in {store_dir}")
+
+    # Categories can differ between part files: re-apply the common dtypes
+    df = pd.concat(parts, ignore_index=True).astype(CACHE_DTYPES)
+
+    print(f"\nLoaded {len(df):,} rows from {len(parts)} partition file(s) "
+          f"({start:%Y-%m-%d} → {end:%Y-%m-%d})")
+    df = to_compact_frame(df)
+    print()
+    return df
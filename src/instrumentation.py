@@ -0,0 +1,152 @@
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def max_rss_bytes():
+    """Peak resident set size of the process so far (None where unsupported)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RunRecorder:
+    """
+    Structured record of one pipeline run.
+
+    Each step runs inside `with recorder.stage(name) as stage:`; the stage's
+    wall time, the process peak RSS and its status are recorded
+    automatically, and the step can add rows_in / rows_out / bytes_written / memory_bytes
+    or validation warning counts to the `stage` dict. The record is saved as
+    JSON and optionally as a Prometheus textfile (node_exporter textfile
+    collector format).
+    """
+
+    def __init__(self, run_name: str = "weekly_report"):
+        self.run_name = run_name
+        self._start = time.perf_counter()
+        self.record = {
+            "run_id": uuid.uuid4().hex,
+            "run_name": run_name,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "finished_at": None,
+            "status": "running",
+            "duration_seconds": None,
+            "max_rss_bytes": None,
+            "validation_warnings": {},
+            "stages": [],
+            "error": None,
+        }
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        stage = {"name": name, "status": "running", "rows_in": rows_in}
+        self.record["stages"].append(stage)
+        start = time.perf_counter()
+        try:
+            yield stage
+            stage["status"] = "success"
+        except BaseException as e:
+            stage["status"] = "failed"
+            stage["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stage["seconds"] = round(time.perf_counter() - start, 4)
+            stage["max_rss_bytes"] = max_rss_bytes()
+            for check, count in stage.get("warnings", {}).items():
+                self.record["validation_warnings"][check] = (
+                    self.record["validation_warnings"].get(check, 0) + int(count)
+                )
+
+    def fail(self, error: BaseException):
+        self.record["status"] = "failed"
+        self.record["error"] = {
+            "type": type(error).__name__,
+            "message": str(error),
+            "traceback": "".join(traceback.format_exception(type(error), error, error.__traceback__)),
+        }
+
+    def _finish(self):
+        if self.record["status"] == "running":
+            self.record["status"] = "success"
+        self.record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        self.record["duration_seconds"] = round(time.perf_counter() - self._start, 4)
+        self.record["max_rss_bytes"] = max_rss_bytes()
+
+    def save(self, metrics_dir: Path, prometheus_textfile: Path = None) -> Path:
+        """Write the JSON run record (and the Prometheus textfile if configured)"""
+        self._finish()
+        metrics_dir = Path(metrics_dir)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+
+        record_path = metrics_dir / f"run_{datetime.now():%Y%m%d_%H%M%S}_{self.record['run_id'][:8]}.json"
+        record_path.write_text(json.dumps(self.record, indent=2, default=str), encoding="utf-8")
+
+        if prometheus_textfile:
+            self.write_prometheus(Path(prometheus_textfile))
+        return record_path
+
+    def write_prometheus(self, path: Path):
+        prefix = self.run_name
+        lines = [
+            f"# HELP {prefix}_run_duration_seconds Wall time of the last run.",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"{prefix}_run_duration_seconds {self.record['duration_seconds']}",
+            f"# HELP {prefix}_run_success 1 if the last run succeeded, 0 otherwise.",
+            f"# TYPE {prefix}_run_success gauge",
+            f"{prefix}_run_success {int(self.record['status'] == 'success')}",
+            f"# HELP {prefix}_last_run_timestamp_seconds Unix time the last run finished.",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds {time.time():.0f}",
+        ]
+        if self.record["max_rss_bytes"] is not None:
+            lines += [
+                f"# HELP {prefix}_max_rss_bytes Peak resident memory of the last run.",
+                f"# TYPE {prefix}_max_rss_bytes gauge",
+                f"{prefix}_max_rss_bytes {self.record['max_rss_bytes']}",
+            ]
+
+        stage_metrics = {
+            "seconds": ("stage_duration_seconds", "Wall time of each stage."),
+            "rows_in": ("stage_rows_in", "Rows entering each stage."),
+            "rows_out": ("stage_rows_out", "Rows produced by each stage."),
+            "bytes_written": ("stage_bytes_written", "Bytes written by each stage."),
+            "memory_bytes": ("stage_frame_memory_bytes", "In-memory size of the frame loaded by each stage."),
+        }
+        for key, (metric, help_text) in stage_metrics.items():
+            # A stage run several times (validate: one per file) is summed into one series:
+            # the textfile collector rejects a file with duplicate series
+            totals = {}
+            for stage in self.record["stages"]:
+                if stage.get(key) is not None:
+                    totals[stage["name"]] = totals.get(stage["name"], 0) + stage[key]
+            samples = [f'{prefix}_{metric}{{stage="{name}"}} {value}' for name, value in totals.items()]
+            if samples:
+                lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} gauge", *samples]
+
+        if self.record["validation_warnings"]:
+            lines += [
+                f"# HELP {prefix}_validation_warnings Rows flagged by each validation check.",
+                f"# TYPE {prefix}_validation_warnings gauge",
+                *(f'{prefix}_validation_warnings{{check="{check}"}} {count}'
+                  for check, count in self.record["validation_warnings"].items()),
+            ]
+
+        # Atomic replace: the textfile collector must never read a partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
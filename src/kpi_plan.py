@@ -0,0 +1,118 @@
+import pandas as pd
+
+from config import CONFIG
+
+# Measures every plan computes: calculate_kpis and the period comparisons are built on them
+CORE_MEASURES = {
+    "sales": ("Sales", "sum"),
+    "quantity": ("Quantity", "sum"),
+    "gross_income": ("gross income", "sum"),
+    "rating_sum": ("Rating", "sum"),
+    "rating_count": ("Rating", "count"),
+}
+# Distinct Invoice ID, counted apart from the summed measures (exactly or with sketches)
+TRANSACTIONS = "transactions"
+AGGREGATIONS = {"sum", "count"}
+
+
+def compile_plan(measures: dict = None, kpis: list = None, dimensions: list = None) -> dict:
+    """
+    Compile the declared measures, KPIs and dimensions (default: CONFIG
+    kpi_measures, kpi_definitions, kpi_dimensions) into one aggregation plan:
+
+    - aggregations: {output column: (source column, "sum" | "count")}, one
+      per distinct source column and function, so measures declared under
+      several names (or used by several KPIs) are aggregated once
+    - aliases: every measure name → its output column
+    - dimensions: breakdown columns added to the grouping keys of the
+      single aggregation pass, with their table names and KPIs
+    - kpis: the KPI definitions, checked
+
+    Raises ValueError for unknown aggregations, measures or KPIs.
+    """
+    measures = CONFIG["kpi_measures"] if measures is None else measures
+    kpis = CONFIG["kpi_definitions"] if kpis is None else kpis
+    dimensions = CONFIG["kpi_dimensions"] if dimensions is None else dimensions
+
+    aggregations, aliases, outputs = {}, {}, {}
+    for name, (column, function) in {**CORE_MEASURES, **measures}.items():
+        if function not in AGGREGATIONS:
+            raise ValueError(f"Measure {name!r}: unknown aggregation {function!r} (use sum or count)")
+        if (column, function) not in outputs:
+            outputs[column, function] = name
+            aggregations[name] = (column, function)
+        aliases[name] = outputs[column, function]
+    aliases[TRANSACTIONS] = TRANSACTIONS
+
+    kpi_names = set()
+    for kpi in kpis:
+        for operand in (kpi["of"], kpi.get("per")):
+            if operand is not None and operand not in aliases and operand not in kpi_names:
+                raise ValueError(f"KPI {kpi['name']!r}: {operand!r} is neither a measure nor an earlier KPI")
+        kpi_names.add(kpi["name"])
+
+    compiled_dimensions = []
+    for dimension in dimensions:
+        unknown = [name for name in dimension["kpis"] if name not in kpi_names]
+        if unknown:
+            raise ValueError(f"Dimension {dimension['column']!r}: unknown KPI(s) {', '.join(unknown)}")
+        table = dimension.get("table") or "tbl_kpis_by_" + dimension["column"].lower().replace(" ", "_")
+        compiled_dimensions.append({**dimension, "table": table})
+
+    return {"aggregations": aggregations, "aliases": aliases, "dimensions": compiled_dimensions, "kpis": kpis}
+
+
+def dimension_columns(plan: dict) -> list:
+    return [dimension["column"] for dimension in plan["dimensions"]]
+
+
+def evaluate_kpis(totals: dict, plan: dict) -> dict:
+    """
+    KPI values, in declaration order, from summed measures (`totals` holds
+    the plan's output columns and "transactions"). A KPI is `of` (measure
+    or earlier KPI), divided by `per` when given (0.0 when that is 0),
+    rounded to `decimals` (0 → int).
+    """
+    values = {}
+
+    def operand(name):
+        return values[name] if name in values else totals[plan["aliases"][name]]
+
+    for kpi in plan["kpis"]:
+        value = operand(kpi["of"])
+        if kpi.get("per") is not None:
+            denominator = operand(kpi["per"])
+            value = value / denominator if denominator else 0.0
+        decimals = kpi.get("decimals")
+        if decimals == 0:
+            value = int(round(value))
+        elif decimals is not None:
+            value = round(value, decimals)
+        values[kpi["name"]] = value
+    return values
+
+
+def kpi_number_formats(plan: dict = None) -> dict:
+    """Excel number format of every KPI that declares one"""
+    plan = plan or compile_plan()
+    return {kpi["name"]: kpi["format"] for kpi in plan["kpis"] if kpi.get("format")}
+
+
+def create_dimension_tables(aggregates: dict, plan: dict = None) -> list:
+    """
+    One table per declared dimension: a row per value of the column with
+    the dimension's KPIs of the current week, evaluated from the summed
+    measures like tbl_kpis.
+    """
+    plan = plan or compile_plan()
+    tables = []
+    for dimension in plan["dimensions"]:
+        totals = aggregates.get("by_dimension", {}).get(dimension["column"])
+        if totals is None or totals.empty:
+            continue
+        rows = []
+        for value, measures in zip(totals.index, totals.to_dict("records")):
+            kpis = evaluate_kpis(measures, plan)
+            rows.append([str(value), *(kpis[name] for name in dimension["kpis"])])
+        tables.append((dimension["table"], pd.DataFrame(rows, columns=[dimension["column"], *dimension["kpis"]])))
+    return tables
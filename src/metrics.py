@@ -1,44 +1,310 @@
+import numpy as np
 import pandas as pd
+from config import CONFIG
+from src.kpi_plan import TRANSACTIONS, compile_plan, dimension_columns, evaluate_kpis
+
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Period buckets relative to the current week: 0 = current week, 1 = last week,
+# 1-4 = the previous 4 weeks
+CURRENT_BUCKET = 0
+LAST_WEEK_BUCKET = 1
+FOUR_WEEK_BUCKETS = (1, 2, 3, 4)
+
+CELL_KEYS = ["bucket", "weekday", "Product line", "City", "Payment"]
 
 
 def safe_pct_change(current: float, previous: float) -> float:
     return (current - previous) / previous if previous != 0 else 0.0
 
 
-def calculate_kpis(df_week: pd.DataFrame, df_last_week: pd.DataFrame, df_4weeks: pd.DataFrame) -> dict:
-    """Calculate main KPIs and percentage changes"""
+def _period_totals(cells: pd.DataFrame, buckets, transactions: int) -> dict:
+    """Sum the aggregate cells of the given buckets into one period total (every measure of the plan)"""
+    period = cells[cells.index.get_level_values("bucket").isin(buckets)]
+    totals = {measure: period[measure].sum() for measure in period.columns if measure != "invoices"}
+    totals.update(
+        quantity=int(totals["quantity"]),
+        rating_count=int(totals["rating_count"]),
+        transactions=int(transactions),
+    )
+    return totals
+
+
+# ── Distinct invoice counting ───────────────────────────────────────────────
+
+def invoice_codes(invoices: pd.Series) -> np.ndarray:
+    """Integer code per invoice (-1 for missing): categorical codes when already factorised"""
+    if isinstance(invoices.dtype, pd.CategoricalDtype):
+        return invoices.cat.codes.to_numpy()
+    return pd.factorize(invoices)[0]
+
+
+def exact_distinct_transactions(codes: np.ndarray, bucket: np.ndarray) -> dict:
+    """
+    Exact distinct invoices per period from integer codes: one boolean
+    bitmap row per bucket, so no string is hashed again and the 4-week
+    figure is the union of the bucket bitmaps.
+    """
+    valid = codes >= 0
+    seen = np.zeros((FOUR_WEEK_BUCKETS[-1] + 1, codes.max() + 1 if valid.any() else 0), dtype=bool)
+    seen[bucket[valid], codes[valid]] = True
+    return {
+        "current": int(seen[CURRENT_BUCKET].sum()),
+        "last_week": int(seen[LAST_WEEK_BUCKET].sum()),
+        "four_weeks": int(seen[list(FOUR_WEEK_BUCKETS)].any(axis=0).sum()),
+    }
+
+
+def distinct_invoices_by(values: pd.Series, invoices: pd.Series, approximate: bool = False) -> pd.Series:
+    """
+    Distinct invoices per value of `values` (rows aligned with `invoices`):
+    distinct (value code, invoice code) pairs, or one HyperLogLog sketch
+    per value in approximate mode.
+    """
+    codes, uniques = pd.factorize(values, sort=True)
+    if approximate:
+        valid = (codes >= 0) & invoices.notna().to_numpy()
+        registers = build_sketches(codes[valid], hash_values(invoices[valid]), len(uniques), CONFIG["hll_precision"])
+        counts = np.round(estimate_distinct(registers)).astype(np.int64) if len(uniques) else []
+    else:
+        invoice_ids = invoice_codes(invoices)
+        valid = (codes >= 0) & (invoice_ids >= 0)
+        n_codes = int(invoice_ids.max()) + 1 if valid.any() else 1
+        pairs = pd.unique(codes[valid].astype(np.int64) * n_codes + invoice_ids[valid])
+        counts = np.bincount(pairs // n_codes, minlength=len(uniques))
+    return pd.Series(counts, index=pd.Index(np.asarray(uniques), name=values.name))
+
+
+def hash_values(values) -> np.ndarray:
+    """Stable 64-bit hashes (same value → same hash across runs and processes)"""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Bit length of uint64 values, exact (each 32-bit half fits a float64 mantissa)"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+def build_sketches(group_ids: np.ndarray, hashes: np.ndarray, n_groups: int, precision: int) -> np.ndarray:
+    """
+    HyperLogLog registers of every group in one vectorised pass.
+
+    The first `precision` bits of each hash select a register, the rank of
+    the first set bit in the rest is its value; each register keeps the
+    maximum. Returns a (n_groups, 2**precision) uint8 array.
+    """
+    # A negative id (e.g. ngroup() of a row with a missing key) would wrap into the last group
+    if (group_ids < 0).any():
+        raise ValueError("group ids must be non-negative")
+    m = 1 << precision
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    rank = (64 - precision - _bit_length(rest) + 1).astype(np.uint8)
+
+    registers = np.zeros(n_groups * m, dtype=np.uint8)
+    np.maximum.at(registers, group_ids.astype(np.int64) * m + index, rank)
+    return registers.reshape(n_groups, m)
+
+
+def estimate_distinct(registers: np.ndarray) -> np.ndarray:
+    """HyperLogLog cardinality estimate of each register row (linear counting for small sets)"""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    with np.errstate(divide="ignore"):
+        small = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), small, raw)
+
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch: 2**precision one-byte registers
+    (precision 12 → 4 KiB, ~1.6% standard error). Sketches of days or
+    branches are combined with `merge` (register-wise max) and give the
+    distinct count of the union.
+    """
+
+    def __init__(self, precision: int = 12, registers: np.ndarray = None):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_values(cls, values, precision: int = 12) -> "HyperLogLog":
+        sketch = cls(precision)
+        sketch.add(values)
+        return sketch
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        registers = np.frombuffer(data, dtype=np.uint8).copy()
+        return cls(int(np.log2(len(registers))), registers)
+
+    def add(self, values) -> None:
+        hashes = hash_values(values)
+        new = build_sketches(np.zeros(len(hashes), dtype=np.int64), hashes, 1, self.precision)[0]
+        np.maximum(self.registers, new, out=self.registers)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Can't merge sketches of different precision")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    def count(self) -> int:
+        return int(round(estimate_distinct(self.registers)[0]))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+
+def sketch_transactions(registers: np.ndarray, bucket: np.ndarray) -> dict:
+    """Approximate distinct invoices per period from per-row-group sketches tagged with their bucket"""
+    per_bucket = np.zeros((FOUR_WEEK_BUCKETS[-1] + 1, registers.shape[1]), dtype=np.uint8)
+    np.maximum.at(per_bucket, bucket, registers)
+    estimates = estimate_distinct(per_bucket)
+    four_weeks = estimate_distinct(per_bucket[list(FOUR_WEEK_BUCKETS)].max(axis=0))[0]
+    return {
+        "current": int(round(estimates[CURRENT_BUCKET])),
+        "last_week": int(round(estimates[LAST_WEEK_BUCKET])),
+        "four_weeks": int(round(four_weeks)),
+    }
+
+
+# ── KPI engine ───────────────────────────────────────────────────────────────
+
+def compute_period_aggregates(df: pd.DataFrame, periods: dict, distinct_mode: str = None) -> dict:
+    """
+    KPI engine: every aggregate needed by the report in a single grouped pass.
+
+    Each row is tagged once with its period bucket (current week, last week,
+    previous 4 weeks) and weekday, then one groupby over
+    bucket × weekday × Product line × City × Payment (× the plan's
+    dimension columns) produces the sums the KPIs, comparisons and
+    breakdown tables are derived from: the measures of the compiled plan
+    (see kpi_plan.compile_plan), each aggregated once. Distinct invoices
+    are counted exactly from integer invoice codes, or estimated with
+    HyperLogLog sketches when distinct_mode (default
+    CONFIG["distinct_count_mode"]) is "approximate".
+
+    Returns a dict with the "current", "last_week" and "four_weeks" totals,
+    the current-week Sales breakdowns "by_product", "by_city",
+    "by_payment" and "by_day", and the current-week measure totals of each
+    dimension value in "by_dimension".
+    """
+    week_start = periods["current"][0]
+    plan = compile_plan()
+    dimensions = dimension_columns(plan)
+    approximate = (distinct_mode or CONFIG["distinct_count_mode"]) == "approximate"
+
+    days = (df["Date"] - week_start).dt.days.to_numpy()
+    bucket = -(days // 7)
+    in_windows = (bucket >= CURRENT_BUCKET) & (bucket <= FOUR_WEEK_BUCKETS[-1])
+
+    sources = [column for column, _ in plan["aggregations"].values()]
+    frame = df.loc[in_windows, list(dict.fromkeys(["Product line", "City", "Payment", *dimensions, *sources]))]
+    frame = frame.assign(bucket=bucket[in_windows], weekday=days[in_windows] % 7)
+
+    # dropna=False: rows with a missing key still count in the totals (the breakdowns skip them)
+    cells = frame.groupby(CELL_KEYS + dimensions, observed=True, sort=False, dropna=False).agg(**plan["aggregations"])
+
+    # Distinct invoices per bucket and over the whole 4-week window
+    invoices = df.loc[in_windows, "Invoice ID"]
+    current = bucket[in_windows] == CURRENT_BUCKET
+    dimension_transactions = {
+        column: distinct_invoices_by(frame[column][current], invoices[current], approximate)
+        for column in dimensions
+    }
+    if approximate:
+        valid = invoices.notna().to_numpy()
+        registers = build_sketches(
+            bucket[in_windows][valid], hash_values(invoices[valid]),
+            FOUR_WEEK_BUCKETS[-1] + 1, CONFIG["hll_precision"]
+        )
+        transactions = sketch_transactions(registers, np.arange(len(registers)))
+    else:
+        transactions = exact_distinct_transactions(invoice_codes(invoices), bucket[in_windows])
+
+    return aggregates_from_cells(cells, transactions=transactions, dimension_transactions=dimension_transactions)
+
+
+def aggregates_from_cells(cells: pd.DataFrame, transactions: dict, dimension_transactions: dict = None) -> dict:
+    """
+    Build the aggregates dict from bucket × weekday × Product line × City ×
+    Payment (× dimension columns) cells holding the plan's measures, plus
+    the distinct invoice count of each period.
+
+    The distinct invoices of each dimension value come from
+    dimension_transactions, or else from the cells' "invoices" counts (cube
+    cells, whose invoices don't span cells).
+    """
+    current_cells = cells[cells.index.get_level_values("bucket") == CURRENT_BUCKET]
+    current = current_cells["sales"]
+
+    by_dimension = {}
+    for column in cells.index.names[len(CELL_KEYS):]:
+        totals = current_cells.groupby(level=column, observed=True).sum()
+        if dimension_transactions is not None:
+            totals[TRANSACTIONS] = dimension_transactions[column].reindex(totals.index, fill_value=0).to_numpy()
+        else:
+            totals = totals.rename(columns={"invoices": TRANSACTIONS})
+        by_dimension[column] = totals
+
+    by_day = current.groupby(level="weekday").sum()
+    by_day.index = [DAY_ORDER[weekday] for weekday in by_day.index]
+
+    return {
+        "current": _period_totals(cells, [CURRENT_BUCKET], transactions["current"]),
+        "last_week": _period_totals(cells, [LAST_WEEK_BUCKET], transactions["last_week"]),
+        "four_weeks": _period_totals(cells, FOUR_WEEK_BUCKETS, transactions["four_weeks"]),
+        "by_product": current.groupby(level="Product line", observed=True).sum(),
+        "by_city": current.groupby(level="City", observed=True).sum(),
+        "by_payment": current.groupby(level="Payment", observed=True).sum(),
+        "by_day": by_day,
+        "by_dimension": by_dimension,
+    }
+
+
+def calculate_kpis(aggregates: dict) -> dict:
+    """Calculate main KPIs and percentage changes from the KPI engine aggregates"""
+    week = aggregates["current"]
+    last_week = aggregates["last_week"]
+    four_weeks = aggregates["four_weeks"]
+
     # Current week
-    total_sales = round(df_week["Sales"].sum(), 1)
-    transactions = df_week["Invoice ID"].nunique()
+    total_sales = round(week["sales"], 1)
+    transactions = week["transactions"]
     avg_ticket = round(total_sales / transactions, 1) if transactions else 0.0
-    avg_rating = round(df_week["Rating"].mean(), 1) if not df_week.empty else 0.0
-    total_quantity = int(df_week["Quantity"].sum())
-    gross_income = round(df_week["gross income"].sum(), 1)
+    avg_rating = round(week["rating_sum"] / week["rating_count"], 1) if week["rating_count"] else 0.0
+    total_quantity = int(week["quantity"])
+    gross_income = round(week["gross_income"], 1)
 
     # Top performers
 
-    sales_by_product = df_week.groupby("Product line")["Sales"].sum().round(1)
+    sales_by_product = aggregates["by_product"].round(1)
     top_product = sales_by_product.idxmax()
     top_product_sales = sales_by_product.max()
 
-    sales_by_branch = df_week.groupby("City")["Sales"].sum().round(1)
+    sales_by_branch = aggregates["by_city"].round(1)
     top_branch = sales_by_branch.idxmax()
     top_branch_sales = sales_by_branch.max()
 
-    payment_dist = df_week.groupby("Payment")["Sales"].sum()
+    payment_dist = aggregates["by_payment"]
     top_payment = payment_dist.idxmax()
     top_payment_share = round(payment_dist.max() / payment_dist.sum(), 3)
 
     # Comparisons
-    sales_last_week = round(df_last_week["Sales"].sum(), 1)
-    sales_4w_sum = df_4weeks["Sales"].sum()
+    sales_last_week = round(last_week["sales"], 1)
+    sales_4w_sum = four_weeks["sales"]
     sales_4w_avg = sales_4w_sum / 4 if sales_4w_sum else 0.0
 
-    trans_last_week = df_last_week["Invoice ID"].nunique()
-    trans_4w = df_4weeks["Invoice ID"].nunique()
+    trans_last_week = last_week["transactions"]
+    trans_4w = four_weeks["transactions"]
     trans_4w_avg = trans_4w / 4 if trans_4w else 0.0
 
-    avg_ticket_last = round(df_last_week["Sales"].sum() / trans_last_week, 1) if trans_last_week else 0.0
+    avg_ticket_last = round(last_week["sales"] / trans_last_week, 1) if trans_last_week else 0.0
     avg_ticket_4w = round(sales_4w_sum / trans_4w, 1) if trans_4w else 0.0
 
     return {
@@ -61,5 +327,7 @@ def calculate_kpis(df_week: pd.DataFrame, df_last_week: pd.DataFrame, df_4weeks:
         "top_branch": top_branch,
         "top_branch_sales": top_branch_sales,
         "top_payment": top_payment,
-        "top_payment_share": top_payment_share
-    }
\ No newline at end of file
+        "top_payment_share": top_payment_share,
+        # Declared KPIs (CONFIG["kpi_definitions"]) of the current week, in order
+        "kpis": evaluate_kpis(week, compile_plan()),
+    }
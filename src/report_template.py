@@ -0,0 +1,197 @@
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.cell import get_column_letter, range_boundaries
+from openpyxl.worksheet.table import TableColumn
+
+from config import CONFIG
+from src.excel_report import DATETIME_FORMAT, _excel_value
+
+INSIGHT_NAME = "insight_{number}"
+
+# Parsed templates by (path, modification time): a batch run parses each template once per process
+_TEMPLATES = {}
+
+
+def configured_template() -> Path:
+    """CONFIG["report_template"] if it is set and exists, else None (Weekly_Report.xlsx is then not rendered)"""
+    template_path = CONFIG["report_template"]
+    return Path(template_path) if template_path and Path(template_path).exists() else None
+
+
+def load_template(template_path: Path):
+    """The parsed template workbook, loaded on first use and kept for later renders"""
+    template_path = Path(template_path)
+    key = (str(template_path.resolve()), template_path.stat().st_mtime_ns)
+    if key not in _TEMPLATES:
+        _TEMPLATES.clear()  # a changed template replaces the old one
+        _TEMPLATES[key] = load_workbook(template_path)
+    return _TEMPLATES[key]
+
+
+class _Edits:
+    """
+    Changes made to the shared template for one render, undone once the
+    copy is saved so the next render starts from the pristine template.
+    """
+
+    def __init__(self):
+        self._cells = {}
+        self._tables = []
+
+    def set(self, ws, row: int, column: int, value) -> None:
+        cell = ws.cell(row=row, column=column)
+        self._cells.setdefault((ws.title, row, column), (cell, cell.value, cell.number_format))
+        value = _excel_value(value)
+        cell.value = value
+        if isinstance(value, datetime) and cell.number_format == "General":
+            cell.number_format = DATETIME_FORMAT  # datetime in an unformatted cell
+
+    def keep_table(self, table) -> None:
+        self._tables.append((table, table.ref, table.autoFilter.ref if table.autoFilter else None,
+                             list(table.tableColumns)))
+
+    def undo(self) -> None:
+        for cell, value, number_format in self._cells.values():
+            cell.value = value
+            cell.number_format = number_format
+        for table, ref, filter_ref, columns in reversed(self._tables):
+            table.ref = ref
+            if table.autoFilter:
+                table.autoFilter.ref = filter_ref
+            table.tableColumns = columns
+
+
+def _write_rows(edits: _Edits, ws, first_row: int, first_column: int, rows: list, clear_to_row: int = 0) -> None:
+    """Write rows from (first_row, first_column); cells of the old range below them are emptied"""
+    width = max((len(row) for row in rows), default=0)
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            edits.set(ws, first_row + i, first_column + j, value)
+    for row_number in range(first_row + len(rows), clear_to_row + 1):
+        for j in range(width):
+            edits.set(ws, row_number, first_column + j, None)
+
+
+def _room(ws, table, min_row: int, max_row: int, min_col: int, max_col: int) -> bool:
+    """Whether the cells are empty and outside the sheet's other tables"""
+    others = [range_boundaries(other.ref) for other in ws.tables.values() if other is not table]
+    for row in range(min_row, max_row + 1):
+        for column in range(min_col, max_col + 1):
+            cell = ws._cells.get((row, column))  # read without creating the cell
+            if cell is not None and cell.value is not None:
+                return False
+            if any(left <= column <= right and top <= row <= bottom for left, top, right, bottom in others):
+                return False
+    return True
+
+
+def _fill_table(edits: _Edits, ws, table, df_table: pd.DataFrame) -> None:
+    """
+    Headers and rows into an Excel table, resized to the DataFrame. The
+    table only grows over empty cells outside other tables: what doesn't
+    fit is left out with a warning.
+    """
+    min_col, min_row, max_col, max_row = range_boundaries(table.ref)
+    headers = [str(header) for header in df_table.columns]
+
+    last_col = max_col
+    while last_col < min_col + len(headers) - 1 and _room(ws, table, min_row, max_row, last_col + 1, last_col + 1):
+        last_col += 1
+    last_col = min(last_col, min_col + len(headers) - 1)
+    last_row = max_row
+    while last_row < min_row + len(df_table) and _room(ws, table, last_row + 1, last_row + 1, min_col, last_col):
+        last_row += 1
+    last_row = max(min(last_row, min_row + len(df_table)), min_row + 1)  # a table keeps at least one body row
+
+    width, height = last_col - min_col + 1, last_row - min_row
+    if len(df_table) > height or len(headers) > width:
+        print(f"Warning: {table.displayName} has {len(df_table)} row(s) × {len(headers)} column(s) but only "
+              f"{height} × {width} fit from {table.ref} without covering other cells or tables: the rest is "
+              f"left out (make room in the template)")
+    headers = headers[:width]
+    rows = [row[:width] for row in df_table.head(height).itertuples(index=False, name=None)]
+    _write_rows(edits, ws, min_row, min_col, [headers] + rows, clear_to_row=max_row)
+
+    edits.keep_table(table)
+    table.ref = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(last_col)}{last_row}"
+    if table.autoFilter:
+        table.autoFilter.ref = table.ref
+    table.tableColumns = [TableColumn(id=i, name=header) for i, header in enumerate(headers, start=1)]
+
+
+def _fill_defined_name(edits: _Edits, ws, cell_range: str, name: str, df_table: pd.DataFrame) -> None:
+    """Rows of the DataFrame into a defined name's range; what doesn't fit is left out with a warning"""
+    min_col, min_row, max_col, max_row = range_boundaries(cell_range)
+    height, width = max_row - min_row + 1, max_col - min_col + 1
+    if len(df_table) > height or len(df_table.columns) > width:
+        print(f"Warning: {name} has {len(df_table)} row(s) × {len(df_table.columns)} column(s) but its "
+              f"defined name covers {cell_range} ({height} × {width}): the rest is left out "
+              f"(widen the name in the template)")
+    rows = [row[:width] for row in df_table.head(height).itertuples(index=False, name=None)]
+    _write_rows(edits, ws, min_row, min_col, rows, clear_to_row=max_row)
+
+
+def _named_ranges(wb) -> dict:
+    """Workbook- and sheet-scoped defined names → (worksheet, cell range)"""
+    names = {}
+    scopes = [wb.defined_names] + [ws.defined_names for ws in wb.worksheets]
+    for defined_names in scopes:
+        for name, defined_name in defined_names.items():
+            for sheet_title, cell_range in defined_name.destinations:
+                if sheet_title in wb.sheetnames:
+                    names[name] = (wb[sheet_title], cell_range.replace("$", ""))
+    return names
+
+
+def render_report_template(template_path: Path, output_path: Path, tables_list: list) -> Path:
+    """
+    Save a finished copy of the report template with the computed tables
+    and insight texts written in, so the delivered Weekly_Report.xlsx holds
+    the report's values instead of links to Weekly_Data.xlsx that are only
+    refreshed when Excel recalculates.
+
+    Each (table_name, dataframe) fills:
+    - the template's Excel table of that name (headers and rows, the table
+      resized to fit), or else
+    - the defined name of that name: rows only, from its top-left cell
+      (the template provides the headers), clipped to the name's range.
+    Defined names insight_1, insight_2, ... receive the insight texts of
+    tbl_insights. Tables the template doesn't mention are left out.
+
+    The template is parsed once per process (see load_template) and
+    restored after each save, so batch runs don't re-read it per report.
+    """
+    wb = load_template(template_path)
+    tables = {table.displayName: (ws, table) for ws in wb.worksheets for table in ws.tables.values()}
+    names = _named_ranges(wb)
+
+    edits = _Edits()
+    try:
+        for table_name, df_table in tables_list:
+            if table_name in tables:
+                _fill_table(edits, *tables[table_name], df_table)
+            elif table_name in names:
+                _fill_defined_name(edits, *names[table_name], table_name, df_table)
+
+            if table_name == "tbl_insights":
+                for number, insight in enumerate(df_table.iloc[:, 0], start=1):
+                    name = INSIGHT_NAME.format(number=number)
+                    if name in names:
+                        ws, cell_range = names[name]
+                        min_col, min_row, _, _ = range_boundaries(cell_range)
+                        edits.set(ws, min_row, min_col, insight)
+
+        # Formulas of the template built on the injected values are recomputed when opened
+        wb.calculation.fullCalcOnLoad = True
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(f"{output_path.stem}.tmp{output_path.suffix}")
+        wb.save(tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        edits.undo()
+    print(f"Report rendered from template {Path(template_path).name}: {output_path}")
+    return output_path
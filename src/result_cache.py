@@ -0,0 +1,158 @@
+import hashlib
+import json
+import pickle
+import shutil
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+# Pipeline code outside src/: load_report_data / compute_report and the CONFIG defaults
+ROOT_SOURCES = [SRC_DIR.parent / "main.py", SRC_DIR.parent / "config.py"]
+VALUE_FILE = "value.pkl"
+META_FILE = "meta.json"
+
+# CONFIG entries that change the computed KPIs and tables
+RESULT_CACHE_CONFIG_KEYS = [
+    "expected_columns", "valid_branches", "valid_cities", "valid_customer_types", "valid_genders",
+    "valid_payments", "date_format_hints", "validation_mode", "stream_input", "use_partition_store",
+    "use_daily_cube", "distinct_count_mode", "hll_precision", "include_trend_tables", "trend_table_weeks",
+    "include_heatmap_tables", "kpi_measures", "kpi_definitions", "kpi_dimensions",
+]
+
+
+def sha256_file(filepath: Path) -> str:
+    """SHA-256 of a file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_fingerprint() -> str:
+    """Hash of the pipeline's source files (src/*.py, main.py, config.py): a code change invalidates every cached result"""
+    digest = hashlib.sha256()
+    for source in sorted(SRC_DIR.glob("*.py")) + ROOT_SOURCES:
+        digest.update(source.relative_to(SRC_DIR.parent).as_posix().encode())
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    # Sets are sorted: their iteration order changes between runs
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def cache_key(*parts) -> str:
+    """Content address of a stage result: SHA-256 of its JSON-serialised inputs"""
+    payload = json.dumps(parts, sort_keys=True, default=_json_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed store of stage results.
+
+    Each entry lives in <cache_dir>/<key>/ and holds a pickled value
+    (metrics, tables, ...) and/or artefact files (workbook, ZIP) together
+    with their SHA-256, so an output that is already identical on disk is
+    not rewritten. Entries older than max_age_days are evicted first, then
+    the least recently used ones until the cache fits in max_bytes.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, max_age_days: float):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def _meta(self, key: str) -> dict:
+        try:
+            return json.loads((self._entry(key) / META_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _touch(self, key: str) -> None:
+        # Entry mtime = last use, for the LRU eviction
+        (self._entry(key) / META_FILE).touch()
+
+    def get(self, key: str):
+        """Cached value of key, or None"""
+        value_file = self._entry(key) / VALUE_FILE
+        if self._meta(key) is None or not value_file.exists():
+            return None
+        try:
+            with open(value_file, "rb") as f:
+                value = pickle.load(f)
+        except Exception:
+            return None
+        self._touch(key)
+        return value
+
+    def put(self, key: str, value=None, artefacts: list = ()) -> None:
+        """Store value and/or copies of the artefact files under key (atomically)"""
+        entry = self._entry(key)
+        tmp_entry = entry.with_name(f"{key}.tmp")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+
+        meta = {"created": time.time(), "artefacts": {}}
+        if value is not None:
+            with open(tmp_entry / VALUE_FILE, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        for artefact in map(Path, artefacts):
+            shutil.copy2(artefact, tmp_entry / artefact.name)
+            meta["artefacts"][artefact.name] = sha256_file(artefact)
+        (tmp_entry / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp_entry.rename(entry)
+
+    def has_artefact(self, key: str, name: str) -> bool:
+        meta = self._meta(key)
+        return meta is not None and name in meta["artefacts"] and (self._entry(key) / name).exists()
+
+    def restore(self, key: str, target: Path) -> bool:
+        """
+        Put the cached artefact named like target at target. Returns False on
+        a cache miss; an identical file already at target is left untouched.
+        """
+        target = Path(target)
+        if not self.has_artefact(key, target.name):
+            return False
+        meta = self._meta(key)
+        cached = self._entry(key) / target.name
+
+        if not (target.exists() and sha256_file(target) == meta["artefacts"][target.name]):
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(cached, target)
+        self._touch(key)
+        return True
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above max_bytes; returns entries removed"""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            meta_file = entry / META_FILE
+            if entry.is_dir() and meta_file.exists():
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((meta_file.stat().st_mtime, size, entry))
+            elif entry.is_dir() and entry.name.endswith(".tmp"):
+                shutil.rmtree(entry, ignore_errors=True)  # interrupted put
+
+        removed = 0
+        cutoff = time.time() - self.max_age_days * 86400
+        entries.sort()  # oldest use first
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, entry in entries:
+            if last_used >= cutoff and total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
@@ -1,37 +1,43 @@
 import pandas as pd
 from datetime import datetime
 
+from config import CONFIG
+from src.metrics import DAY_ORDER
+from src.heatmap import create_heatmap_tables
+from src.kpi_plan import create_dimension_tables
+from src.trends import create_trend_tables
+
 
 def create_all_tables(
     metrics: dict,
     insights_list: list[str],
     periods: dict,
-    df_week: pd.DataFrame,
+    aggregates: dict,
     top_product: str,
     top_product_sales: float,
     top_branch: str,
     top_branch_sales: float,
     top_payment: str,
-    top_payment_share: float
+    top_payment_share: float,
+    trends: pd.DataFrame = None,
+    heatmap: dict = None
 ) -> list:
     """
     Creates ALL tables exactly as in the original script
-    and returns them as an ordered list to preserve the sequence in Excel
+    and returns them as an ordered list to preserve the sequence in Excel.
+
+    With `trends` (see trends.compute_trends) the long-horizon trend tables
+    are appended after the original ones, followed by the hour × weekday
+    tables of `heatmap` (see heatmap.hourly_heatmap) and the KPI
+    breakdowns of CONFIG["kpi_dimensions"] (tbl_kpis_by_customer_type, ...).
     """
     today_str = datetime.now().strftime("%m/%d/%y")
     week_start, week_end = periods["current"]
 
-    # 1. Main KPIs
+    # 1. Main KPIs (declared in CONFIG["kpi_definitions"])
     tbl_kpis = pd.DataFrame({
-        "Metric": ["Total Sales", "Transactions", "Average Ticket", "Average Rating", "Total Quantity", "Gross Income"],
-        "Value": [
-            metrics["total_sales"],
-            metrics["transactions"],
-            metrics["avg_ticket"],
-            metrics["avg_rating"],
-            metrics["total_quantity"],
-            metrics["gross_income"]
-        ]
+        "Metric": list(metrics["kpis"]),
+        "Value": list(metrics["kpis"].values())
     })
 
     # 2. Percentage changes
@@ -71,22 +77,19 @@ def create_all_tables(
     })
 
     # 6. Sales by day
-    df_day = df_week.copy() 
-    df_day["Day"] = df_day["Date"].dt.day_name()
-    sales_by_day = df_day.groupby("Day")["Sales"].sum().round(1).reset_index()
-    day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    sales_by_day["Day"] = pd.Categorical(sales_by_day["Day"], categories=day_order, ordered=True)
+    sales_by_day = aggregates["by_day"].round(1).rename_axis("Day").rename("Sales").reset_index()
+    sales_by_day["Day"] = pd.Categorical(sales_by_day["Day"], categories=DAY_ORDER, ordered=True)
     sales_by_day = sales_by_day.sort_values("Day").reset_index(drop=True)
 
     # 7. Payment method distribution
-    tbl_payment_distribution = df_week.groupby("Payment", as_index=False)["Sales"].sum().round(1)
+    tbl_payment_distribution = aggregates["by_payment"].round(1).rename("Sales").reset_index()
     tbl_payment_distribution["Percentage"] = (tbl_payment_distribution["Sales"] / tbl_payment_distribution["Sales"].sum()).round(3)
 
     # 8. Sales by product line
-    tbl_sales_by_product = df_week.groupby("Product line", as_index=False)["Sales"].sum().round(1)
+    tbl_sales_by_product = aggregates["by_product"].round(1).rename("Sales").reset_index()
 
     # Return an ordered list exactly matching the original script structure
-    return [
+    tables = [
         ("tbl_kpis", tbl_kpis),
         ("tbl_kpis_percentage_changes", tbl_kpis_percentage_changes),
         ("tbl_top_performers", tbl_top_performers),
@@ -95,4 +98,17 @@ def create_all_tables(
         ("tbl_payment_distribution", tbl_payment_distribution),
         ("tbl_insights", tbl_insights),
         ("tbl_report_info", tbl_report_info),
-    ]
\ No newline at end of file
+    ]
+
+    # 9. Rolling 13/52-week and year-over-year trends
+    if trends is not None and not trends.empty:
+        tables += create_trend_tables(trends, CONFIG["trend_table_weeks"])
+
+    # 10. Sales and transactions by branch × hour × weekday
+    if heatmap is not None:
+        tables += create_heatmap_tables(heatmap)
+
+    # 11. Current-week KPIs per customer type, gender, ...
+    tables += create_dimension_tables(aggregates)
+
+    return tables
\ No newline at end of file
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from src.metrics import invoice_codes
+
+# Rolling windows (in weeks) and the lag of the year-over-year comparison
+TREND_WINDOWS = (13, 52)
+YOY_LAG = 52
+
+
+def weekly_totals(frame: pd.DataFrame, week_start, from_cube: bool = False) -> pd.DataFrame:
+    """
+    Sales and transactions of every Monday-to-Sunday week up to the current
+    one (week_start = its Monday), weeks without sales included as zeros.
+
+    `frame` is the transactions, or the daily cube when from_cube=True (its
+    per-cell invoice counts are summed, like aggregates_from_cube does).
+    Returns a frame indexed by the Monday of each week.
+    """
+    days = (frame["Date"] - week_start).dt.days.to_numpy()
+    week = days // 7  # 0 = current week, -1 = last week, ...
+    keep = week <= 0
+    first_week = int(week[keep].min()) if keep.any() else 0
+    weeks = np.arange(first_week, 1)
+    positions = (week - first_week)[keep]
+
+    sales_column = "sales" if from_cube else "Sales"
+    # Kahan-compensated grouped sum: millions of rows per week lose no precision to the summation order
+    sales = (pd.Series(frame[sales_column].to_numpy()[keep]).groupby(positions).sum()
+             .reindex(np.arange(len(weeks)), fill_value=0.0).to_numpy())
+    if from_cube:
+        transactions = np.bincount(positions, weights=frame["invoices"].to_numpy()[keep], minlength=len(weeks))
+    else:
+        # Distinct (week, invoice code) pairs: integer codes, no string hashing per week
+        codes = invoice_codes(frame["Invoice ID"])[keep]
+        n_codes = int(codes.max()) + 1 if len(codes) else 1
+        valid = codes >= 0
+        pairs = pd.unique(positions[valid].astype(np.int64) * n_codes + codes[valid])
+        transactions = np.bincount(pairs // n_codes, minlength=len(weeks))
+
+    index = pd.DatetimeIndex(week_start + pd.to_timedelta(weeks * 7, unit="D"), name="Week")
+    return pd.DataFrame({"sales": sales, "transactions": transactions.astype(np.int64)}, index=index)
+
+
+def compute_trends(weekly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rolling 13/52-week sales, transactions and average ticket plus the
+    year-over-year change of each week, for every week at once.
+
+    Rolling windows and the 52-week shift are whole-column operations on
+    the weekly series (one row per week), so the cost is linear in the
+    number of weeks. Weeks without a full window (or without a week a year
+    earlier) are NaN.
+    """
+    trends = pd.DataFrame(index=weekly.index)
+    trends["Sales"] = weekly["sales"]
+    trends["Transactions"] = weekly["transactions"]
+    trends["Average Ticket"] = _ratio(weekly["sales"], weekly["transactions"])
+
+    for window in TREND_WINDOWS:
+        rolled = weekly[["sales", "transactions"]].rolling(window, min_periods=window).sum()
+        trends[f"Sales {window}W"] = rolled["sales"]
+        trends[f"Transactions {window}W"] = rolled["transactions"]
+        trends[f"Avg Ticket {window}W"] = _ratio(rolled["sales"], rolled["transactions"])
+
+    for column in ("Sales", "Transactions", "Average Ticket"):
+        previous = trends[column].shift(YOY_LAG)
+        trends[f"{column} YoY"] = (trends[column] - previous) / previous.where(previous != 0)
+    return trends
+
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    return numerator / denominator.where(denominator != 0)
+
+
+def create_trend_tables(trends: pd.DataFrame, weeks: int) -> list:
+    """
+    Trend tables for the report:
+    - tbl_weekly_trends: the last `weeks` weeks with their rolling and YoY values
+    - tbl_yoy_comparison: current week vs the same week a year earlier
+    """
+    tbl_weekly_trends = trends.tail(weeks).reset_index()
+    tbl_weekly_trends["Week"] = tbl_weekly_trends["Week"].dt.date
+    for column in tbl_weekly_trends.columns[1:]:
+        tbl_weekly_trends[column] = tbl_weekly_trends[column].round(3 if column.endswith("YoY") else 1)
+
+    current = trends.iloc[-1]
+    year_ago = trends.iloc[-1 - YOY_LAG] if len(trends) > YOY_LAG else None
+    tbl_yoy_comparison = pd.DataFrame({
+        "Metric": ["Sales", "Transactions", "Average Ticket"],
+        "This Week": [round(current[metric], 1) for metric in ("Sales", "Transactions", "Average Ticket")],
+        "Same Week Last Year": [
+            round(year_ago[metric], 1) if year_ago is not None else np.nan
+            for metric in ("Sales", "Transactions", "Average Ticket")
+        ],
+        "Change": [
+            round(current[f"{metric} YoY"], 3) for metric in ("Sales", "Transactions", "Average Ticket")
+        ],
+    })
+
+    return [
+        ("tbl_weekly_trends", tbl_weekly_trends),
+        ("tbl_yoy_comparison", tbl_yoy_comparison),
+    ]
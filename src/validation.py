@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from config import CONFIG
+
+# Severities: critical rows stop the run (or are quarantined), warning rows
+# are reported and kept, dropped rows are removed with a warning
+CRITICAL = "critical"
+WARNING = "warning"
+DROPPED = "dropped"
+
+# Consistency checks tolerance (relative), as in the original checks
+TOLERANCE = 1e-5
+
+# Rule name → (severity, message). Order is the reporting order.
+RULES = {
+    "invalid_dates": (DROPPED, "rows with invalid/missing dates"),
+    "missing_numbers": (CRITICAL, "Missing Unit price, Quantity, Tax 5% or Sales"),
+    "unit_price": (CRITICAL, "Unit price ≤ 0"),
+    "quantity": (CRITICAL, "Quantity ≤ 0"),
+    "quantity_integer": (CRITICAL, "Quantity is not integer"),
+    "tax_negative": (CRITICAL, "Tax 5% is negative"),
+    "sales_positive": (CRITICAL, "Sales ≤ 0"),
+    "rating": (CRITICAL, "Invalid Rating values"),
+    "tax": (WARNING, "Inconsistent Tax 5% calculation"),
+    "sales": (WARNING, "Inconsistent Sales total"),
+    "cogs": (WARNING, "Inconsistent COGS values"),
+    "gross_income": (WARNING, "gross income doesn't match Tax 5%"),
+}
+
+# Column → CONFIG key holding its set of valid values
+CATEGORICAL_RULES = {
+    "Branch": "valid_branches",
+    "City": "valid_cities",
+    "Customer type": "valid_customer_types",
+    "Gender": "valid_genders",
+    "Payment": "valid_payments",
+}
+for _column in CATEGORICAL_RULES:
+    RULES[f"invalid_{_column}"] = (WARNING, f"Invalid {_column} values")
+
+
+class ValidationError(Exception):
+    """Raised when the input can't be used: missing columns or critical rule failures"""
+
+    def __init__(self, message: str, result: "ValidationResult" = None):
+        super().__init__(message)
+        self.result = result
+
+
+class ValidationResult:
+    """
+    Outcome of validate_sales_frame: for every rule that matched at least one
+    row, its count and the positional indices of the rows. Rules that
+    matched nothing are left out.
+    """
+
+    def __init__(self, num_rows: int, rows: dict, invalid_values: dict):
+        self.num_rows = num_rows
+        self.rows = rows                       # rule → np.ndarray of row positions
+        self.invalid_values = invalid_values   # categorical column → invalid values found
+
+    @property
+    def counts(self) -> dict:
+        return {rule: len(positions) for rule, positions in self.rows.items()}
+
+    def failed(self, severity: str) -> list:
+        return [rule for rule in self.rows if RULES[rule][0] == severity]
+
+    @property
+    def has_critical(self) -> bool:
+        return bool(self.failed(CRITICAL))
+
+    def mask(self, *severities: str) -> np.ndarray:
+        """Boolean mask of the rows failing any rule of the given severities"""
+        mask = np.zeros(self.num_rows, dtype=bool)
+        for rule, positions in self.rows.items():
+            if RULES[rule][0] in severities:
+                mask[positions] = True
+        return mask
+
+    def row_errors(self, positions: np.ndarray) -> list:
+        """Names of the failed rules of each row in positions, joined with ';'"""
+        errors = {position: [] for position in positions.tolist()}
+        for rule, rule_positions in self.rows.items():
+            for position in np.intersect1d(rule_positions, positions).tolist():
+                errors[position].append(rule)
+        return [";".join(errors[position]) for position in positions.tolist()]
+
+    def warning_counts(self) -> dict:
+        """Non-critical counts (always including the core checks) for the run metrics"""
+        counts = {rule: 0 for rule in ("invalid_dates", "tax", "sales", "cogs", "gross_income")}
+        counts.update({
+            rule: count for rule, count in self.counts.items() if RULES[rule][0] != CRITICAL
+        })
+        return counts
+
+
+def check_required_columns(columns) -> None:
+    """Raise ValidationError if any of the expected columns is missing"""
+    missing_cols = [col for col in CONFIG["expected_columns"] if col not in columns]
+    if missing_cols:
+        raise ValidationError(
+            f"Missing required columns: {', '.join(missing_cols)} "
+            f"(expected: {', '.join(CONFIG['expected_columns'])})"
+        )
+
+
+def _not_close(a: np.ndarray, b: np.ndarray, atol: float = 0.0) -> np.ndarray:
+    """~np.isclose(a, b, rtol=TOLERANCE, atol) without its temporary arrays; NaN counts as not close"""
+    return ~(np.abs(a - b) <= atol + TOLERANCE * np.abs(b))
+
+
+def validate_sales_frame(df: pd.DataFrame) -> ValidationResult:
+    """
+    Evaluate every rule on df (Date already parsed) in one pass over plain
+    arrays: the numeric columns are read once and shared intermediate values
+    (Unit price × Quantity) are computed once for all the rules.
+    """
+    unit_price = df["Unit price"].to_numpy(dtype="float64", na_value=np.nan)
+    quantity = df["Quantity"].to_numpy(dtype="float64", na_value=np.nan)
+    tax = df["Tax 5%"].to_numpy(dtype="float64", na_value=np.nan)
+    sales = df["Sales"].to_numpy(dtype="float64", na_value=np.nan)
+    rating = df["Rating"].to_numpy(dtype="float64", na_value=np.nan)
+    cogs = df["cogs"].to_numpy(dtype="float64", na_value=np.nan)
+    gross_income = df["gross income"].to_numpy(dtype="float64", na_value=np.nan)
+
+    subtotal = unit_price * quantity
+
+    with np.errstate(invalid="ignore"):
+        masks = {
+            "invalid_dates": df["Date"].isna().to_numpy(),
+            # The comparisons below are False for NaN: missing values are rejected here
+            "missing_numbers": np.isnan(unit_price) | np.isnan(quantity) | np.isnan(tax) | np.isnan(sales),
+            "unit_price": unit_price <= 0,
+            "quantity": quantity <= 0,
+            "quantity_integer": ~np.isnan(quantity) & (quantity != np.floor(quantity)),
+            "tax_negative": tax < 0,
+            "sales_positive": sales <= 0,
+            "rating": np.isnan(rating) | (rating < 0) | (rating > 10),
+            # Tax should be ≈ Unit price × Quantity × 0.05
+            "tax": _not_close(tax, subtotal * 0.05, atol=0.01),
+            # Sales = Unit price × Quantity + Tax
+            "sales": _not_close(sales, subtotal + tax, atol=0.01),
+            # COGS should be Unit price × Quantity
+            "cogs": _not_close(cogs, subtotal),
+            # gross income typically = Tax in this dataset
+            "gross_income": _not_close(gross_income, tax),
+        }
+
+    for column, config_key in CATEGORICAL_RULES.items():
+        masks[f"invalid_{column}"] = ~df[column].isin(CONFIG[config_key]).to_numpy()
+
+    # Rows with an invalid date are dropped: other rules only apply to the rest
+    valid_date = ~masks["invalid_dates"]
+    rows = {}
+    for rule, mask in masks.items():
+        if rule != "invalid_dates":
+            mask = mask & valid_date
+        positions = np.flatnonzero(mask)
+        if len(positions):
+            rows[rule] = positions
+
+    invalid_values = {
+        column: df[column].iloc[rows[f"invalid_{column}"]].unique()
+        for column in CATEGORICAL_RULES if f"invalid_{column}" in rows
+    }
+    return ValidationResult(len(df), rows, invalid_values)
+
+
+def write_quarantine(df_bad: pd.DataFrame, errors: list, path: Path, append: bool = False) -> None:
+    """Write rejected rows with a 'validation_errors' column listing their failed rules"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df_bad = df_bad.assign(validation_errors=errors)
+    write_header = not (append and path.exists())
+    df_bad.to_csv(path, mode="a" if append else "w", index=False, header=write_header)
+
+
+def quarantine_path(filepath: Path) -> Path:
+    """Side file for the rejected rows of filepath: sales.csv → <quarantine_dir>/sales.quarantine.csv"""
+    return Path(CONFIG["quarantine_dir"]) / f"{Path(filepath).stem}.quarantine.csv"
@@ -0,0 +1,271 @@
+"""
+Watch-folder service: rebuild and send the report when a CSV lands in
+CONFIG["watch_dir"] (the data folder).
+
+    python -m src.cli watch [--batch] [--once]
+
+New or changed top-level *.csv files are picked up through watchdog
+(inotify & co.) when it is installed, by polling otherwise. A burst of
+writes is debounced: the run starts once the folder has stayed unchanged
+for CONFIG["watch_debounce_seconds"]. The CSVs already in the folder
+(e.g. dropped while the service was down) are run once at startup, and
+the files of a failed run are retried after CONFIG["watch_retry_seconds"]
+or as soon as they change.
+
+With the partition store (CONFIG["use_partition_store"]) every dropped
+file but CONFIG["input_csv"] is ingested incrementally; otherwise a change
+of CONFIG["input_csv"] re-runs the report. The loaded data stays in memory
+between runs (the store's daily cube or transactions are extended with the
+new part files only) and the result cache skips the stages whose inputs
+didn't change. The state of the service and the timings of its last run
+are kept in CONFIG["watch_status_file"].
+"""
+import json
+import os
+import threading
+import time
+from argparse import Namespace
+from datetime import datetime
+from pathlib import Path
+
+from config import CONFIG, ensure_directories, get_paths
+from src.instrumentation import RunRecorder
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional: polling is used instead
+    Observer = None
+
+
+def snapshot(folder: Path) -> dict:
+    """{CSV path: (modification time, size)} of the top-level CSV files of folder"""
+    files = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(".csv"):
+                stat = entry.stat()
+                files[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def changed_files(before: dict, after: dict) -> list:
+    """Files added or modified between two snapshots"""
+    return sorted(path for path, signature in after.items() if before.get(path) != signature)
+
+
+class FolderWatcher:
+    """
+    Wakes up on changes in a folder: at once through watchdog events when
+    available, else every poll_seconds. What changed is always taken from
+    snapshots, so missed or duplicated events do no harm.
+    """
+
+    def __init__(self, folder: Path, poll_seconds: float):
+        self.folder = Path(folder)
+        self.poll_seconds = poll_seconds
+        self._event = threading.Event()
+        self._observer = None
+        if Observer is not None:
+            handler = FileSystemEventHandler()
+            handler.on_any_event = lambda event: self._event.set()
+            self._observer = Observer()
+            self._observer.schedule(handler, str(self.folder), recursive=False)
+            self._observer.start()
+
+    @property
+    def mode(self) -> str:
+        return "watchdog" if self._observer else "polling"
+
+    def wait(self, timeout: float) -> None:
+        """Block until an event arrives (watchdog) or for timeout seconds"""
+        if self._observer:
+            self._event.wait(timeout)
+            self._event.clear()
+        else:
+            time.sleep(timeout)
+
+    def settle(self, current: dict, debounce_seconds: float) -> dict:
+        """Wait until the folder stays unchanged for debounce_seconds; returns its snapshot then"""
+        while True:
+            time.sleep(debounce_seconds)
+            latest = watched_files(self.folder)
+            if latest == current:
+                return latest
+            current = latest
+
+    def close(self) -> None:
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+
+
+class WatchSession:
+    """Data and input fingerprint of the last run, kept warm for the next one"""
+
+    def __init__(self, args: Namespace):
+        self.args = args
+        self.data = None
+        self.fingerprint = None
+        self.runs = 0
+        self.last_run = None
+
+    def refresh_store_data(self, new_parts: list) -> None:
+        """
+        After an ingest: add the new part files to the warm data instead of
+        reloading the store, merged into the daily cube (and invoice
+        sketches) or appended to the loaded transactions. Data not loaded
+        yet, or queried by the DuckDB engine (closed after each run), is
+        read again by the next run.
+        """
+        if self.data is None or (self.data["df"] is None and self.data["cube"] is None):
+            self.data = None
+            return
+        if not new_parts:
+            return  # no new rows: the warm data is still the store's
+
+        import pandas as pd
+        from src.cube import extend_daily_cube
+        from src.data import CACHE_DTYPES, to_compact_frame
+        from src.date_utils import get_reporting_periods
+
+        new_rows = pd.concat([pd.read_parquet(part, engine="pyarrow") for part in new_parts], ignore_index=True)
+        latest_date = max(self.data["latest_date"], new_rows["Date"].max())
+        if self.data["cube"] is not None:
+            cube, sketches = extend_daily_cube(self.data["cube"], new_rows, self.data["sketches"])
+            print(f"Warm daily cube extended with {len(new_rows):,} new row(s) from {len(new_parts)} part file(s)")
+            self.data = {**self.data, "cube": cube, "frame": cube, "sketches": sketches, "latest_date": latest_date}
+            return
+
+        first_day = get_reporting_periods(latest_date)["four_weeks"][0]
+
+        df = pd.concat([self.data["df"], new_rows], ignore_index=True).astype(CACHE_DTYPES)
+        df = df[df["Date"] >= first_day].sort_values("Date", kind="stable", ignore_index=True)
+        print(f"Warm data extended with {len(new_rows):,} new row(s) from {len(new_parts)} part file(s)")
+        df = to_compact_frame(df)
+        self.data = {**self.data, "df": df, "frame": df, "latest_date": df["Date"].max()}
+
+
+def watched_files(folder: Path) -> dict:
+    """
+    Snapshot of the watch folder. With the partition store, the report's
+    source CSV (CONFIG["input_csv"], the full export) is left out: only
+    files dropped next to it are ingested.
+    """
+    files = snapshot(folder)
+    if CONFIG["use_partition_store"]:
+        source = Path(CONFIG["input_csv"]).resolve()
+        files = {path: signature for path, signature in files.items() if path.resolve() != source}
+    return files
+
+
+def _store_parts(store_dir: Path) -> set:
+    from src.ingest import PARTITION_PREFIX
+
+    return set(Path(store_dir).glob(f"{PARTITION_PREFIX}*/*.parquet"))
+
+
+def write_status(status: dict) -> None:
+    status_file = Path(CONFIG["watch_status_file"])
+    status_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = status_file.with_name(f"{status_file.name}.tmp")
+    tmp_file.write_text(json.dumps({**status, "updated_at": datetime.now().isoformat(timespec="seconds")},
+                                   indent=2, default=str), encoding="utf-8")
+    tmp_file.replace(status_file)
+
+
+def run_for_changes(session: WatchSession, changed: list, detected_at: float) -> None:
+    """One debounced run: ingest the dropped files, then rebuild and send the report if its input changed"""
+    from main import _input_fingerprint, main as run_pipeline
+    from src.cli import run_recorded
+
+    store_mode = CONFIG["use_partition_store"]
+    paths = get_paths(datetime.now().date())
+    recorder = RunRecorder(run_name="watch")
+
+    def pipeline(args, recorder):
+        if store_mode:
+            from src.ingest import ingest_daily_file
+
+            store_dir = CONFIG["partition_store"]
+            parts_before = _store_parts(store_dir)
+            with recorder.stage("ingest") as stage:
+                stage["rows_out"] = sum(ingest_daily_file(csv_path, store_dir) for csv_path in changed)
+            new_parts = sorted(_store_parts(store_dir) - parts_before)
+        elif Path(paths["input_csv"]).resolve() not in {path.resolve() for path in changed}:
+            print(f"Ignored {', '.join(path.name for path in changed)}: not the report input "
+                  f"({Path(paths['input_csv']).name}) and the partition store is off")
+            return
+
+        fingerprint = _input_fingerprint(args, paths)
+        if fingerprint == session.fingerprint:
+            print("No new data: report not regenerated")
+            return
+        if store_mode:
+            session.refresh_store_data(new_parts)
+        else:
+            session.data = None  # the input file itself changed
+        session.data = run_pipeline(args, recorder, data=session.data)
+        session.fingerprint = fingerprint
+
+    exit_code = run_recorded(pipeline, session.args, recorder=recorder)
+    session.runs += 1
+    session.last_run = {
+        "files": [str(path) for path in changed],
+        "status": "success" if exit_code == 0 else "failed",
+        "started_at": recorder.record["started_at"],
+        "finished_at": recorder.record["finished_at"],
+        "duration_seconds": recorder.record["duration_seconds"],
+        "latency_seconds": round(time.time() - detected_at, 3),  # first change seen → report sent
+        "stages": {stage["name"]: stage["seconds"] for stage in recorder.record["stages"]},
+        "error": recorder.record["error"] and recorder.record["error"]["message"],
+    }
+
+
+def watch(args) -> None:
+    """Serve until interrupted (or after the first run with args.once)"""
+    ensure_directories()
+    folder = Path(CONFIG["watch_dir"])
+    session = WatchSession(Namespace(ingest=None, backfill=None, batch=args.batch))
+    watcher = FolderWatcher(folder, CONFIG["watch_poll_seconds"])
+    status = {"state": "watching", "pid": os.getpid(), "folder": str(folder), "mode": watcher.mode,
+              "started_at": datetime.now().isoformat(timespec="seconds"), "runs": 0, "last_run": None}
+    write_status(status)
+    print(f"Watching {folder} for CSV files ({watcher.mode}); Ctrl+C to stop")
+
+    # Nothing known yet: the CSVs already there are run at startup (ingest skips those already in the store)
+    known = {}
+    retry, retry_at = [], 0.0
+    try:
+        while True:
+            if retry and time.time() >= retry_at:
+                for path in retry:
+                    known.pop(path, None)  # seen as changed again
+                retry = []
+            current = watched_files(folder)
+            if not changed_files(known, current):
+                known = current  # deletions only
+                watcher.wait(CONFIG["watch_poll_seconds"])
+                continue
+
+            detected_at = time.time()
+            current = watcher.settle(current, CONFIG["watch_debounce_seconds"])
+            changed = changed_files(known, current)
+            known = current
+            print(f"\nChange detected: {', '.join(path.name for path in changed)}")
+
+            write_status({**status, "state": "running", "files": [str(path) for path in changed]})
+            run_for_changes(session, changed, detected_at)
+            if session.last_run["status"] == "failed":
+                retry, retry_at = changed, time.time() + CONFIG["watch_retry_seconds"]
+                print(f"Run failed: {', '.join(path.name for path in changed)} will be retried in "
+                      f"{CONFIG['watch_retry_seconds']:g} s (or when changed)")
+            status.update(runs=session.runs, last_run=session.last_run)
+            write_status(status)
+            if args.once:
+                break
+    except KeyboardInterrupt:
+        print("\nWatch stopped")
+    finally:
+        watcher.close()
+        write_status({**status, "state": "stopped"})
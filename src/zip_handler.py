@@ -1,5 +1,277 @@
 from pathlib import Path
+import hashlib
+import io
+import json
+import os
+import struct
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from config import CONFIG
+
+BLOCK_SIZE = 1 << 20
+# Compressed members are buffered in memory up to this size, then in a temporary file
+SPOOL_MAX_BYTES = 16 << 20
+MANIFEST_NAME = "manifest.json"
+# Above these limits the archive needs ZIP64 records: written with zipfile instead
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_MEMBERS = 0xFFFF
+# Version made by: Unix (high byte 3), so extractors apply the mode in the external attributes
+_VERSION_MADE_BY = 3 << 8 | 20
+
+# Flags of every member: UTF-8 name. No data descriptor (bit 3): the CRC and
+# sizes are written back into the local header, which Java's ZipInputStream
+# requires of STORED members
+_FLAGS = 0x800
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+# CRC-32, compressed and uncompressed sizes: 14 bytes into the local header
+_LOCAL_SIZES = struct.Struct("<III")
+_LOCAL_SIZES_OFFSET = 14
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+
+
+class _NeedsZip64(Exception):
+    """A size or offset of the archive doesn't fit the ZIP32 fields"""
+
+
+def _check_zip32(*values) -> None:
+    if any(value >= ZIP32_LIMIT for value in values):
+        raise _NeedsZip64
+
+
+def _dos_datetime(timestamp: float) -> tuple:
+    t = time.localtime(timestamp)
+    return (
+        t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2,
+        max(t.tm_year - 1980, 0) << 9 | t.tm_mon << 5 | t.tm_mday,
+    )
+
+
+def _stored(file_path: Path, store_suffixes) -> bool:
+    return file_path.suffix.lower() in store_suffixes
+
+
+def _deflate_blocks(f, level: int, checksums: dict):
+    """
+    Raw-DEFLATE the file f block by block, yielding compressed data; the
+    CRC-32, size and SHA-256 of the input are put in checksums at the end.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    digest = hashlib.sha256()
+    crc = size = 0
+    for block in _read_blocks(f):
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+        digest.update(block)
+        yield compressor.compress(block)
+    yield compressor.flush()
+    checksums.update(crc=crc, size=size, sha256=digest.hexdigest())
+
+
+def _deflate_member(file_path: Path, level: int) -> tuple:
+    """
+    Compress one file into a spooled buffer in a worker thread: zlib and
+    hashlib release the GIL, so members are compressed in parallel.
+    """
+    checksums = {}
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    with open(file_path, "rb") as f:
+        for block in _deflate_blocks(f, level, checksums):
+            spool.write(block)
+    return spool, checksums
+
+
+def _write_member(archive, name: str, method: int, mtime: float, blocks, checksums: dict = None) -> dict:
+    """
+    Append one member: local header, then the data blocks as they come;
+    the CRC and sizes, known at the end, are then written back into the
+    local header (the archive is seekable, so nothing is buffered to know
+    them up front). `checksums` holds crc/size/sha256 of compressed data
+    (filled in by the time the blocks are exhausted); without it they are
+    computed from the stored blocks.
+    """
+    dos_time, dos_date = _dos_datetime(mtime)
+    encoded_name = name.encode("utf-8")
+    offset = archive.tell()
+    archive.write(_LOCAL_HEADER.pack(
+        0x04034B50, 20, _FLAGS, method, dos_time, dos_date, 0, 0, 0, len(encoded_name), 0
+    ))
+    archive.write(encoded_name)
+
+    crc = size = compressed_size = 0
+    digest = hashlib.sha256()
+    for block in blocks:
+        archive.write(block)
+        compressed_size += len(block)
+        if checksums is None:
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            digest.update(block)
+    if checksums is not None:
+        crc, size, sha256 = checksums["crc"], checksums["size"], checksums["sha256"]
+    else:
+        sha256 = digest.hexdigest()
+    end = archive.tell()
+    _check_zip32(offset, compressed_size, size)
+    archive.seek(offset + _LOCAL_SIZES_OFFSET)
+    archive.write(_LOCAL_SIZES.pack(crc, compressed_size, size))
+    archive.seek(end)
+
+    return {
+        "name": encoded_name, "method": method, "time": dos_time, "date": dos_date, "crc": crc,
+        "compressed_size": compressed_size, "size": size, "offset": offset, "sha256": sha256,
+    }
+
+
+def _write_central_directory(archive, members: list) -> None:
+    start = archive.tell()
+    for member in members:
+        archive.write(_CENTRAL_HEADER.pack(
+            0x02014B50, _VERSION_MADE_BY, 20, _FLAGS, member["method"], member["time"], member["date"], member["crc"],
+            member["compressed_size"], member["size"], len(member["name"]), 0, 0, 0, 0, 0o644 << 16,
+            member["offset"],
+        ))
+        archive.write(member["name"])
+    end = archive.tell()
+    _check_zip32(start, end - start)
+    archive.write(_END_RECORD.pack(0x06054B50, 0, 0, len(members), len(members), end - start, start, 0))
+
+
+def _read_blocks(f):
+    return iter(lambda: f.read(BLOCK_SIZE), b"")
+
+
+def _manifest(members: list) -> bytes:
+    return json.dumps({
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": [
+            {"name": member["name"].decode("utf-8"), "size": member["size"], "sha256": member["sha256"]}
+            for member in members
+        ],
+    }, indent=2).encode("utf-8")
+
+
+def _write_zip_sequential(zip_path: Path, files: list, level: int, store_suffixes, manifest: bool) -> Path:
+    """ZIP64-capable fallback for very large inputs: zipfile, one member after another"""
+    entries = []
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level or None,
+                         allowZip64=True) as zipf:
+        for file_path in files:
+            stored = level == 0 or _stored(file_path, store_suffixes)
+            zipf.write(file_path, file_path.name,
+                       compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as source:
+                for block in _read_blocks(source):
+                    digest.update(block)
+            entries.append({"name": file_path.name.encode("utf-8"), "size": file_path.stat().st_size,
+                            "sha256": digest.hexdigest()})
+        if manifest:
+            zipf.writestr(MANIFEST_NAME, _manifest(entries))
+    return zip_path
+
+
+def write_zip(
+    zip_path: Path,
+    files: list,
+    level: int = None,
+    store_suffixes=None,
+    workers: int = None,
+    manifest: bool = None
+) -> Path:
+    """
+    Write files into a ZIP archive (flat, by file name), compressing the
+    members in parallel threads.
+
+    Members whose suffix is in store_suffixes (.xlsx: already a ZIP) or all
+    of them with level=0 are stored, streamed from disk straight into the
+    archive. The others are DEFLATEd at `level` by a thread pool and copied
+    in when ready, in the order given. With manifest=True a manifest.json
+    member lists every file with its size and SHA-256. The archive is
+    written next to zip_path and renamed into place when complete.
+
+    Inputs of 4 GiB or more, or an archive whose sizes or offsets outgrow
+    the ZIP32 fields (data that doesn't compress), are written with
+    zipfile and its ZIP64 records instead.
+
+    Defaults come from CONFIG: zip_compression_level, zip_store_suffixes,
+    zip_workers (None → one per CPU) and zip_manifest.
+    """
+    level = CONFIG["zip_compression_level"] if level is None else level
+    store_suffixes = {s.lower() for s in (CONFIG["zip_store_suffixes"] if store_suffixes is None else store_suffixes)}
+    manifest = CONFIG["zip_manifest"] if manifest is None else manifest
+    files = [Path(file_path) for file_path in files]
+    tmp_path = zip_path.with_name(f"{zip_path.name}.tmp")
+
+    if sum(f.stat().st_size for f in files) >= ZIP32_LIMIT or len(files) >= ZIP32_MAX_MEMBERS:
+        _write_zip_sequential(tmp_path, files, level, store_suffixes, manifest)
+        tmp_path.replace(zip_path)
+        return zip_path
+
+    to_deflate = [f for f in files if level and not _stored(f, store_suffixes)]
+    workers = workers or CONFIG["zip_workers"] or os.cpu_count()
+    # The first member to compress is streamed into the archive by this
+    # thread; the pool compresses the others meanwhile (into spooled buffers)
+    pooled = to_deflate[1:] if workers > 1 else []
+
+    members = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers - 1, len(pooled)))) as pool, \
+                open(tmp_path, "wb") as archive:
+            deflated = {f: pool.submit(_deflate_member, f, level) for f in pooled}
+            for file_path in files:
+                mtime = file_path.stat().st_mtime
+                if file_path in deflated:
+                    spool, checksums = deflated[file_path].result()
+                    with spool:
+                        spool.seek(0)
+                        members.append(_write_member(
+                            archive, file_path.name, zipfile.ZIP_DEFLATED, mtime, _read_blocks(spool), checksums
+                        ))
+                elif file_path in to_deflate:
+                    checksums = {}
+                    with open(file_path, "rb") as source:
+                        members.append(_write_member(
+                            archive, file_path.name, zipfile.ZIP_DEFLATED, mtime,
+                            _deflate_blocks(source, level, checksums), checksums
+                        ))
+                else:
+                    with open(file_path, "rb") as source:
+                        members.append(_write_member(
+                            archive, file_path.name, zipfile.ZIP_STORED, mtime, _read_blocks(source)
+                        ))
+
+            if manifest:
+                checksums = {}
+                members.append(_write_member(
+                    archive, MANIFEST_NAME, zipfile.ZIP_DEFLATED, time.time(),
+                    _deflate_blocks(io.BytesIO(_manifest(members)), level or 6, checksums), checksums
+                ))
+            _write_central_directory(archive, members)
+    except _NeedsZip64:
+        tmp_path.unlink(missing_ok=True)
+        _write_zip_sequential(tmp_path, files, level, store_suffixes, manifest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(zip_path)
+    return zip_path
+
+
+def remove_old_zips(output_dir: Path, keep: Path = None) -> None:
+    """Remove previous Weekly_Sales_Report_*.zip files of output_dir (but `keep`) to prevent accumulation"""
+    for old_zip in output_dir.glob("Weekly_Sales_Report_*.zip"):
+        if keep is not None and old_zip == Path(keep):
+            continue
+        try:
+            old_zip.unlink()
+            print(f"Deleted previous ZIP: {old_zip.name}")
+        except Exception:
+            pass  # silently skip if deletion fails
 
 
 def create_report_zip(
@@ -7,49 +279,46 @@ def create_report_zip(
     excel_data_path: Path,
     excel_report_path: Path,
     zip_path: Path,
-    compression: int = zipfile.ZIP_DEFLATED
+    compression: int = zipfile.ZIP_DEFLATED,
+    compresslevel: int = None
 ) -> Path:
     """
     Creates a ZIP archive containing the two main Excel reports:
     - Weekly_Data.xlsx (processed data and KPIs)
     - Weekly_Report.xlsx (the second report, if it exists)
+    plus a manifest.json with their SHA-256 (CONFIG["zip_manifest"]).
 
     Args:
         output_dir: Output directory (used for optional cleanup of old zip files)
         excel_data_path: Full path to Weekly_Data.xlsx
         excel_report_path: Full path to Weekly_Report.xlsx
         zip_path: Path where the .zip file will be created
-        compression: Compression method (default: ZIP_DEFLATED)
+        compression: ZIP_DEFLATED (default) or ZIP_STORED for no compression at all
+        compresslevel: DEFLATE level 0-9 (default: CONFIG["zip_compression_level"])
 
     Returns:
         Path: Path to the created ZIP file
     """
 
-
     # Optional: remove previous Weekly_Sales_Report_*.zip files to prevent accumulation
-    for old_zip in output_dir.glob("Weekly_Sales_Report_*.zip"):
-        try:
-            old_zip.unlink()
-            print(f"Deleted previous ZIP: {old_zip.name}")
-        except Exception:
-            pass  # silently skip if deletion fails
+    remove_old_zips(output_dir)
 
     files_to_zip = [
         excel_data_path,      # Weekly_Data.xlsx - should always exist (just created)
         excel_report_path     # Weekly_Report.xlsx - may or may not exist
     ]
 
-    added_count = 0
-
-    with zipfile.ZipFile(zip_path, 'w', compression=compression) as zipf:
-        for file_path in files_to_zip:
-            if file_path.exists():
-                arcname = file_path.name
-                zipf.write(file_path, arcname)
-                print(f"Added to ZIP: {arcname}")
-                added_count += 1
-            else:
-                print(f"Warning: File not found, skipped → {file_path.name}")
+    existing_files = []
+    for file_path in files_to_zip:
+        if file_path.exists():
+            existing_files.append(file_path)
+            print(f"Added to ZIP: {file_path.name}")
+        else:
+            print(f"Warning: File not found, skipped → {file_path.name}")
+
+    level = 0 if compression == zipfile.ZIP_STORED else compresslevel
+    write_zip(zip_path, existing_files, level=level)
+    added_count = len(existing_files)
 
     if added_count == 0:
         print("WARNING: ZIP file created but contains NO files!")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the pipeline modules the way main.py does (config, src.*)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,24 @@
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from src.cli import validate
+from src.instrumentation import RunRecorder
+
+SALES_CSV = Path(__file__).resolve().parents[1] / "data" / "sales.csv"
+
+
+def test_unreadable_files_are_rejected_and_the_others_still_checked(tmp_path, capsys):
+    missing = tmp_path / "missing.csv"
+    malformed = tmp_path / "malformed.csv"
+    malformed.write_text('Invoice ID,Date\n"1,2\n')
+
+    with pytest.raises(SystemExit) as exit_info:
+        validate(Namespace(csv=[missing, malformed, SALES_CSV]), RunRecorder(run_name="test"))
+
+    assert exit_info.value.code == 1
+    out = capsys.readouterr().out
+    assert f"REJECTED {missing}" in out
+    assert f"REJECTED {malformed}" in out
+    assert f"OK {SALES_CSV}" in out
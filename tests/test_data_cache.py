@@ -0,0 +1,40 @@
+import shutil
+from pathlib import Path
+
+from config import CONFIG
+from src.data import load_sales_data_cached
+
+SALES_CSV = Path(__file__).resolve().parents[1] / "data" / "sales.csv"
+
+
+def test_cache_is_not_used_after_a_validation_setting_changes(tmp_path, monkeypatch, capsys):
+    csv_path = shutil.copy(SALES_CSV, tmp_path / "sales.csv")
+    load_sales_data_cached(csv_path)
+    load_sales_data_cached(csv_path)
+    assert "loaded from cache" in capsys.readouterr().out
+
+    monkeypatch.setitem(CONFIG, "date_format_hints", ["%d/%m/%Y", *CONFIG["date_format_hints"]])
+    load_sales_data_cached(csv_path)
+    out = capsys.readouterr().out
+    assert "loaded from cache" not in out
+    assert "Typed cache written" in out
+
+
+def _by_invoice(df):
+    return df.iloc[df["Invoice ID"].astype(str).argsort()].reset_index(drop=True)
+
+
+def test_cached_and_stored_rows_keep_the_csv_values(tmp_path):
+    from src.data import load_and_validate_sales_data
+    from src.ingest import ingest_daily_file, load_partitions
+
+    csv_path = shutil.copy(SALES_CSV, tmp_path / "sales.csv")
+    expected = _by_invoice(load_and_validate_sales_data(csv_path))
+    load_sales_data_cached(csv_path)
+    ingest_daily_file(csv_path, tmp_path / "store")
+    for df in (load_sales_data_cached(csv_path),
+               load_partitions(tmp_path / "store", expected["Date"].min(), expected["Date"].max())):
+        df = _by_invoice(df)
+        for column in ("gross margin percentage", "Sales", "Tax 5%", "gross income", "Rating"):
+            assert df[column].dtype == "float64"
+            assert (df[column].to_numpy() == expected[column].to_numpy()).all(), column
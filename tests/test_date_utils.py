@@ -0,0 +1,23 @@
+import pandas as pd
+
+from src.date_utils import parse_dates
+
+HINTS = ["%m/%d/%Y", "%d/%m/%Y", "%Y-%m-%d"]
+
+
+def test_dates_read_by_a_fallback_hint_are_counted_and_leave_the_format_undecided():
+    values = pd.Series(["01/15/2019", "02/20/2019", "02/20/2019", "13/01/2019", "04/05/2019"])
+    parsed, info = parse_dates(values, HINTS)
+
+    assert info["format"] == "%m/%d/%Y"
+    assert info["fallback_rows"] == 1
+    assert parsed[3] == pd.Timestamp("2019-01-13")
+    # The file mixes formats: 04/05/2019 can't be trusted and is reported
+    assert not info["decided"]
+    assert info["ambiguous_rows"] == 1
+
+
+def test_single_format_file_is_decided():
+    values = pd.Series(["01/15/2019", "02/20/2019", "04/05/2019"])
+    _, info = parse_dates(values, HINTS)
+    assert info["decided"] and info["fallback_rows"] == 0
@@ -0,0 +1,26 @@
+import contextlib
+import io
+
+import pytest
+
+from benchmarks.engine_parity import CONFIGURATIONS, compare_tables, compute_tables
+from benchmarks.synthetic_data import generate_sales_csv
+from src.ingest import ingest_daily_file
+
+
+def test_duckdb_engine_reproduces_the_pandas_tables(tmp_path):
+    pytest.importorskip("duckdb")
+    store_dir = tmp_path / "store"
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest_daily_file(generate_sales_csv(tmp_path / "sales.csv", 20_000), store_dir)
+
+    results = {}
+    for name, overrides in CONFIGURATIONS.items():
+        if overrides["compute_engine"] == "duckdb":
+            overrides = {**overrides, "duckdb_temp_dir": tmp_path / "duckdb"}
+        results[name], _ = compute_tables(store_dir, overrides)
+
+    assert len(results["duckdb"]) == len(results["pandas (daily cube)"])
+    for name in CONFIGURATIONS:
+        if name != "duckdb":
+            assert compare_tables(results[name], results["duckdb"]) == [], name
@@ -0,0 +1,12 @@
+import numpy as np
+import pandas as pd
+
+from src.heatmap import transaction_timestamps
+
+
+def test_times_are_parsed_in_12_and_24_hour_formats():
+    dates = pd.Series(pd.to_datetime(["2019-01-05"] * 5))
+    times = pd.Series(["1:08:00 PM", "12:00:00 AM", "13:08:00", "noon", None])
+    assert transaction_timestamps(dates, times).tolist() == np.array(
+        ["2019-01-05T13:08:00", "2019-01-05T00:00:00", "2019-01-05T13:08:00", "NaT", "NaT"], dtype="datetime64[s]"
+    ).tolist()
@@ -0,0 +1,15 @@
+from src.instrumentation import RunRecorder
+
+
+def test_repeated_stages_are_written_as_one_series(tmp_path):
+    recorder = RunRecorder(run_name="weekly_report")
+    for rows in (100, 250):
+        with recorder.stage("validate") as stage:
+            stage["rows_out"] = rows
+    recorder.write_prometheus(tmp_path / "weekly_report.prom")
+
+    samples = [line for line in (tmp_path / "weekly_report.prom").read_text().splitlines()
+               if not line.startswith("#")]
+    series = [line.rsplit(" ", 1)[0] for line in samples]
+    assert len(series) == len(set(series))
+    assert 'weekly_report_stage_rows_out{stage="validate"} 350' in samples
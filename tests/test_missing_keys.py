@@ -0,0 +1,99 @@
+"""
+Rows with a missing grouping key (Product line, City, Payment, KPI
+dimension columns) only trigger validation warnings: they must still be
+counted in the period totals of every aggregation path.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cube import aggregates_from_cube, build_daily_cube
+from src.data import load_and_validate_sales_data
+from src.date_utils import get_reporting_periods
+from src.metrics import compute_period_aggregates
+
+SALES_CSV = Path(__file__).resolve().parent.parent / "data" / "sales.csv"
+
+
+@pytest.fixture(scope="module")
+def sales():
+    df = load_and_validate_sales_data(SALES_CSV)
+    periods = get_reporting_periods(df["Date"].max())
+    week = np.flatnonzero((df["Date"] >= periods["current"][0]).to_numpy())
+    return df, periods, week
+
+
+def _blank(df, week, columns):
+    """Copy of df with `column` emptied on a few current-week rows, one column after another"""
+    df = df.copy()
+    for i, column in enumerate(columns):
+        df.loc[df.index[week[3 * i:3 * i + 3]], column] = np.nan
+    return df
+
+
+def _expected(df, periods):
+    week = df[(df["Date"] >= periods["current"][0]) & (df["Date"] <= periods["current"][1])]
+    return week["Sales"].sum(), int(week["Quantity"].sum())
+
+
+def _assert_totals(aggregates, df, periods):
+    sales, quantity = _expected(df, periods)
+    assert aggregates["current"]["sales"] == pytest.approx(sales)
+    assert aggregates["current"]["quantity"] == quantity
+    # Breakdowns skip the missing values, as a groupby on the column does
+    assert aggregates["by_city"].sum() == pytest.approx(df.loc[df["City"].notna()].pipe(_expected, periods)[0])
+    assert aggregates["by_dimension"]["Gender"]["sales"].sum() == pytest.approx(
+        df.loc[df["Gender"].notna()].pipe(_expected, periods)[0]
+    )
+
+
+@pytest.mark.parametrize("columns", [["City"], ["Product line", "Payment"], ["Gender"]])
+def test_flat_totals_keep_rows_with_missing_keys(sales, columns):
+    df, periods, week = sales
+    df = _blank(df, week, columns)
+    _assert_totals(compute_period_aggregates(df, periods), df, periods)
+
+
+@pytest.mark.parametrize("columns", [["City"], ["Product line", "Payment"], ["Gender"]])
+def test_cube_totals_keep_rows_with_missing_keys(sales, columns):
+    df, periods, week = sales
+    df = _blank(df, week, columns)
+    aggregates = aggregates_from_cube(build_daily_cube(df), periods)
+    _assert_totals(aggregates, df, periods)
+    assert aggregates["current"]["transactions"] == compute_period_aggregates(df, periods)["current"]["transactions"]
+
+
+def test_duckdb_totals_keep_rows_with_missing_keys(sales, tmp_path):
+    pytest.importorskip("duckdb")
+    from src.engine import DuckDBEngine
+    from src.ingest import PARTITION_PREFIX
+
+    df, periods, week = sales
+    df = _blank(df, week, ["City", "Payment", "Gender"])
+    for day, df_day in df.groupby(df["Date"].dt.strftime("%Y-%m-%d")):
+        (tmp_path / f"{PARTITION_PREFIX}{day}").mkdir()
+        df_day.to_parquet(tmp_path / f"{PARTITION_PREFIX}{day}" / "part.parquet", index=False)
+    _assert_totals(DuckDBEngine(tmp_path).period_aggregates(periods), df, periods)
+
+
+def test_invoice_sketches_skip_rows_with_missing_keys():
+    from src.cube import _sketch_registers, build_invoice_sketches
+    from src.metrics import estimate_distinct
+
+    rows = pd.DataFrame({
+        "Date": pd.Timestamp("2019-01-01"), "Branch": "Alex",
+        "City": ["Yangon", "Yangon"] + [None] * 200,
+        "Invoice ID": [f"100-00-{i:04d}" for i in range(202)],
+    })
+    sketches = build_invoice_sketches(rows, precision=12)
+    assert len(sketches) == 1
+    assert round(estimate_distinct(_sketch_registers(sketches))[0]) == 2
+
+
+def test_sketches_reject_negative_group_ids():
+    from src.metrics import build_sketches
+
+    with pytest.raises(ValueError, match="non-negative"):
+        build_sketches(np.array([0, -1]), np.array([1, 2], dtype=np.uint64), n_groups=1, precision=4)
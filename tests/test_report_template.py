@@ -0,0 +1,58 @@
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.table import Table
+
+from src.report_template import render_report_template
+
+
+def test_rows_of_a_defined_name_stay_within_its_range(tmp_path, capsys):
+    template = tmp_path / "template.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Report"
+    ws["A5"] = "footer"
+    wb.defined_names["tbl_kpis"] = DefinedName("tbl_kpis", attr_text="Report!$A$2:$B$4")
+    wb.save(template)
+
+    df = pd.DataFrame({"KPI": [f"kpi {i}" for i in range(5)], "Value": range(5), "Extra": range(5)})
+    output = render_report_template(template, tmp_path / "report.xlsx", [("tbl_kpis", df)])
+
+    ws = load_workbook(output)["Report"]
+    assert [[cell.value for cell in row] for row in ws["A2:C4"]] == [
+        ["kpi 0", 0, None], ["kpi 1", 1, None], ["kpi 2", 2, None],
+    ]
+    assert ws["A5"].value == "footer"
+    assert "tbl_kpis has 5 row(s)" in capsys.readouterr().out
+
+
+def test_tables_only_grow_over_free_cells(tmp_path, capsys):
+    template = tmp_path / "template.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Report"
+    tables = {"tbl_sales_by_product": ("A1:B2", ["Product line", "Sales"]),
+              "tbl_sales_by_day": ("A3:B4", ["Day", "Sales"]), "tbl_kpis": ("A10:A11", ["KPI"])}
+    for name, (ref, headers) in tables.items():
+        for column, header in enumerate(headers, start=1):
+            ws.cell(row=int(ref[1:ref.index(":")]), column=column, value=header)
+        ws.add_table(Table(displayName=name, ref=ref))
+    ws["B11"] = "note"
+    wb.save(template)
+
+    by_product = pd.DataFrame({"Product line": [f"line {i}" for i in range(6)], "Sales": range(6)})
+    by_day = pd.DataFrame({"Day": ["Mon"], "Sales": [1.0]})
+    kpis = pd.DataFrame({"KPI": ["Total Sales", "Transactions"], "Value": [10.0, 2.0]})
+    output = render_report_template(template, tmp_path / "report.xlsx", [
+        ("tbl_sales_by_product", by_product), ("tbl_sales_by_day", by_day), ("tbl_kpis", kpis),
+    ])
+
+    ws = load_workbook(output)["Report"]
+    refs = {table.displayName: table.ref for table in ws.tables.values()}
+    # Blocked by the next table, and by the note to the right: clipped instead of overlapping
+    assert refs == {"tbl_sales_by_product": "A1:B2", "tbl_sales_by_day": "A3:B4", "tbl_kpis": "A10:A12"}
+    assert [cell.value for cell in ws["A3:B3"][0]] == ["Day", "Sales"]
+    assert [ws[f"A{row}"].value for row in (10, 11, 12)] == ["KPI", "Total Sales", "Transactions"]
+    out = capsys.readouterr().out
+    assert "tbl_sales_by_product has 6 row(s) × 2 column(s) but only 1 × 2 fit" in out
+    assert "tbl_kpis has 2 row(s) × 2 column(s) but only 2 × 1 fit" in out
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from config import CONFIG
+from src.data import load_and_validate_sales_data
+from src.validation import ValidationError
+
+SALES_CSV = Path(__file__).resolve().parents[1] / "data" / "sales.csv"
+
+
+@pytest.fixture
+def blank_quantity_csv(tmp_path):
+    df = pd.read_csv(SALES_CSV, dtype=str, keep_default_na=False)
+    df.loc[3, "Quantity"] = ""
+    csv_path = tmp_path / "sales.csv"
+    df.to_csv(csv_path, index=False)
+    return csv_path
+
+
+def test_blank_quantity_is_rejected(blank_quantity_csv):
+    with pytest.raises(ValidationError, match="Missing Unit price, Quantity"):
+        load_and_validate_sales_data(blank_quantity_csv)
+
+
+def test_blank_quantity_is_quarantined(blank_quantity_csv, tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG, "validation_mode", "quarantine")
+    monkeypatch.setitem(CONFIG, "quarantine_dir", tmp_path / "quarantine")
+    df = load_and_validate_sales_data(blank_quantity_csv)
+    assert df["Quantity"].notna().all()
+    assert len(df) == len(pd.read_csv(SALES_CSV)) - 1
@@ -0,0 +1,92 @@
+from argparse import Namespace
+
+import pytest
+
+from config import CONFIG
+from src import watch
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "sales_monday.csv").write_text("Invoice ID\n1\n")
+    for key, value in {"watch_dir": data_dir, "watch_poll_seconds": 0.01, "watch_debounce_seconds": 0.01,
+                       "watch_retry_seconds": 0, "watch_status_file": tmp_path / "watch_status.json"}.items():
+        monkeypatch.setitem(CONFIG, key, value)
+    monkeypatch.setattr(watch, "ensure_directories", lambda: None)
+    return data_dir
+
+
+def _fake_runs(monkeypatch, statuses: list) -> list:
+    """Replace run_for_changes: the runs end with the given statuses, the service is stopped after the last"""
+    runs = []
+
+    def run_for_changes(session, changed, detected_at):
+        runs.append([path.name for path in changed])
+        session.runs += 1
+        session.last_run = {"status": statuses.pop(0)}
+        if not statuses:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch, "run_for_changes", run_for_changes)
+    return runs
+
+
+def test_csvs_already_in_the_folder_are_run_at_startup(folder, monkeypatch):
+    runs = _fake_runs(monkeypatch, ["success"])
+    watch.watch(Namespace(batch=False, once=True))
+    assert runs == [["sales_monday.csv"]]
+
+
+def test_files_of_a_failed_run_are_retried(folder, monkeypatch):
+    runs = _fake_runs(monkeypatch, ["failed", "success"])
+    watch.watch(Namespace(batch=False, once=False))
+    assert runs == [["sales_monday.csv"], ["sales_monday.csv"]]
+
+
+def test_warm_daily_cube_is_extended_with_the_new_parts(tmp_path, monkeypatch):
+    import contextlib
+    import io
+    from pathlib import Path
+
+    import pandas as pd
+
+    from config import get_paths
+    from main import load_report_data
+    from src.cube import CUBE_FILENAME, cube_keys, load_daily_cube
+    from src.ingest import ingest_daily_file
+    from src.instrumentation import RunRecorder
+
+    store_dir = tmp_path / "store"
+    for key, value in {"partition_store": store_dir, "use_partition_store": True, "use_daily_cube": True,
+                       "compute_engine": "pandas"}.items():
+        monkeypatch.setitem(CONFIG, key, value)
+    sales = pd.read_csv(Path(__file__).resolve().parents[1] / "data" / "sales.csv")
+    dates = pd.to_datetime(sales["Date"], format="%m/%d/%Y")
+    sales[dates < "2019-03-20"].to_csv(tmp_path / "history.csv", index=False)
+    sales[dates >= "2019-03-20"].to_csv(tmp_path / "latest.csv", index=False)
+
+    session = watch.WatchSession(Namespace(ingest=None, backfill=None, batch=False))
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest_daily_file(tmp_path / "history.csv", store_dir)
+        session.data = load_report_data(session.args, RunRecorder(), get_paths(pd.Timestamp.today().date()))
+        parts_before = watch._store_parts(store_dir)
+        ingest_daily_file(tmp_path / "latest.csv", store_dir)
+        session.refresh_store_data(sorted(watch._store_parts(store_dir) - parts_before))
+
+    keys = cube_keys()
+    expected = load_daily_cube(store_dir / CUBE_FILENAME).sort_values(keys, ignore_index=True)
+    cube = session.data["cube"].sort_values(keys, ignore_index=True)
+    pd.testing.assert_frame_equal(cube, expected, check_categorical=False, check_dtype=False)
+    assert session.data["frame"] is session.data["cube"]
+    assert session.data["latest_date"] == pd.Timestamp("2019-03-30")
+
+
+def test_source_csv_is_not_watched_with_the_partition_store(folder, monkeypatch):
+    (folder / "sales.csv").write_text("Invoice ID\n1\n")
+    monkeypatch.setitem(CONFIG, "input_csv", folder / "sales.csv")
+    monkeypatch.setitem(CONFIG, "use_partition_store", True)
+    assert [path.name for path in watch.watched_files(folder)] == ["sales_monday.csv"]
+    monkeypatch.setitem(CONFIG, "use_partition_store", False)
+    assert sorted(path.name for path in watch.watched_files(folder)) == ["sales.csv", "sales_monday.csv"]
@@ -0,0 +1,63 @@
+import os
+import struct
+import zipfile
+
+from src.zip_handler import _write_zip_sequential, write_zip
+
+
+def test_local_headers_carry_crc_and_sizes(tmp_path):
+    # Streaming readers (Java's ZipInputStream) reject STORED members with a data descriptor
+    (tmp_path / "report.xlsx").write_bytes(b"stored" * 100_000)
+    (tmp_path / "sales.csv").write_text("Date,Sales\n" * 50_000)
+    zip_path = write_zip(tmp_path / "report.zip", [tmp_path / "report.xlsx", tmp_path / "sales.csv"],
+                         level=6, store_suffixes={".xlsx"}, workers=2, manifest=True)
+
+    data = zip_path.read_bytes()
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        members = archive.infolist()
+    assert [member.compress_type for member in members] == [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED,
+                                                            zipfile.ZIP_DEFLATED]
+    for member in members:
+        flags, crc, compressed_size, size = struct.unpack_from("<6xH6xIII", data, member.header_offset)
+        assert not flags & 0x08
+        assert (crc, compressed_size, size) == (member.CRC, member.compress_size, member.file_size)
+
+
+def test_members_carry_unix_permissions(tmp_path):
+    (tmp_path / "report.xlsx").write_bytes(b"stored")
+    with zipfile.ZipFile(write_zip(tmp_path / "report.zip", [tmp_path / "report.xlsx"], manifest=False)) as archive:
+        member = archive.infolist()[0]
+    assert member.create_system == 3
+    assert member.external_attr >> 16 == 0o644
+
+
+def test_archive_outgrowing_zip32_fields_is_written_with_zipfile(tmp_path, monkeypatch):
+    from src import zip_handler
+
+    # Incompressible members: their deflated size and offsets exceed the (lowered) limit, not their input size
+    paths = []
+    for name in ("a.csv", "b.csv"):
+        (tmp_path / name).write_bytes(os.urandom(1000))
+        paths.append(tmp_path / name)
+    monkeypatch.setattr(zip_handler, "ZIP32_LIMIT", 2010)
+    sequential = []
+    monkeypatch.setattr(zip_handler, "_write_zip_sequential",
+                        lambda *args: sequential.append(args) or _write_zip_sequential(*args))
+
+    zip_path = write_zip(tmp_path / "report.zip", paths, level=6, workers=1, manifest=False)
+    assert len(sequential) == 1
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["a.csv", "b.csv"]
+    assert not (tmp_path / "report.zip.tmp").exists()
+
+
+def test_old_zips_are_removed_but_the_one_kept(tmp_path):
+    from src.zip_handler import remove_old_zips
+
+    for day in ("2019-03-23", "2019-03-30"):
+        (tmp_path / f"Weekly_Sales_Report_{day}.zip").write_bytes(b"")
+    (tmp_path / "other.zip").write_bytes(b"")
+    remove_old_zips(tmp_path, keep=tmp_path / "Weekly_Sales_Report_2019-03-30.zip")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["Weekly_Sales_Report_2019-03-30.zip", "other.zip"]